@@ -1,17 +1,61 @@
 from django.contrib import admin
-from .models import CustomUser, Cartera, Accion, Dividendo, PrecioHistorico, AnalisisFundamental, Operacion, AlarmaPrecio, Prestamo, PropiedadAlquiler
+from .models import CustomUser, Cartera, Accion, Dividendo, AnalisisFundamental, Operacion, AlarmaPrecio, Prestamo, PropiedadAlquiler
 from .models.watchlist import Watchlist
 from .models.calendario import EventoFinanciero
 from .models.historico import HistoricoCartera
+from .models.cupo_proveedor import CupoProveedor
+from .models.fundamental_ticker import FundamentalTicker
+from .models.instrumento import Instrumento, BarraDiaria
+from .models.simulacion import SimulacionMonteCarlo
+from .models.optimizacion import BarridoParametros
 admin.site.register(CustomUser)
 admin.site.register(Cartera)
 admin.site.register(Accion)
 admin.site.register(Dividendo)
-admin.site.register(PrecioHistorico)
 admin.site.register(AnalisisFundamental)
 admin.site.register(Operacion)
 admin.site.register(AlarmaPrecio)
 admin.site.register(Watchlist)
 admin.site.register(EventoFinanciero)
 admin.site.register(Prestamo)
-admin.site.register(PropiedadAlquiler)
\ No newline at end of file
+admin.site.register(PropiedadAlquiler)
+
+
+@admin.register(CupoProveedor)
+class CupoProveedorAdmin(admin.ModelAdmin):
+    list_display = ("proveedor", "usados_minuto", "tokens", "usados_dia", "rechazados_dia", "dia")
+    readonly_fields = ("actualizado", "minuto")
+
+
+@admin.register(FundamentalTicker)
+class FundamentalTickerAdmin(admin.ModelAdmin):
+    list_display = ("ticker", "tipo", "ultimo_periodo", "actualizado", "comprobado")
+    list_filter = ("tipo",)
+    search_fields = ("ticker",)
+
+
+@admin.register(Instrumento)
+class InstrumentoAdmin(admin.ModelAdmin):
+    list_display = ("ticker", "nombre", "creado")
+    search_fields = ("ticker", "nombre")
+
+
+@admin.register(BarraDiaria)
+class BarraDiariaAdmin(admin.ModelAdmin):
+    list_display = ("instrumento", "fecha", "cierre", "volumen")
+    list_filter = ("instrumento",)
+    date_hierarchy = "fecha"
+
+
+@admin.register(SimulacionMonteCarlo)
+class SimulacionMonteCarloAdmin(admin.ModelAdmin):
+    list_display = ("user", "dia", "clave", "creado")
+    list_filter = ("dia",)
+    readonly_fields = ("creado",)
+
+
+@admin.register(BarridoParametros)
+class BarridoParametrosAdmin(admin.ModelAdmin):
+    list_display = ("estrategia", "estado", "clave", "creado", "terminado")
+    list_filter = ("estrategia", "estado")
+    readonly_fields = ("clave", "creado", "terminado")
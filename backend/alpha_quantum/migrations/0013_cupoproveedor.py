@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alpha_quantum', '0012_remove_watchlist_uq_watchlist_user_ticker_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CupoProveedor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('proveedor', models.CharField(max_length=32, unique=True)),
+                ('tokens', models.FloatField(default=0)),
+                ('actualizado', models.DateTimeField()),
+                ('dia', models.DateField()),
+                ('usados_dia', models.PositiveIntegerField(default=0)),
+                ('rechazados_dia', models.PositiveIntegerField(default=0)),
+                ('minuto', models.DateTimeField()),
+                ('usados_minuto', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'cupo de proveedor',
+                'verbose_name_plural': 'cupos de proveedores',
+                'ordering': ['proveedor'],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alpha_quantum', '0013_cupoproveedor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FundamentalTicker',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ticker', models.CharField(max_length=16)),
+                ('tipo', models.CharField(choices=[('OVERVIEW', 'Resumen'), ('INCOME_STATEMENT', 'Cuenta de resultados'), ('BALANCE_SHEET', 'Balance'), ('EARNINGS', 'Beneficio por acción')], max_length=20)),
+                ('datos', models.JSONField(default=list)),
+                ('ultimo_periodo', models.DateField(blank=True, null=True)),
+                ('actualizado', models.DateTimeField(blank=True, null=True)),
+                ('comprobado', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['ticker', 'tipo'],
+                'constraints': [models.UniqueConstraint(fields=('ticker', 'tipo'), name='uq_fundamental_ticker_tipo')],
+            },
+        ),
+    ]
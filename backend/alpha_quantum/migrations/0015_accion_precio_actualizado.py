@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alpha_quantum', '0014_fundamentalticker'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='accion',
+            name='precio_actualizado',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
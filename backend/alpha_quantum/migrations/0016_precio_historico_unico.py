@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:42
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def quitar_duplicados(apps, schema_editor):
+    # deja solo la fila más reciente por (accion, fecha) antes de crear la restricción
+    PrecioHistorico = apps.get_model('alpha_quantum', 'PrecioHistorico')
+    repetidos = (PrecioHistorico.objects
+                 .values('accion_id', 'fecha')
+                 .annotate(n=Count('id'), ultimo=Max('id'))
+                 .filter(n__gt=1))
+    for r in repetidos:
+        (PrecioHistorico.objects
+         .filter(accion_id=r['accion_id'], fecha=r['fecha'])
+         .exclude(id=r['ultimo'])
+         .delete())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alpha_quantum', '0015_accion_precio_actualizado'),
+    ]
+
+    operations = [
+        migrations.RunPython(quitar_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='preciohistorico',
+            constraint=models.UniqueConstraint(fields=('accion', 'fecha'), name='uq_precio_historico_accion_fecha'),
+        ),
+    ]
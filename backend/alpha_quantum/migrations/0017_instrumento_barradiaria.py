@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copiar_historicos(apps, schema_editor):
+    # PrecioHistorico (por Accion de cada usuario) -> una serie por ticker
+    PrecioHistorico = apps.get_model('alpha_quantum', 'PrecioHistorico')
+    Instrumento = apps.get_model('alpha_quantum', 'Instrumento')
+    BarraDiaria = apps.get_model('alpha_quantum', 'BarraDiaria')
+
+    barras = {}
+    filas = PrecioHistorico.objects.values_list('accion__ticker', 'fecha', 'valor').order_by('id')
+    for ticker, fecha, valor in filas.iterator(chunk_size=2000):
+        barras[(ticker.upper().strip(), fecha)] = valor
+
+    tickers = {t for t, _ in barras}
+    Instrumento.objects.bulk_create([Instrumento(ticker=t) for t in tickers], ignore_conflicts=True)
+    BarraDiaria.objects.bulk_create(
+        [BarraDiaria(instrumento_id=t, fecha=f, cierre=v) for (t, f), v in barras.items()],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alpha_quantum', '0016_precio_historico_unico'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Instrumento',
+            fields=[
+                ('ticker', models.CharField(max_length=16, primary_key=True, serialize=False)),
+                ('nombre', models.CharField(blank=True, max_length=100)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['ticker'],
+            },
+        ),
+        migrations.CreateModel(
+            name='BarraDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('cierre', models.DecimalField(decimal_places=4, max_digits=14)),
+                ('apertura', models.DecimalField(blank=True, decimal_places=4, max_digits=14, null=True)),
+                ('maximo', models.DecimalField(blank=True, decimal_places=4, max_digits=14, null=True)),
+                ('minimo', models.DecimalField(blank=True, decimal_places=4, max_digits=14, null=True)),
+                ('volumen', models.BigIntegerField(blank=True, null=True)),
+                ('instrumento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='barras', to='alpha_quantum.instrumento')),
+            ],
+            options={
+                'ordering': ['instrumento', 'fecha'],
+                'indexes': [models.Index(fields=['instrumento', 'fecha', 'cierre'], name='ix_barra_diaria_cierre')],
+                'constraints': [models.UniqueConstraint(fields=('instrumento', 'fecha'), name='uq_barra_diaria_instrumento_fecha')],
+            },
+        ),
+        migrations.RunPython(copiar_historicos, migrations.RunPython.noop),
+    ]
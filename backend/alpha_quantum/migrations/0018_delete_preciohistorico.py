@@ -0,0 +1,16 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:43
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alpha_quantum', '0017_instrumento_barradiaria'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='PrecioHistorico',
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alpha_quantum', '0018_delete_preciohistorico'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimulacionMonteCarlo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=64)),
+                ('dia', models.DateField()),
+                ('parametros', models.JSONField(default=dict)),
+                ('resultado', models.JSONField(default=dict)),
+                ('creado', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='simulaciones', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-dia'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'clave'), name='uq_simulacion_user_clave')],
+            },
+        ),
+    ]
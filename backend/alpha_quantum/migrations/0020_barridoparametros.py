@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alpha_quantum', '0019_simulacionmontecarlo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BarridoParametros',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=64, unique=True)),
+                ('estrategia', models.CharField(max_length=20)),
+                ('configuracion', models.JSONField(default=dict)),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('CALCULANDO', 'Calculando'), ('LISTO', 'Listo'), ('ERROR', 'Error')], default='PENDIENTE', max_length=10)),
+                ('resultado', models.JSONField(blank=True, default=dict)),
+                ('error', models.TextField(blank=True, default='')),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('terminado', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-creado'],
+            },
+        ),
+    ]
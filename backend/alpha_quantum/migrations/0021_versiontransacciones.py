@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def crear_versiones(apps, schema_editor):
+    # una fila por usuario con transacciones; las bajas solo suben la versión
+    Transaccion = apps.get_model('alpha_quantum', 'Transaccion')
+    VersionTransacciones = apps.get_model('alpha_quantum', 'VersionTransacciones')
+    CustomUser = apps.get_model('alpha_quantum', 'CustomUser')
+    usuarios = CustomUser.objects.filter(
+        pk__in=Transaccion.objects.values('user_id')
+    ).values_list('pk', flat=True)
+    VersionTransacciones.objects.bulk_create([VersionTransacciones(user_id=u) for u in usuarios])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alpha_quantum', '0020_barridoparametros'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionTransacciones',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='version_transacciones', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'versión de transacciones',
+                'verbose_name_plural': 'versiones de transacciones',
+            },
+        ),
+        migrations.RunPython(crear_versiones, migrations.RunPython.noop),
+    ]
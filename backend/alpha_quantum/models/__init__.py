@@ -2,7 +2,6 @@ from .accion import Accion
 from .cartera import Cartera
 from .dividendo import Dividendo
 from .custom_user import CustomUser
-from .precio_historico import PrecioHistorico
 from .analisis_fundamental import AnalisisFundamental
 from .operacion import Operacion
 from .alarma import AlarmaPrecio
@@ -13,3 +12,9 @@ from .propiedad_alquilada import PropiedadAlquiler
 from .cashflow import CashFlow
 from .transaccion import Transaccion
 from .historico import HistoricoCartera
+from .cupo_proveedor import CupoProveedor
+from .fundamental_ticker import FundamentalTicker
+from .instrumento import Instrumento, BarraDiaria
+from .simulacion import SimulacionMonteCarlo
+from .optimizacion import BarridoParametros
+from .version_transacciones import VersionTransacciones
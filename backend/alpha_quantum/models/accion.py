@@ -10,6 +10,7 @@ class Accion(models.Model):
     cantidad = models.IntegerField()
     precio_compra = models.FloatField()
     precio_actual = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    precio_actualizado = models.DateTimeField(null=True, blank=True)
     fecha = models.DateField()
     
     def __str__(self):
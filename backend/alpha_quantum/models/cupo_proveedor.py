@@ -0,0 +1,25 @@
+# alpha_quantum/models/cupo_proveedor.py
+from django.db import models
+
+
+class CupoProveedor(models.Model):
+    """
+    Estado compartido (entre procesos) del limitador de peticiones de un
+    proveedor de datos: token bucket por minuto + consumo diario.
+    """
+    proveedor = models.CharField(max_length=32, unique=True)
+    tokens = models.FloatField(default=0)
+    actualizado = models.DateTimeField()                 # última recarga del bucket
+    dia = models.DateField()
+    usados_dia = models.PositiveIntegerField(default=0)
+    rechazados_dia = models.PositiveIntegerField(default=0)
+    minuto = models.DateTimeField()                      # inicio del minuto en curso
+    usados_minuto = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["proveedor"]
+        verbose_name = "cupo de proveedor"
+        verbose_name_plural = "cupos de proveedores"
+
+    def __str__(self):
+        return f"{self.proveedor}: {self.usados_minuto}/min, {self.usados_dia}/día"
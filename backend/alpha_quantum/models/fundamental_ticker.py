@@ -0,0 +1,32 @@
+# alpha_quantum/models/fundamental_ticker.py
+from django.db import models
+
+
+class FundamentalTicker(models.Model):
+    """
+    Estados financieros normalizados por ticker (compartidos entre usuarios).
+    Una fila por (ticker, tipo); `datos` guarda la lista de periodos o el
+    resumen ya normalizados, listos para las vistas.
+    """
+    TIPOS = (
+        ("OVERVIEW", "Resumen"),
+        ("INCOME_STATEMENT", "Cuenta de resultados"),
+        ("BALANCE_SHEET", "Balance"),
+        ("EARNINGS", "Beneficio por acción"),
+    )
+
+    ticker = models.CharField(max_length=16)
+    tipo = models.CharField(max_length=20, choices=TIPOS)
+    datos = models.JSONField(default=list)
+    ultimo_periodo = models.DateField(null=True, blank=True)  # último trimestre publicado
+    actualizado = models.DateTimeField(null=True, blank=True)  # última descarga con datos
+    comprobado = models.DateTimeField()                        # último intento de descarga
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["ticker", "tipo"], name="uq_fundamental_ticker_tipo"),
+        ]
+        ordering = ["ticker", "tipo"]
+
+    def __str__(self):
+        return f"{self.ticker} {self.tipo} ({self.ultimo_periodo or 's/f'})"
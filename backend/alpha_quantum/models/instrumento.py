@@ -0,0 +1,42 @@
+# alpha_quantum/models/instrumento.py
+from django.db import models
+
+
+class Instrumento(models.Model):
+    """Símbolo cotizado, compartido por todos los usuarios que lo tienen."""
+    ticker = models.CharField(max_length=16, primary_key=True)
+    nombre = models.CharField(max_length=100, blank=True)
+    creado = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["ticker"]
+
+    def __str__(self):
+        return self.ticker
+
+
+class BarraDiaria(models.Model):
+    """
+    Barra diaria canónica de un instrumento: una sola serie por ticker que
+    leen sparklines, valoración y analítica.
+    """
+    instrumento = models.ForeignKey(Instrumento, on_delete=models.CASCADE, related_name="barras")
+    fecha = models.DateField()
+    cierre = models.DecimalField(max_digits=14, decimal_places=4)
+    apertura = models.DecimalField(max_digits=14, decimal_places=4, null=True, blank=True)
+    maximo = models.DecimalField(max_digits=14, decimal_places=4, null=True, blank=True)
+    minimo = models.DecimalField(max_digits=14, decimal_places=4, null=True, blank=True)
+    volumen = models.BigIntegerField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["instrumento", "fecha"], name="uq_barra_diaria_instrumento_fecha"),
+        ]
+        indexes = [
+            # cubre las lecturas de la serie de cierres sin ir a la tabla
+            models.Index(fields=["instrumento", "fecha", "cierre"], name="ix_barra_diaria_cierre"),
+        ]
+        ordering = ["instrumento", "fecha"]
+
+    def __str__(self):
+        return f"{self.instrumento_id} - {self.fecha}: {self.cierre}"
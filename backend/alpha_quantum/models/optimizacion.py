@@ -0,0 +1,32 @@
+# alpha_quantum/models/optimizacion.py
+from django.db import models
+
+
+class BarridoParametros(models.Model):
+    """
+    Barrido walk-forward de parámetros de una estrategia de Alpha Bots.
+    `clave` es el hash de la configuración (estrategia, tickers, rejilla,
+    fechas, ventanas y comisiones): un barrido terminado no se recalcula.
+    """
+    PENDIENTE, CALCULANDO, LISTO, ERROR = "PENDIENTE", "CALCULANDO", "LISTO", "ERROR"
+    ESTADOS = (
+        (PENDIENTE, "Pendiente"),
+        (CALCULANDO, "Calculando"),
+        (LISTO, "Listo"),
+        (ERROR, "Error"),
+    )
+
+    clave = models.CharField(max_length=64, unique=True)
+    estrategia = models.CharField(max_length=20)
+    configuracion = models.JSONField(default=dict)
+    estado = models.CharField(max_length=10, choices=ESTADOS, default=PENDIENTE)
+    resultado = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True, default="")
+    creado = models.DateTimeField(auto_now_add=True)
+    terminado = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-creado"]
+
+    def __str__(self):
+        return f"{self.estrategia} | {self.estado} | {self.clave[:12]}"
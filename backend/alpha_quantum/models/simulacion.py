@@ -0,0 +1,26 @@
+# alpha_quantum/models/simulacion.py
+from django.conf import settings
+from django.db import models
+
+
+class SimulacionMonteCarlo(models.Model):
+    """
+    Resultado persistido de una simulación Monte Carlo de la cartera (para
+    que el trabajo de fondo y las vistas lo compartan). `clave` resume los
+    parámetros y el día de mercado.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="simulaciones")
+    clave = models.CharField(max_length=64)
+    dia = models.DateField()
+    parametros = models.JSONField(default=dict)
+    resultado = models.JSONField(default=dict)
+    creado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "clave"], name="uq_simulacion_user_clave"),
+        ]
+        ordering = ["-dia"]
+
+    def __str__(self):
+        return f"{self.user} | {self.dia} | {self.parametros}"
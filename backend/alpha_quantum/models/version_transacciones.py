@@ -0,0 +1,22 @@
+# alpha_quantum/models/version_transacciones.py
+from django.conf import settings
+from django.db import models
+
+
+class VersionTransacciones(models.Model):
+    """
+    Contador por usuario que suben las señales de Transaccion en cada alta,
+    edición o baja (dentro de la misma transacción de BD). Las cachés de
+    libro de posiciones y de lotes lo guardan junto al resultado para saber,
+    desde cualquier proceso, si siguen siendo válidas.
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True,
+                                related_name="version_transacciones")
+    version = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "versión de transacciones"
+        verbose_name_plural = "versiones de transacciones"
+
+    def __str__(self):
+        return f"{self.user_id}: v{self.version}"
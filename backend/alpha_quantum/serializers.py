@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Accion, Cartera, PrecioHistorico
+from .models import Accion, Cartera, BarraDiaria
 
 class AccionSerializer(serializers.ModelSerializer):
     ganancia = serializers.SerializerMethodField()
@@ -15,12 +15,12 @@ class AccionSerializer(serializers.ModelSerializer):
     def get_rentabilidad_pct(self, obj):
         return ((obj.precio_actual - obj.precio_compra) / obj.precio_compra) * 100
 
-class PrecioHistoricoSerializer(serializers.ModelSerializer):
-    ticker = serializers.CharField(source="accion.ticker", read_only=True)
+class BarraDiariaSerializer(serializers.ModelSerializer):
+    ticker = serializers.CharField(source="instrumento_id", read_only=True)
 
     class Meta:
-        model = PrecioHistorico
-        fields = ["ticker", "fecha", "precio_cierre"]
+        model = BarraDiaria
+        fields = ["ticker", "fecha", "cierre"]
 
 class CarteraSerializer(serializers.ModelSerializer):
     class Meta:
@@ -0,0 +1 @@
+# alpha_quantum/services/__init__.py
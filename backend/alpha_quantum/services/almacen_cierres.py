@@ -0,0 +1,163 @@
+# alpha_quantum/services/almacen_cierres.py
+"""
+Almacén columnar de cierres diarios sobre ficheros mapeados en memoria
+(NumPy memmap), para la analítica (riesgo, indicadores, backtests).
+
+Estructura en settings.ALMACEN_CIERRES_DIR:
+- fechas.i8: índice de fechas compartido (datetime64[D] como int64); es la
+  rejilla de días laborables desde ALMACEN_CIERRES_ORIGEN hasta la última
+  fecha escrita, así que la posición de una fecha es aritmética.
+- <TICKER>.f8: cierres float64 alineados con fechas.i8 (NaN si no hay barra).
+  Un fichero puede ser más corto que el índice: la cola que falta es NaN.
+
+Solo se añade al final (los huecos intermedios se rellenan en su sitio).
+Se alimenta desde utils.actualizar_historico y se abre sin copia con
+fechas() / cierres(); matriz() alinea varios tickers de una vez.
+"""
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from ..models.instrumento import BarraDiaria
+
+try:
+    import fcntl
+except ImportError:  # Windows: solo bloqueo entre hilos
+    fcntl = None
+
+_lock = threading.Lock()
+_FECHAS = "fechas.i8"
+
+
+def _directorio() -> Path:
+    d = Path(getattr(settings, "ALMACEN_CIERRES_DIR", Path(settings.BASE_DIR) / "datos" / "cierres"))
+    d.mkdir(parents=True, exist_ok=True)
+    return d
+
+
+def _origen() -> np.datetime64:
+    return np.datetime64(getattr(settings, "ALMACEN_CIERRES_ORIGEN", "2000-01-03"), "D")
+
+
+def _ruta(ticker: str) -> Path:
+    return _directorio() / f"{ticker.upper().strip().replace('/', '_')}.f8"
+
+
+def _abrir(ruta: Path, dtype, modo="r"):
+    n = ruta.stat().st_size // np.dtype(dtype).itemsize if ruta.exists() else 0
+    if n == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(ruta, dtype=dtype, mode=modo, shape=(n,))
+
+
+class _Bloqueo:
+    """Exclusión entre hilos y, donde hay fcntl, entre procesos."""
+
+    def __enter__(self):
+        _lock.acquire()
+        self._f = None
+        if fcntl is not None:
+            self._f = open(_directorio() / ".lock", "w")
+            fcntl.flock(self._f, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._f is not None:
+            fcntl.flock(self._f, fcntl.LOCK_UN)
+            self._f.close()
+        _lock.release()
+
+
+# ------------------- lectura (sin copia) -------------------
+
+def fechas() -> np.ndarray:
+    """Índice de fechas compartido (datetime64[D], solo lectura)."""
+    return _abrir(_directorio() / _FECHAS, np.int64).view("datetime64[D]")
+
+
+def cierres(ticker: str) -> np.ndarray:
+    """Cierres de `ticker` alineados con fechas() (memmap de solo lectura)."""
+    return _abrir(_ruta(ticker), np.float64)
+
+
+def posicion(fecha) -> int:
+    """Índice de `fecha` en la rejilla (días laborables desde el origen)."""
+    return int(np.busday_count(_origen(), np.datetime64(fecha, "D")))
+
+
+def matriz(tickers, desde=None, hasta=None):
+    """
+    (fechas, M) con M[i, j] = cierre de tickers[j] en fechas[i]; NaN donde no
+    hay dato. Cada columna se lee de su memmap; solo se copia el tramo pedido.
+    """
+    idx = fechas()
+    i0 = max(0, posicion(desde)) if desde is not None else 0
+    # días laborables hasta `hasta` incluido (si cae en fin de semana, sin el lunes)
+    i1 = min(len(idx), posicion(np.datetime64(hasta, "D") + 1)) if hasta is not None else len(idx)
+    i1 = max(i0, i1)
+    m = np.full((i1 - i0, len(tickers)), np.nan)
+    for j, t in enumerate(tickers):
+        col = cierres(t)[i0:i1]
+        m[:len(col), j] = col
+    return idx[i0:i1], m
+
+
+# ------------------- escritura (solo por el final) -------------------
+
+def _extender_fechas(hasta: np.datetime64) -> None:
+    ruta = _directorio() / _FECHAS
+    actual = _abrir(ruta, np.int64)
+    inicio = actual[-1].view("datetime64[D]") + 1 if len(actual) else _origen()
+    nuevas = np.arange(inicio, hasta + 1, dtype="datetime64[D]")
+    nuevas = nuevas[np.is_busday(nuevas)]
+    if len(nuevas):
+        with open(ruta, "ab") as f:
+            f.write(nuevas.astype(np.int64).tobytes())
+
+
+def actualizar(ticker: str, fechas_barras, valores) -> int:
+    """
+    Escribe cierres de `ticker` (fechas date/datetime64 y valores float).
+    Amplía el índice y el fichero del ticker si hace falta. Los días no
+    laborables y anteriores al origen se ignoran. Devuelve los escritos.
+    """
+    f = np.asarray(fechas_barras, dtype="datetime64[D]")
+    v = np.asarray(valores, dtype=np.float64)
+    ok = np.is_busday(f) & (f >= _origen())
+    f, v = f[ok], v[ok]
+    if not len(f):
+        return 0
+
+    pos = np.busday_count(_origen(), f)
+    ruta = _ruta(ticker)
+    with _Bloqueo():
+        _extender_fechas(f.max())
+        largo = ruta.stat().st_size // 8 if ruta.exists() else 0
+        necesario = int(pos.max()) + 1
+        if largo < necesario:
+            with open(ruta, "ab") as fh:
+                fh.write(np.full(necesario - largo, np.nan).tobytes())
+        m = np.memmap(ruta, dtype=np.float64, mode="r+", shape=(max(largo, necesario),))
+        m[pos] = v
+        m.flush()
+        del m
+    return len(f)
+
+
+def reconstruir(ticker: str) -> int:
+    """Rehace el fichero de `ticker` desde la serie en BD (BarraDiaria)."""
+    filas = list(
+        BarraDiaria.objects.filter(instrumento_id=ticker.upper().strip())
+        .order_by("fecha").values_list("fecha", "cierre")
+    )
+    with _Bloqueo():
+        ruta = _ruta(ticker)
+        if ruta.exists():
+            os.remove(ruta)
+    if not filas:
+        return 0
+    f, c = zip(*filas)
+    return actualizar(ticker, f, [float(x) for x in c])
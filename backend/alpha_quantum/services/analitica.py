@@ -0,0 +1,135 @@
+# alpha_quantum/services/analitica.py
+"""
+Analítica de la cartera sobre HistoricoCartera, vectorizada con NumPy.
+
+Los rendimientos diarios descuentan los flujos de caja de las operaciones
+(compras y ventas con el signo de Transaccion.importe()), de modo que
+aportar o retirar dinero no cuenta como rentabilidad:
+
+    r_t = (V_t - F_t) / V_{t-1} - 1
+
+Con ellos se calculan el índice encadenado (time-weighted), la curva
+underwater, la volatilidad móvil y las estadísticas (volatilidad, Sharpe,
+Sortino, máximo drawdown, Calmar y porcentaje de días positivos).
+
+El resultado se memoiza por usuario, ventana y una firma del histórico
+(última fecha, número de filas y suma de valores): cambia en cuanto hay un
+snapshot nuevo o se recalcula el histórico.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, Sum
+
+from ..models.historico import HistoricoCartera
+from .valoracion import operaciones
+
+ANUAL = 252
+
+
+def _ventana_vol() -> int:
+    return int(getattr(settings, "ANALITICA_VENTANA_VOL", 21))
+
+
+def _historico(user_id, desde: date = None):
+    qs = HistoricoCartera.objects.filter(user_id=user_id)
+    return qs.filter(fecha__gte=desde) if desde else qs
+
+
+def flujos(user, fechas: np.ndarray) -> np.ndarray:
+    """
+    Flujo neto de caja (compras +, ventas -, comisiones incluidas) asignado
+    a cada fecha de `fechas`; las operaciones de días sin snapshot van al
+    siguiente.
+    """
+    f = np.zeros(len(fechas))
+    ops = operaciones(user)
+    if not ops or not len(fechas):
+        return f
+    dias_ops = np.array([o[0] for o in ops], dtype="datetime64[D]")
+    importes = np.array([o[2] * o[3] + o[4] for o in ops])
+    idx = np.searchsorted(fechas, dias_ops)
+    ok = (idx < len(fechas)) & (dias_ops > fechas[0])  # las previas ya están en V_0
+    np.add.at(f, idx[ok], importes[ok])
+    return f
+
+
+def rendimientos(valor: np.ndarray, flujo: np.ndarray) -> np.ndarray:
+    """Rendimientos diarios ajustados por flujos (NaN si el día anterior vale 0)."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        r = (valor[1:] - flujo[1:]) / valor[:-1] - 1.0
+    r[valor[:-1] <= 0] = np.nan
+    return r
+
+
+def estadisticas(r: np.ndarray) -> dict:
+    """Estadísticas de una serie de rendimientos diarios sin NaN."""
+    n = len(r)
+    if n < 2:
+        return {"observaciones": n}
+    indice = np.cumprod(1.0 + r)
+    pico = np.maximum.accumulate(np.concatenate(([1.0], indice)))[1:]
+    mdd = float((indice / pico - 1.0).min())
+    total = float(indice[-1] - 1.0)
+    cagr = float(indice[-1] ** (ANUAL / n) - 1.0) if indice[-1] > 0 else -1.0
+    media, sd = float(r.mean()), float(r.std(ddof=1))
+    abajo = float(np.sqrt(np.mean(np.minimum(r, 0.0) ** 2)))
+    return {
+        "observaciones": n,
+        "rentabilidad_pct": round(total * 100, 2),
+        "cagr_pct": round(cagr * 100, 2),
+        "volatilidad_pct": round(sd * np.sqrt(ANUAL) * 100, 2),
+        "sharpe": round(media / sd * np.sqrt(ANUAL), 2) if sd > 0 else 0.0,
+        "sortino": round(media / abajo * np.sqrt(ANUAL), 2) if abajo > 0 else 0.0,
+        "max_drawdown_pct": round(mdd * 100, 2),
+        "calmar": round(cagr / -mdd, 2) if mdd < 0 else 0.0,
+        "acierto_pct": round(float((r > 0).sum() / max(int((r != 0).sum()), 1)) * 100, 2),
+        "mejor_dia_pct": round(float(r.max()) * 100, 2),
+        "peor_dia_pct": round(float(r.min()) * 100, 2),
+    }
+
+
+def calcular(user, desde: date = None) -> dict:
+    """Analítica del histórico de `user` desde `desde` (o completo)."""
+    filas = list(_historico(getattr(user, "pk", user), desde).order_by("fecha").values_list("fecha", "valor"))
+    if len(filas) < 2:
+        return None
+    fechas = np.array([f for f, _ in filas], dtype="datetime64[D]")
+    valor = np.array([float(v or 0) for _, v in filas])
+    r = rendimientos(valor, flujos(user, fechas))
+    r = np.nan_to_num(r, nan=0.0, posinf=0.0, neginf=0.0)
+
+    indice = np.concatenate(([1.0], np.cumprod(1.0 + r)))
+    underwater = indice / np.maximum.accumulate(indice) - 1.0
+    n = _ventana_vol()
+    vol = np.full(len(r), np.nan)
+    if len(r) >= n:
+        vol[n - 1:] = np.lib.stride_tricks.sliding_window_view(r, n).std(axis=-1, ddof=1) * np.sqrt(ANUAL)
+
+    return {
+        "desde": str(fechas[0]),
+        "hasta": str(fechas[-1]),
+        "labels": [str(f) for f in fechas],
+        "rendimientos_pct": [None] + np.round(r * 100, 4).tolist(),
+        "rentabilidad_acumulada_pct": np.round((indice - 1.0) * 100, 4).tolist(),
+        "underwater_pct": np.round(underwater * 100, 4).tolist(),
+        "volatilidad_movil_pct": [None] + [None if np.isnan(v) else round(float(v) * 100, 4) for v in vol],
+        "estadisticas": estadisticas(r),
+    }
+
+
+def analizar(user, dias: int = 365) -> dict:
+    """calcular() de los últimos `dias` (0 = todo) memoizado por la firma del histórico."""
+    user_id = getattr(user, "pk", user)
+    desde = date.today() - timedelta(days=dias) if dias else None
+    firma = _historico(user_id, desde).aggregate(f=Max("fecha"), n=Count("id"), s=Sum("valor"))
+    if not firma["n"]:
+        return None
+    clave = f"analitica:{user_id}:{dias}:{firma['f']}:{firma['n']}:{firma['s']}"
+    res = cache.get(clave)
+    if res is None:
+        res = calcular(user_id, desde) or {}
+        cache.set(clave, res, timeout=24 * 3600)
+    return res or None
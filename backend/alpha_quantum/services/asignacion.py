@@ -0,0 +1,302 @@
+# alpha_quantum/services/asignacion.py
+"""
+Asignación óptima de la cartera sobre la covarianza de covarianza.py y
+lista de operaciones en acciones enteras para llegar a ella.
+
+Métodos (pesos largos, suman 1 salvo en volatilidad objetivo):
+
+- min_varianza: mínimo w'Σw;
+- paridad_riesgo: cada posición aporta lo mismo a la varianza
+  (descenso cíclico por coordenadas de Griveau-Billion et al.);
+- max_sharpe: máximo (μ'w - rf) / sqrt(w'Σw);
+- vol_objetivo: la cartera de máximo Sharpe escalada a la volatilidad
+  ASIGNACION_VOL_OBJETIVO; el resto queda en efectivo (sin apalancamiento).
+
+Los dos primeros y max_sharpe se resuelven por descenso de gradiente
+proyectado sobre el símplex (con tope por posición) o por coordenadas, y
+arrancan de la última solución del mismo problema, guardada en caché
+durante TTL segundos: tras la barra de un día la covarianza apenas cambia
+y bastan unas pocas iteraciones.
+
+Las operaciones redondean a acciones enteras, venden antes de comprar y
+nunca gastan más que lo obtenido en ventas más `efectivo`.
+"""
+import hashlib
+import math
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from ..models import Accion
+from . import covarianza
+
+METODOS = ("min_varianza", "paridad_riesgo", "max_sharpe", "vol_objetivo")
+ANUAL = covarianza.ANUAL
+TTL = covarianza.TTL
+# diferencia de peso (puntos porcentuales) por debajo de la cual no se opera
+UMBRAL_PP = 0.25
+
+
+def _ajuste(nombre: str, defecto):
+    return getattr(settings, nombre, defecto)
+
+
+def parametros(metodo=None, vol_objetivo=None, maximo=None, estimador=None) -> dict:
+    """Valida y completa los parámetros de la asignación (ValueError si no valen)."""
+    metodo = metodo or _ajuste("ASIGNACION_METODO", "paridad_riesgo")
+    if metodo not in METODOS:
+        raise ValueError(f"Método no soportado: {metodo}")
+    vol = float(vol_objetivo if vol_objetivo not in (None, "") else _ajuste("ASIGNACION_VOL_OBJETIVO", 0.12))
+    maximo = float(maximo if maximo not in (None, "") else _ajuste("ASIGNACION_PESO_MAXIMO", 1.0))
+    estimador = estimador or "ledoit_wolf"
+    if not 0 < vol <= 2:
+        raise ValueError("vol_objetivo debe estar entre 0 y 2 (anual, en tanto por uno)")
+    if not 0 < maximo <= 1:
+        raise ValueError("maximo debe estar entre 0 y 1")
+    if estimador not in ("ledoit_wolf", "ewma"):
+        raise ValueError(f"Estimador no soportado: {estimador}")
+    return {"metodo": metodo, "vol_objetivo": vol, "maximo": maximo, "estimador": estimador}
+
+
+# ------------------- solvers -------------------
+
+def proyectar(v: np.ndarray, tope: float = 1.0) -> np.ndarray:
+    """Proyección euclídea de `v` sobre {w : Σw = 1, 0 <= w <= tope} (bisección)."""
+    tope = max(tope, 1.0 / len(v))
+    lo, hi = v.min() - tope, v.max()
+    for _ in range(100):
+        tau = (lo + hi) / 2
+        if np.clip(v - tau, 0.0, tope).sum() > 1.0:
+            lo = tau
+        else:
+            hi = tau
+    w = np.clip(v - (lo + hi) / 2, 0.0, tope)
+    return w / w.sum()
+
+
+def _gradiente_proyectado(f, grad, w0: np.ndarray, tope: float, max_iter: int, tol: float):
+    """
+    Minimiza `f` sobre el símplex con tope por descenso de gradiente
+    proyectado y paso con retroceso (Armijo). Devuelve (w, iteraciones).
+    """
+    w = proyectar(w0, tope)
+    paso = 1.0
+    fw = f(w)
+    for it in range(1, max_iter + 1):
+        g = grad(w)
+        while True:
+            nuevo = proyectar(w - paso * g, tope)
+            fn = f(nuevo)
+            if fn <= fw - 0.5 / paso * ((nuevo - w) ** 2).sum() or paso < 1e-12:
+                break
+            paso *= 0.5
+        cambio = np.abs(nuevo - w).max()
+        w, fw = nuevo, fn
+        paso *= 2.0  # recupera paso tras los retrocesos
+        if cambio < tol:
+            return w, it
+    return w, max_iter
+
+
+def min_varianza(cov: np.ndarray, w0: np.ndarray, tope: float, max_iter: int, tol: float):
+    # escalado para que el paso inicial sea razonable
+    s = cov / np.trace(cov) * len(cov)
+    return _gradiente_proyectado(lambda w: w @ s @ w, lambda w: 2 * s @ w, w0, tope, max_iter, tol)
+
+
+def max_sharpe(cov: np.ndarray, media: np.ndarray, rf: float, w0: np.ndarray, tope: float,
+               max_iter: int, tol: float):
+    exceso = media - rf
+
+    def f(w):
+        return -(exceso @ w) / math.sqrt(max(w @ cov @ w, 1e-18))
+
+    def grad(w):
+        sw = cov @ w
+        var = max(w @ sw, 1e-18)
+        return -(exceso / math.sqrt(var) - (exceso @ w) * sw / var ** 1.5)
+
+    # el Sharpe no depende de la escala de Σ: normalizamos el gradiente
+    escala = math.sqrt(np.trace(cov) / len(cov))
+    return _gradiente_proyectado(f, lambda w: grad(w) * escala, w0, tope, max_iter, tol)
+
+
+def paridad_riesgo(cov: np.ndarray, y0: np.ndarray, max_iter: int, tol: float):
+    """
+    Paridad de riesgo con presupuesto uniforme: resuelve Σy = b/y por
+    coordenadas; w = y / Σy. Devuelve (w, iteraciones).
+    """
+    n = len(cov)
+    b = np.full(n, 1.0 / n)
+    d = np.diag(cov)
+    escala = 1.0 / math.sqrt(y0 @ cov @ y0) if y0 @ cov @ y0 > 0 else 1.0
+    y = y0 * escala  # warm start en la escala de la solución (σ(y) ≈ 1)
+    for it in range(1, max_iter + 1):
+        anterior = y.copy()
+        for i in range(n):
+            resto = cov[i] @ y - d[i] * y[i]
+            y[i] = (-resto + math.sqrt(resto * resto + 4 * d[i] * b[i])) / (2 * d[i])
+        if np.abs(y - anterior).max() / y.max() < tol:
+            break
+    return y / y.sum(), it
+
+
+# ------------------- pesos objetivo -------------------
+
+def _firma(tickers: list, params: dict) -> str:
+    base = ",".join(tickers) + f"|{params['metodo']}|{params['maximo']}|{params['estimador']}"
+    return hashlib.sha1(base.encode()).hexdigest()[:16]
+
+
+def pesos(tickers: list, params: dict) -> dict:
+    """
+    Pesos objetivo de `tickers` con `params` (ver parametros()). Los tickers
+    sin rendimientos propios en la ventana (sin cierres) quedan fuera: peso
+    None. None si no hay covarianza para al menos dos tickers con datos.
+    """
+    cov_res = covarianza.obtener(tickers, params["estimador"])
+    if not cov_res:
+        return None
+    tickers = cov_res["tickers"]
+    con_datos = np.flatnonzero(cov_res["con_datos"])
+    if len(con_datos) < 2:
+        return None
+    cov = covarianza.anualizar(cov_res["cov"])[np.ix_(con_datos, con_datos)]
+    media = cov_res["media"][con_datos] * ANUAL
+    rf = float(_ajuste("ASIGNACION_TASA_LIBRE", 0.0))
+    max_iter = int(_ajuste("ASIGNACION_MAX_ITER", 5000))
+    tol = float(_ajuste("ASIGNACION_TOLERANCIA", 1e-9))
+
+    # warm start: última solución del mismo problema (mismos tickers con datos)
+    activos = [tickers[i] for i in con_datos]
+    metodo = "max_sharpe" if params["metodo"] == "vol_objetivo" else params["metodo"]
+    clave = f"asignacion:inicio:{_firma(activos, dict(params, metodo=metodo))}"
+    w0 = cache.get(clave)
+    if w0 is None or len(w0) != len(activos):
+        w0 = np.full(len(activos), 1.0 / len(activos))
+
+    if metodo == "min_varianza":
+        w, iteraciones = min_varianza(cov, w0, params["maximo"], max_iter, tol)
+    elif metodo == "paridad_riesgo":
+        w, iteraciones = paridad_riesgo(cov, w0, max_iter, tol)
+    else:
+        w, iteraciones = max_sharpe(cov, media, rf, w0, params["maximo"], max_iter, tol)
+    cache.set(clave, w, timeout=TTL)
+
+    vol = math.sqrt(max(w @ cov @ w, 0.0))
+    invertido = 1.0
+    if params["metodo"] == "vol_objetivo" and vol > 0:
+        invertido = min(1.0, params["vol_objetivo"] / vol)
+    w_final = w * invertido
+
+    contrib = w_final * (cov @ w_final)
+    var = contrib.sum()
+    por_ticker = dict.fromkeys(tickers)
+    for i, t in enumerate(activos):
+        por_ticker[t] = {
+            "peso": float(w_final[i]),
+            "contribucion_riesgo_pct": round(float(contrib[i] / var * 100), 2) if var > 0 else 0.0,
+        }
+    return {
+        "metodo": params["metodo"],
+        "estimador": cov_res["metodo"],
+        "fecha": cov_res["fecha"],
+        "iteraciones": int(iteraciones),
+        "pesos": por_ticker,
+        "invertido_pct": round(invertido * 100, 2),
+        "rentabilidad_esperada_pct": round(float(media @ w_final) * 100, 2),
+        "volatilidad_pct": round(vol * invertido * 100, 2),
+        "sharpe": round(float((media @ w - rf) / vol), 2) if vol > 0 else 0.0,
+    }
+
+
+# ------------------- operaciones -------------------
+
+def posiciones(user):
+    """(tickers, cantidades, precios) de las posiciones abiertas, con el precio de la vista de cartera."""
+    datos = {}
+    for a in Accion.objects.filter(user=user, cantidad__gt=0):
+        t = a.ticker.upper().strip()
+        cantidad, _ = datos.get(t, (0.0, 0.0))
+        datos[t] = (cantidad + float(a.cantidad), float(a.precio_actual or a.precio_compra or 0))
+    tickers = sorted(datos)
+    return (tickers,
+            np.array([datos[t][0] for t in tickers]),
+            np.array([datos[t][1] for t in tickers]))
+
+
+def operaciones(cantidades: np.ndarray, precios: np.ndarray, objetivo: np.ndarray, efectivo: float):
+    """
+    Acciones enteras a comprar (+) / vender (-) para acercar las posiciones
+    a los pesos `objetivo` (NaN = no tocar) sin gastar más que las ventas
+    más `efectivo`. Devuelve (ordenes, efectivo_restante).
+    """
+    valores = cantidades * precios
+    total = valores.sum() + efectivo
+    tocar = ~np.isnan(objetivo) & (precios > 0)
+    actual = valores / total if total > 0 else np.zeros_like(valores)
+    deseado = np.where(tocar, np.nan_to_num(objetivo) * total, valores)
+
+    ordenes = np.zeros(len(precios))
+    fuera = tocar & (np.abs(np.nan_to_num(objetivo) - actual) * 100 > UMBRAL_PP)
+    exceso = np.where(fuera, valores - deseado, 0.0)
+    vender = fuera & (exceso > 0)
+    ordenes[vender] = -np.minimum(np.floor(exceso[vender] / precios[vender]), np.floor(cantidades[vender]))
+    caja = efectivo - (ordenes[vender] * precios[vender]).sum()
+
+    comprar = fuera & (exceso < 0)
+    if comprar.any():
+        falta = -exceso[comprar]
+        escala = min(1.0, caja / falta.sum()) if falta.sum() > 0 else 0.0
+        ordenes[comprar] = np.floor(falta * escala / precios[comprar])
+        caja -= (ordenes[comprar] * precios[comprar]).sum()
+        # el efectivo que sobra del redondeo, acción a acción al más infraponderado
+        idx = np.flatnonzero(comprar)
+        while True:
+            hueco = deseado[idx] - (cantidades[idx] + ordenes[idx]) * precios[idx]
+            candidatos = np.flatnonzero((precios[idx] <= caja) & (hueco >= precios[idx] / 2))
+            if not len(candidatos):
+                break
+            j = idx[candidatos[np.argmax(hueco[candidatos])]]
+            ordenes[j] += 1
+            caja -= precios[j]
+    return ordenes, float(caja)
+
+
+def rebalanceo(user, params: dict = None, efectivo: float = 0.0) -> dict:
+    """
+    Pesos objetivo de la cartera de `user` y órdenes en acciones enteras.
+    Si no hay covarianza suficiente, el objetivo es igual ponderado.
+    """
+    params = params or parametros()
+    tickers, cantidades, precios = posiciones(user)
+    if not tickers:
+        return None
+    res = pesos(tickers, params)
+    if res is None:
+        res = {"metodo": "igual_ponderado", "pesos": {t: {"peso": 1.0 / len(tickers)} for t in tickers}}
+    objetivo = np.array([np.nan if res["pesos"].get(t) is None else res["pesos"][t]["peso"] for t in tickers])
+
+    total = float((cantidades * precios).sum() + efectivo)
+    # los tickers sin datos no se tocan: los pesos se reparten lo que queda
+    fijo = float((cantidades * precios)[np.isnan(objetivo)].sum())
+    if total > 0:
+        objetivo = objetivo * (total - fijo) / total
+    ordenes, caja = operaciones(cantidades, precios, objetivo, float(efectivo))
+    filas = []
+    for i, t in enumerate(tickers):
+        actual = cantidades[i] * precios[i] / total * 100 if total > 0 else 0.0
+        peso = None if np.isnan(objetivo[i]) else float(objetivo[i] * 100)
+        n = int(ordenes[i])
+        filas.append({
+            "ticker": t,
+            "target": round(peso, 2) if peso is not None else None,
+            "actual": round(float(actual), 2),
+            "diff": round(peso - float(actual), 2) if peso is not None else 0.0,
+            "sug": "buy" if n > 0 else "sell" if n < 0 else "ok",
+            "acciones": abs(n),
+            "precio": round(float(precios[i]), 4),
+            "importe": round(abs(n) * float(precios[i]), 2),
+        })
+    return dict(res, efectivo=round(float(efectivo), 2), efectivo_restante=round(caja, 2), rebalanceo=filas)
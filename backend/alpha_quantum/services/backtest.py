@@ -0,0 +1,334 @@
+# alpha_quantum/services/backtest.py
+"""
+Backtester vectorizado sobre la matriz de cierres diarios (almacén /
+BarraDiaria), sin bucles por barra.
+
+Cada estrategia produce pesos objetivo en unas fechas de evento; entre dos
+eventos las participaciones quedan fijas (los pesos derivan con el precio)
+y en cada evento se vuelve a los pesos objetivo al cierre. Las señales se
+calculan con el cierre del día anterior, así que no hay look-ahead.
+
+Comisiones como en Transaccion.importe(): una compra cuesta bruto +
+comisión y una venta ingresa bruto - comisión. La parte proporcional
+(comision_pct) reduce el factor de crecimiento del día y la fija
+(comision por operación) se descuenta con
+
+    E_t = G_t * (E_0 - sum_{k<=t} C_k / G_k)
+
+donde G es el producto acumulado de los factores de crecimiento.
+
+Estrategias:
+- "cruce": media rápida sobre la lenta (largo / liquidez), por ticker.
+- "reversion": entra si el z-score cae bajo -entrada y sale al volver a
+  -salida, por ticker.
+- "momentum": cada periodo de rebalanceo, los `top` tickers con mayor
+  rentabilidad en `ventana` sesiones (si es positiva), a partes iguales.
+- "rebalanceo": pesos iguales, rebalanceados con la `frecuencia` dada.
+Las dos primeras reparten el capital en una manga independiente por ticker.
+"""
+import hashlib
+import json
+from datetime import date, timedelta
+
+import numpy as np
+from django.core.cache import cache
+
+from .valoracion import arrastrar, matriz_precios, rejilla
+
+ANUAL = 252
+_UMBRAL = 1e-9
+FRECUENCIAS = {"mensual": "M", "trimestral": "Q", "anual": "Y"}
+
+# estrategias que operan cada ticker por separado
+POR_TICKER = ("cruce", "reversion")
+
+ESTRATEGIAS = {
+    "cruce": {"rapida": 20, "lenta": 50},
+    "reversion": {"ventana": 20, "entrada": 2.0, "salida": 0.0},
+    "momentum": {"ventana": 126, "top": 3, "frecuencia": "mensual"},
+    "rebalanceo": {"frecuencia": "mensual"},
+}
+
+
+def parametros(estrategia: str, valores: dict) -> dict:
+    """Parámetros de `estrategia` con sus valores por defecto (ValueError si no son válidos)."""
+    defecto = ESTRATEGIAS.get((estrategia or "").lower())
+    if defecto is None:
+        raise ValueError(f"Estrategia no soportada: {estrategia}")
+    params = {}
+    for k, d in defecto.items():
+        v = type(d)(valores[k]) if valores.get(k) not in (None, "") else d
+        if k == "frecuencia" and v not in FRECUENCIAS:
+            raise ValueError(f"Frecuencia no soportada: {v}")
+        if isinstance(v, int) and not 0 < v <= 1000:
+            raise ValueError(f"Valor no válido para {k}: {v}")
+        params[k] = v
+    if estrategia == "cruce" and params["rapida"] >= params["lenta"]:
+        raise ValueError("La media rápida debe ser menor que la lenta")
+    return params
+
+
+# ------------------- auxiliares vectorizados -------------------
+
+def _media_movil(p: np.ndarray, n: int) -> np.ndarray:
+    """SMA por columnas (NaN si la ventana no tiene n cierres)."""
+    out = np.full(p.shape, np.nan)
+    if len(p) >= n:
+        cero = np.zeros((1, p.shape[1]))
+        acum = np.cumsum(np.vstack([cero, np.nan_to_num(p)]), axis=0)
+        validos = np.cumsum(np.vstack([cero, ~np.isnan(p)]), axis=0)
+        completa = (validos[n:] - validos[:-n]) == n
+        out[n - 1:] = np.where(completa, (acum[n:] - acum[:-n]) / n, np.nan)
+    return out
+
+
+def _desviacion_movil(p: np.ndarray, n: int) -> np.ndarray:
+    out = np.full(p.shape, np.nan)
+    if len(p) >= n:
+        out[n - 1:] = np.lib.stride_tricks.sliding_window_view(p, n, axis=0).std(axis=-1)
+    return out
+
+
+def _retrasar(m: np.ndarray, relleno=0.0) -> np.ndarray:
+    """Desplaza una fila hacia abajo: la decisión de t usa datos hasta t-1."""
+    out = np.empty_like(m)
+    out[0] = relleno
+    out[1:] = m[:-1]
+    return out
+
+
+def _fechas_rebalanceo(dias: np.ndarray, frecuencia: str) -> np.ndarray:
+    """Primer día laborable de cada mes / trimestre / año (y el primero)."""
+    meses = dias.astype("datetime64[M]").astype(int)
+    periodo = {"M": meses, "Q": meses // 3, "Y": meses // 12}[FRECUENCIAS[frecuencia]]
+    ev = np.ones(len(dias), dtype=bool)
+    ev[1:] = periodo[1:] != periodo[:-1]
+    return ev
+
+
+# ------------------- señales -> (eventos, pesos objetivo) -------------------
+
+def _senales_a_eventos(senal: np.ndarray):
+    """Eventos donde cambia una señal 0/1 (ya retrasada) de una columna."""
+    ev = np.zeros(len(senal), dtype=bool)
+    ev[0] = senal[0] != 0
+    ev[1:] = senal[1:] != senal[:-1]
+    return ev, senal[:, None].astype(float)
+
+
+def _senal_cruce(p: np.ndarray, rapida: int, lenta: int) -> np.ndarray:
+    r, l = _media_movil(p, rapida), _media_movil(p, lenta)
+    with np.errstate(invalid="ignore"):
+        return _retrasar(np.where(np.isnan(l), 0.0, (r > l).astype(float)))
+
+
+def _senal_reversion(p: np.ndarray, ventana: int, entrada: float, salida: float) -> np.ndarray:
+    media, sd = _media_movil(p, ventana), _desviacion_movil(p, ventana)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z = (p - media) / sd
+    estado = np.full(p.shape, np.nan)
+    estado[z >= -salida] = 0.0   # salida (también fuera de mercado sin señal)
+    estado[z < -entrada] = 1.0   # entrada
+    estado[0] = np.where(np.isnan(estado[0]), 0.0, estado[0])
+    return _retrasar(np.nan_to_num(arrastrar(estado)))
+
+
+def _pesos_momentum(p: np.ndarray, dias: np.ndarray, ventana: int, top: int, frecuencia: str):
+    ev = _fechas_rebalanceo(dias, frecuencia)
+    pasado = np.full(p.shape, np.nan)
+    if ventana < len(p):
+        pasado[ventana:] = p[:-ventana]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rent = _retrasar(p / pasado - 1.0, relleno=np.nan)
+    rent = np.where(np.isnan(rent), -np.inf, rent)
+    orden = np.argsort(-rent, axis=1)[:, :top]
+    elegidos = np.zeros(p.shape, dtype=bool)
+    np.put_along_axis(elegidos, orden, True, axis=1)
+    elegidos &= rent > 0
+    n = elegidos.sum(axis=1, keepdims=True)
+    w = np.where(n > 0, elegidos / np.maximum(n, 1), 0.0)
+    return ev, w
+
+
+def _pesos_rebalanceo(p: np.ndarray, dias: np.ndarray, frecuencia: str):
+    ev = _fechas_rebalanceo(dias, frecuencia)
+    disponibles = ~np.isnan(p)
+    n = disponibles.sum(axis=1, keepdims=True)
+    return ev, np.where(n > 0, disponibles / np.maximum(n, 1), 0.0)
+
+
+# ------------------- motor -------------------
+
+def simular(p: np.ndarray, eventos: np.ndarray, pesos: np.ndarray, capital: float,
+            comision: float, comision_pct: float):
+    """
+    Curva de capital con participaciones fijas entre eventos.
+    `p`: cierres (días x tickers, NaN antes del primer dato); `pesos`:
+    objetivo en cada fila con evento. Devuelve (equity, deltas, p) donde
+    deltas son los cambios de peso en cada evento y p los cierres
+    rellenados con los que se opera.
+    """
+    t, k = p.shape
+    disponible = ~np.isnan(p)
+    pesos = np.where(disponible, pesos, 0.0)
+    # antes del primer cierre el peso es 0; se rellena hacia atrás para operar sin NaN
+    p = np.nan_to_num(arrastrar(arrastrar(p)[::-1])[::-1])
+    p = np.where(p > 0, p, 1.0)
+
+    filas = np.arange(t)
+    inicio = np.maximum.accumulate(np.where(eventos, filas, -1))   # evento vigente en t
+    previo = np.empty(t, dtype=int)
+    previo[0] = -1
+    previo[1:] = inicio[:-1]                                        # el que rige el día t
+
+    def _valor(seg, precios):
+        """Valor relativo a la fecha del evento `seg` (1 = valor en el evento)."""
+        ok = seg >= 0
+        s = np.where(ok, seg, 0)
+        w = np.where(ok[:, None], pesos[s], 0.0)
+        rel = precios / p[s]
+        return (1.0 - w.sum(axis=1)) + (w * rel).sum(axis=1), w * rel
+
+    hoy, deriva = _valor(previo, p)
+    ayer = np.ones(t)
+    ayer[1:] = _valor(previo[1:], p[:-1])[0]
+    crecimiento = hoy / ayer
+
+    # pesos justo antes de rebalancear y cambios en cada evento
+    antes = np.where(hoy[:, None] > 0, deriva / np.where(hoy > 0, hoy, 1.0)[:, None], 0.0)
+    deltas = np.where(eventos[:, None], pesos - antes, 0.0)
+    deltas[np.abs(deltas) < _UMBRAL] = 0.0
+    rotacion = np.abs(deltas).sum(axis=1)
+    crecimiento = crecimiento * (1.0 - comision_pct * rotacion)
+
+    g = np.cumprod(crecimiento)
+    fijas = comision * (deltas != 0).sum(axis=1)
+    equity = np.clip(g * (capital - np.cumsum(fijas / g)), 0.0, None)
+    return equity, deltas, p
+
+
+def curva(p: np.ndarray, dias: np.ndarray, estrategia: str, params: dict, capital: float,
+          comision: float = 0.0, comision_pct: float = 0.0):
+    """
+    Aplica `estrategia` a los cierres arrastrados `p` (días x tickers).
+    Devuelve (equity, nocional, p_operado, en_mercado): nocional es el
+    importe negociado con signo por día y ticker.
+    """
+    p = p.copy()
+    if estrategia in POR_TICKER:
+        # una manga independiente por ticker con capital / n
+        manga = capital / p.shape[1]
+        equity = np.zeros(len(dias))
+        nocional = np.zeros(p.shape)
+        expuesto = False
+        for j in range(p.shape[1]):
+            col = p[:, j:j + 1]
+            if estrategia == "cruce":
+                senal = _senal_cruce(col, params["rapida"], params["lenta"])[:, 0]
+            else:
+                senal = _senal_reversion(col, params["ventana"], params["entrada"], params["salida"])[:, 0]
+            ev, w = _senales_a_eventos(senal)
+            eq, d, pj = simular(col, ev, w, manga, comision, comision_pct)
+            equity += eq
+            nocional[:, j] = d[:, 0] * eq
+            p[:, j] = pj[:, 0]
+            expuesto |= bool(senal[-1])
+        return equity, nocional, p, expuesto
+
+    if estrategia == "momentum":
+        ev, w = _pesos_momentum(p, dias, params["ventana"], params["top"], params["frecuencia"])
+    else:
+        ev, w = _pesos_rebalanceo(p, dias, params["frecuencia"])
+    equity, deltas, p = simular(p, ev, w, capital, comision, comision_pct)
+    return equity, deltas * equity[:, None], p, bool(w[np.flatnonzero(ev)[-1]].any())
+
+
+def _operaciones(dias, tickers, p, nocional, comision, comision_pct) -> list:
+    """Operaciones a partir del importe negociado (con signo) de cada evento."""
+    ops = []
+    fila, col = np.nonzero(nocional)
+    for i, j in zip(fila.tolist(), col.tolist()):
+        bruto = abs(float(nocional[i, j]))
+        com = comision + comision_pct * bruto
+        compra = nocional[i, j] > 0
+        ops.append({
+            "fecha": str(dias[i]),
+            "ticker": tickers[j],
+            "tipo": "BUY" if compra else "SELL",
+            "cantidad": round(bruto / float(p[i, j]), 4),
+            "precio": round(float(p[i, j]), 4),
+            "comision": round(com, 2),
+            # mismo signo que Transaccion.importe()
+            "importe": round(bruto + com, 2) if compra else round(-(bruto - com), 2),
+        })
+    return ops
+
+
+def estadisticas(equity: np.ndarray, capital: float) -> dict:
+    if len(equity) < 2 or capital <= 0:
+        return {}
+    r = np.diff(equity) / np.where(equity[:-1] > 0, equity[:-1], 1.0)
+    pico = np.maximum.accumulate(equity)
+    dd = np.where(pico > 0, equity / pico - 1.0, 0.0)
+    anios = len(equity) / ANUAL
+    final = equity[-1] / capital
+    sd = r.std(ddof=1)
+    return {
+        "rentabilidad_pct": round(float((final - 1) * 100), 2),
+        "cagr_pct": round(float((final ** (1 / anios) - 1) * 100), 2) if final > 0 else -100.0,
+        "volatilidad_pct": round(float(sd * np.sqrt(ANUAL) * 100), 2),
+        "sharpe": round(float(r.mean() / sd * np.sqrt(ANUAL)), 2) if sd > 0 else 0.0,
+        "max_drawdown_pct": round(float(dd.min() * 100), 2),
+    }
+
+
+def ejecutar(tickers: list, estrategia: str, params: dict, desde: date = None, hasta: date = None,
+             capital: float = 10000.0, comision: float = 0.0, comision_pct: float = 0.0) -> dict:
+    """Backtest de `estrategia` sobre `tickers`; None si no hay cierres."""
+    tickers = sorted({t.upper().strip() for t in tickers if t})
+    hasta = hasta or date.today() - timedelta(days=1)
+    desde = desde or hasta - timedelta(days=3 * 365)
+    dias = rejilla(desde, hasta)
+    if not tickers or len(dias) < 2:
+        return None
+    p = matriz_precios(tickers, dias)
+    if np.isnan(p).all():
+        return None
+    p = arrastrar(p)
+
+    equity, nocional, p, expuesto = curva(p, dias, estrategia, params, capital, comision, comision_pct)
+    ops = _operaciones(dias, tickers, p, nocional, comision, comision_pct)
+
+    pico = np.maximum.accumulate(equity)
+    stats = estadisticas(equity, capital)
+    stats.update({
+        "operaciones": len(ops),
+        "comisiones": round(sum(o["comision"] for o in ops), 2),
+        "capital_final": round(float(equity[-1]), 2),
+    })
+    return {
+        "tickers": tickers,
+        "estrategia": estrategia,
+        "parametros": params,
+        "capital": capital,
+        "comision": comision,
+        "comision_pct": comision_pct,
+        "labels": [str(d) for d in dias],
+        "equity": np.round(equity, 2).tolist(),
+        "drawdown": np.round(np.where(pico > 0, equity / pico - 1.0, 0.0) * 100, 2).tolist(),
+        "operaciones": ops,
+        "estadisticas": stats,
+        "en_mercado": expuesto,
+    }
+
+
+def ejecutar_cacheado(tickers: list, estrategia: str, params: dict, **kwargs) -> dict:
+    """ejecutar() cacheado por sus argumentos y el día (las barras cambian a diario)."""
+    firma = json.dumps({"t": sorted(tickers), "e": estrategia, "p": params, "d": date.today().isoformat(),
+                        **{k: str(v) for k, v in kwargs.items()}}, sort_keys=True)
+    clave = "backtest:" + hashlib.sha256(firma.encode()).hexdigest()
+    res = cache.get(clave)
+    if res is None:
+        res = ejecutar(tickers, estrategia, params, **kwargs) or {}
+        cache.set(clave, res, timeout=6 * 3600)
+    return res or None
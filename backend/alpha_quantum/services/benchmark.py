@@ -0,0 +1,140 @@
+# alpha_quantum/services/benchmark.py
+"""
+Series de índices de referencia (benchmarks) frente a la cartera.
+
+Cada benchmark (BENCHMARKS = {codigo: símbolo}) se guarda como un
+Instrumento más en BarraDiaria / almacén de cierres y se completa de forma
+incremental con actualizar_historico (en segundo plano si está atrasado, y
+desde `manage.py actualizar_historico`).
+
+comparar() alinea sus cierres a las fechas de HistoricoCartera del usuario
+y calcula con NumPy beta, alpha, tracking error e information ratio. La
+respuesta se cachea por usuario, rango y una firma de los datos (última
+fecha y suma de valores del histórico y última barra del índice), así que
+cualquier cambio en ellos invalida la entrada sin señales.
+"""
+from datetime import date
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, Sum
+
+from ..models import BarraDiaria
+from ..models.historico import HistoricoCartera
+from .analitica import flujos, rendimientos
+from .valoracion import arrastrar, matriz_precios
+
+ANUAL = 252
+
+
+def simbolos() -> dict:
+    """{codigo: símbolo} de los benchmarks configurados."""
+    return {k.lower(): v.upper() for k, v in getattr(settings, "BENCHMARKS", {"spx": "SPY"}).items()}
+
+
+def ultima_barra(simbolo: str):
+    return BarraDiaria.objects.filter(instrumento_id=simbolo).aggregate(m=Max("fecha"))["m"]
+
+
+def solicitar_refresco(simbolo: str, ultima: date = None) -> None:
+    """Pide en segundo plano las barras que falten (una carga a la vez)."""
+    from ..utils import _ultimo_dia_habil, actualizar_historico
+    from .segundo_plano import lanzar
+
+    if ultima and ultima >= _ultimo_dia_habil(date.today()):
+        return
+    if cache.add(f"historico:cargando:{simbolo}", 1, timeout=600):
+        lanzar(actualizar_historico, simbolo, 365 * 5)
+
+
+def metricas(rp: np.ndarray, rb: np.ndarray) -> dict:
+    """
+    Beta, alpha de Jensen anualizada (sin tipo libre de riesgo), tracking
+    error e information ratio anualizados de los rendimientos diarios `rp`
+    (cartera) frente a `rb` (benchmark).
+    """
+    n = len(rp)
+    if n < 2:
+        return {"observaciones": n}
+    activo = rp - rb
+    var_b = rb.var(ddof=1)
+    beta = float(np.cov(rp, rb, ddof=1)[0, 1] / var_b) if var_b > 0 else 0.0
+    te = float(activo.std(ddof=1) * np.sqrt(ANUAL))
+    corr = np.corrcoef(rp, rb)[0, 1] if rp.std() > 0 and rb.std() > 0 else 0.0
+    return {
+        "observaciones": n,
+        "beta": round(beta, 4),
+        "alpha_pct": round(float((rp.mean() - beta * rb.mean()) * ANUAL * 100), 4),
+        "tracking_error_pct": round(te * 100, 4),
+        "information_ratio": round(float(activo.mean() * ANUAL / te), 4) if te > 0 else 0.0,
+        "correlacion": round(float(corr), 4),
+    }
+
+
+def calcular(user, simbolo: str, desde: date = None, hasta: date = None) -> dict:
+    """
+    Benchmark alineado a las fechas de HistoricoCartera de `user` entre
+    `desde` y `hasta`: rentabilidades acumuladas (%) de ambos y métricas.
+    """
+    hist = HistoricoCartera.objects.filter(user=user).order_by("fecha")
+    if desde:
+        hist = hist.filter(fecha__gte=desde)
+    if hasta:
+        hist = hist.filter(fecha__lte=hasta)
+    filas = list(hist.values_list("fecha", "valor"))
+    vacio = {"simbolo": simbolo, "labels": [], "values": [], "cartera": [], "metricas": {"observaciones": 0}}
+    if len(filas) < 2:
+        return vacio
+
+    fechas = np.array([f for f, _ in filas], dtype="datetime64[D]")
+    valor = np.array([float(v or 0) for _, v in filas])
+    bench = arrastrar(matriz_precios([simbolo], fechas))[:, 0]
+    validos = np.flatnonzero(~np.isnan(bench))
+    if not len(validos):
+        return vacio
+    # antes del primer cierre conocido, el índice queda plano
+    bench[: validos[0]] = bench[validos[0]]
+
+    # cartera: rendimientos descontando aportaciones y retiradas
+    rp = rendimientos(valor, flujos(user, fechas))
+    acum_p = (np.concatenate(([1.0], np.cumprod(1.0 + np.nan_to_num(rp)))) - 1.0) * 100
+    with np.errstate(invalid="ignore", divide="ignore"):
+        acum_b = (bench / bench[0] - 1.0) * 100
+        rb = bench[1:] / bench[:-1] - 1.0
+    ok = np.isfinite(rp) & np.isfinite(rb)
+    ok[: validos[0]] = False  # sin datos reales del índice
+
+    return {
+        "simbolo": simbolo,
+        "labels": [str(f) for f in fechas],
+        "values": np.round(acum_b, 4).tolist(),
+        "cartera": np.round(acum_p, 4).tolist(),
+        "metricas": metricas(rp[ok], rb[ok]),
+    }
+
+
+def comparar(user, codigo: str, desde: date = None, hasta: date = None):
+    """calcular() cacheado por usuario y rango; None si `codigo` no existe."""
+    simbolo = simbolos().get((codigo or "").lower())
+    if simbolo is None:
+        return None
+
+    ultima = ultima_barra(simbolo)
+    solicitar_refresco(simbolo, ultima)
+
+    user_id = getattr(user, "pk", user)
+    hist = HistoricoCartera.objects.filter(user_id=user_id)
+    if desde:
+        hist = hist.filter(fecha__gte=desde)
+    if hasta:
+        hist = hist.filter(fecha__lte=hasta)
+    firma = hist.aggregate(n=Count("id"), f=Max("fecha"), s=Sum("valor"))
+    clave = (f"benchmark:{user_id}:{codigo.lower()}:{desde}:{hasta}:"
+             f"{firma['n']}:{firma['f']}:{firma['s']}:{ultima}")
+    res = cache.get(clave)
+    if res is None:
+        res = calcular(user_id, simbolo, desde, hasta)
+        res["codigo"] = codigo.lower()
+        cache.set(clave, res, timeout=24 * 3600)
+    return res
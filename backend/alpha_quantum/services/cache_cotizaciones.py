@@ -0,0 +1,164 @@
+# alpha_quantum/services/cache_cotizaciones.py
+"""
+Caché compartida de cotizaciones (precio actual por ticker) sobre el framework
+de caché de Django.
+
+- TTL configurable (settings.COTIZACIONES_CACHE_TTL, segundos).
+- Stale-while-revalidate: durante COTIZACIONES_CACHE_STALE segundos más se
+  sirve el último precio y se refresca en segundo plano.
+- Contadores de aciertos/fallos/edad consultables con estadisticas().
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .segundo_plano import lanzar
+
+_PREFIJO = "cotizacion"
+_CONTADORES = ("hits", "stale", "misses", "edad_ms")
+
+
+def _ttl() -> int:
+    return int(getattr(settings, "COTIZACIONES_CACHE_TTL", 60))
+
+
+def _stale() -> int:
+    return int(getattr(settings, "COTIZACIONES_CACHE_STALE", 300))
+
+
+def _clave(ticker: str) -> str:
+    return f"{_PREFIJO}:{ticker.upper().strip()}"
+
+
+def _incr(nombre: str, delta: int = 1) -> None:
+    clave = f"{_PREFIJO}:stats:{nombre}"
+    if cache.add(clave, delta, timeout=None):
+        return
+    try:
+        cache.incr(clave, delta)
+    except ValueError:
+        # expulsada entre add() e incr()
+        cache.set(clave, delta, timeout=None)
+
+
+def leer(ticker: str):
+    """Devuelve (precio, edad_en_segundos) o (None, None) si no hay entrada."""
+    entrada = cache.get(_clave(ticker))
+    if not entrada:
+        return None, None
+    return entrada["precio"], time.time() - entrada["ts"]
+
+
+def _entrada(precio: float) -> dict:
+    return {"precio": float(precio), "ts": time.time()}
+
+
+def guardar(ticker: str, precio: float) -> None:
+    if not precio:
+        return  # nunca cacheamos un fallo (0.0) del proveedor
+    cache.set(_clave(ticker), _entrada(precio), timeout=_ttl() + _stale())
+
+
+def guardar_varios(precios: dict) -> None:
+    validos = {_clave(t): _entrada(p) for t, p in precios.items() if p}
+    if validos:
+        cache.set_many(validos, timeout=_ttl() + _stale())
+
+
+def _refrescar(ticker: str, descargar) -> None:
+    try:
+        guardar(ticker, descargar(ticker))
+    finally:
+        cache.delete(f"{_clave(ticker)}:refrescando")
+
+
+def _revalidar(ticker: str, descargar) -> None:
+    # un único refresco en vuelo por ticker
+    if cache.add(f"{_clave(ticker)}:refrescando", 1, timeout=30):
+        lanzar(_refrescar, ticker, descargar)
+
+
+def obtener(ticker: str, descargar) -> float:
+    """
+    Precio de `ticker` desde la caché; si no está, llama a descargar(ticker)
+    y guarda el resultado.
+    """
+    precio, edad = leer(ticker)
+    if precio is not None:
+        if edad < _ttl():
+            _incr("hits")
+            _incr("edad_ms", int(edad * 1000))
+            return precio
+        if edad < _ttl() + _stale():
+            _incr("stale")
+            _incr("edad_ms", int(edad * 1000))
+            _revalidar(ticker, descargar)
+            return precio
+
+    _incr("misses")
+    precio = descargar(ticker)
+    guardar(ticker, precio)
+    return precio
+
+
+def _refrescar_lote(tickers: list, descargar_lote) -> None:
+    try:
+        guardar_varios(descargar_lote(tickers))
+    finally:
+        cache.delete_many([f"{_clave(t)}:refrescando" for t in tickers])
+
+
+def obtener_varios(tickers, descargar_lote) -> dict:
+    """
+    Versión por lotes de obtener(): devuelve {TICKER: precio}.
+    Los tickers sin entrada se piden todos juntos con descargar_lote(lista),
+    y los caducados se revalidan juntos en segundo plano.
+    """
+    unicos = list(dict.fromkeys(t.upper().strip() for t in tickers if t and t.strip()))
+    entradas = cache.get_many([_clave(t) for t in unicos])
+    ahora = time.time()
+
+    precios, caducados, faltan = {}, [], []
+    for t in unicos:
+        entrada = entradas.get(_clave(t))
+        edad = ahora - entrada["ts"] if entrada else None
+        if entrada and edad < _ttl() + _stale():
+            precios[t] = entrada["precio"]
+            _incr("edad_ms", int(edad * 1000))
+            if edad < _ttl():
+                _incr("hits")
+            else:
+                _incr("stale")
+                caducados.append(t)
+        else:
+            faltan.append(t)
+
+    if caducados:
+        lote = [t for t in caducados if cache.add(f"{_clave(t)}:refrescando", 1, timeout=30)]
+        if lote:
+            lanzar(_refrescar_lote, lote, descargar_lote)
+
+    if faltan:
+        _incr("misses", len(faltan))
+        nuevos = {t: p for t, p in (descargar_lote(faltan) or {}).items() if p}
+        guardar_varios(nuevos)
+        precios.update(nuevos)
+    return precios
+
+
+def estadisticas() -> dict:
+    """Contadores acumulados de la caché de cotizaciones."""
+    valores = cache.get_many([f"{_PREFIJO}:stats:{n}" for n in _CONTADORES])
+    c = {n: int(valores.get(f"{_PREFIJO}:stats:{n}", 0)) for n in _CONTADORES}
+    servidos = c["hits"] + c["stale"]
+    total = servidos + c["misses"]
+    return {
+        "hits": c["hits"],
+        "stale": c["stale"],
+        "misses": c["misses"],
+        "hit_ratio": round(servidos / total, 4) if total else 0.0,
+        "edad_media_s": round(c["edad_ms"] / servidos / 1000, 2) if servidos else 0.0,
+        "ttl_s": _ttl(),
+        "stale_s": _stale(),
+    }
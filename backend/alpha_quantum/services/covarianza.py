@@ -0,0 +1,261 @@
+# alpha_quantum/services/covarianza.py
+"""
+Matrices de covarianza y correlación de un conjunto de tickers, para el
+riesgo, el optimizador de cartera y las vistas de diversificación.
+
+Dos estimadores sobre rendimientos simples diarios:
+
+- muestral con contracción de Ledoit-Wolf hacia la identidad escalada
+  (mu·I, mu = varianza media), sobre una ventana de COVARIANZA_VENTANA
+  días. Se cachea por (tickers, ventana, día de mercado);
+- EWMA (RiskMetrics, media cero): Σ_t = λ·Σ_{t-1} + (1-λ)·r_t·r_tᵀ. Su
+  estado (fecha, último cierre, Σ y media EWMA) se guarda en caché y, cuando llega una
+  barra nueva, se actualiza solo con los días que faltan en vez de
+  recalcular la ventana. La contracción aplica la intensidad de
+  Ledoit-Wolf estimada al arrancar el estado.
+
+Junto a cada matriz va la media de los rendimientos diarios del mismo
+estimador y, por ticker, si tiene datos propios (al menos
+MIN_RENDIMIENTOS rendimientos no nulos en bruto): la contracción da
+varianza positiva también a los tickers sin cierres, así que la diagonal
+no sirve para distinguirlos. Las matrices son diarias; anualizar() las pasa a base anual.
+"""
+import hashlib
+from datetime import date, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from .riesgo import dia_mercado, matriz_rendimientos
+from .valoracion import arrastrar, matriz_precios, rejilla
+
+ANUAL = 252
+# huecos mayores que esto (días naturales) reinician el estado EWMA
+MAX_HUECO_EWMA = 30
+TTL = 24 * 3600
+MIN_RENDIMIENTOS = 2
+# límites de las peticiones (unos 10 años de sesiones)
+MAX_VENTANA = 2520
+MAX_TICKERS = 50
+
+
+def _ventana() -> int:
+    return int(getattr(settings, "COVARIANZA_VENTANA", 252))
+
+
+def _lambda() -> float:
+    return float(getattr(settings, "COVARIANZA_LAMBDA", 0.94))
+
+
+def normalizar(tickers) -> list:
+    return sorted({t.upper().strip() for t in tickers if t and t.strip()})
+
+
+def _firma(tickers: list) -> str:
+    return hashlib.sha1(",".join(tickers).encode()).hexdigest()[:16]
+
+
+# ------------------- estimadores -------------------
+
+def ledoit_wolf(r: np.ndarray):
+    """
+    (Σ contraída, intensidad) de Ledoit-Wolf (2004) para la matriz de
+    rendimientos `r` (observaciones x activos), hacia mu·I.
+    """
+    n, p = r.shape
+    x = r - r.mean(axis=0)
+    muestral = x.T @ x / n
+    mu = np.trace(muestral) / p
+    delta = ((muestral - mu * np.eye(p)) ** 2).sum() / p
+    if delta <= 0:
+        return muestral, 0.0
+    x2 = x ** 2
+    beta = ((x2.T @ x2).sum() / n - (muestral ** 2).sum()) / (p * n)
+    intensidad = float(min(beta, delta) / delta)
+    return (1.0 - intensidad) * muestral + intensidad * mu * np.eye(p), intensidad
+
+
+def contraer(cov: np.ndarray, intensidad: float) -> np.ndarray:
+    p = cov.shape[0]
+    return (1.0 - intensidad) * cov + intensidad * np.trace(cov) / p * np.eye(p)
+
+
+def correlacion(cov: np.ndarray) -> np.ndarray:
+    sd = np.sqrt(np.clip(np.diag(cov), 0.0, None))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        c = cov / np.outer(sd, sd)
+    c = np.nan_to_num(c, nan=0.0)
+    np.fill_diagonal(c, 1.0)
+    return np.clip(c, -1.0, 1.0)
+
+
+def anualizar(cov: np.ndarray) -> np.ndarray:
+    return cov * ANUAL
+
+
+def _rendimientos(tickers: list, hasta: date, dias: int):
+    """(fechas, precios, R) de la ventana sin los días en que nada se mueve."""
+    fechas, precios, r = matriz_rendimientos(tickers, hasta, dias)
+    movidos = np.any(r != 0, axis=1)
+    return fechas, precios, r[movidos]
+
+
+def _resultado(tickers: list, fecha: date, metodo: str, observaciones: int, cuenta: np.ndarray,
+               media: np.ndarray, cov: np.ndarray, intensidad: float) -> dict:
+    return {
+        "tickers": tickers,
+        "con_datos": (cuenta >= MIN_RENDIMIENTOS).tolist(),
+        "fecha": fecha.isoformat(),
+        "metodo": metodo,
+        "observaciones": int(observaciones),
+        "contraccion": round(intensidad, 4),
+        "media": media,
+        "cov": cov,
+        "corr": correlacion(cov),
+    }
+
+
+# ------------------- Ledoit-Wolf por ventana -------------------
+
+def calcular(tickers: list, ventana: int = None, hasta: date = None) -> dict:
+    """Covarianza Ledoit-Wolf diaria de `tickers` (None si faltan datos)."""
+    tickers = normalizar(tickers)
+    if not tickers:
+        return None
+    hasta = hasta or dia_mercado()
+    _, _, r = _rendimientos(tickers, hasta, ventana or _ventana())
+    if len(r) < 2:
+        return None
+    cov, intensidad = ledoit_wolf(r)
+    return _resultado(tickers, hasta, "ledoit_wolf", len(r), (r != 0).sum(axis=0), r.mean(axis=0), cov,
+                      intensidad)
+
+
+def matriz(tickers: list, ventana: int = None, hasta: date = None) -> dict:
+    """calcular() cacheado por (tickers, ventana, día de mercado)."""
+    tickers = normalizar(tickers)
+    ventana = int(ventana or _ventana())
+    hasta = hasta or dia_mercado()
+    clave = f"covarianza:lw:{_firma(tickers)}:{ventana}:{hasta.isoformat()}"
+    res = cache.get(clave)
+    if res is None:
+        res = calcular(tickers, ventana, hasta) or {}
+        cache.set(clave, res, timeout=TTL)
+    return res or None
+
+
+# ------------------- EWMA incremental -------------------
+
+def _iniciar_ewma(tickers: list, hasta: date, ventana: int, lam: float):
+    """
+    Estado EWMA sembrado con la covarianza Ledoit-Wolf de la ventana; queda
+    fechado en el último día con movimiento, para que la barra de hoy se
+    aplique aunque aún no haya llegado.
+    """
+    fechas, precios, r = matriz_rendimientos(tickers, hasta, ventana)
+    movidos = np.flatnonzero(np.any(r != 0, axis=1))
+    if len(movidos) < 2:
+        return None
+    ultimo = movidos[-1] + 1  # fila de precios del último día con movimiento
+    r = r[movidos]
+    semilla, intensidad = ledoit_wolf(r)
+    # Σ_n = λ^n·Σ_0 + Σ_i (1-λ)·λ^(n-1-i)·r_i·r_iᵀ, en una sola multiplicación
+    n = len(r)
+    pesos = (1.0 - lam) * lam ** np.arange(n - 1, -1, -1)
+    cov = lam ** n * semilla + (r * pesos[:, None]).T @ r
+    media = lam ** n * r.mean(axis=0) + pesos @ r
+    return {
+        "fecha": fechas[ultimo].item(),
+        "precios": precios[ultimo].copy(),
+        "cuenta": (r != 0).sum(axis=0),
+        "media": media,
+        "cov": cov,
+        "contraccion": intensidad,
+        "observaciones": n,
+    }
+
+
+def _avanzar_ewma(estado: dict, tickers: list, hasta: date, lam: float) -> dict:
+    """
+    Aplica al estado los rendimientos de los días (fecha, hasta] que ya
+    tienen alguna barra; los posteriores se aplicarán cuando lleguen.
+    """
+    dias = rejilla(estado["fecha"] + timedelta(days=1), hasta)
+    nuevos = matriz_precios(tickers, dias)
+    con_barra = np.flatnonzero(~np.isnan(nuevos).all(axis=1))
+    if not len(con_barra):
+        return estado
+    dias, nuevos = dias[: con_barra[-1] + 1], nuevos[: con_barra[-1] + 1]
+    precios = arrastrar(np.vstack([estado["precios"], nuevos]))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        r = precios[1:] / precios[:-1] - 1.0
+    r = np.nan_to_num(r, nan=0.0, posinf=0.0, neginf=0.0)
+    media, cov, n = estado["media"], estado["cov"], estado["observaciones"]
+    cuenta = estado["cuenta"] + (r != 0).sum(axis=0)
+    for fila in r[np.any(r != 0, axis=1)]:
+        media = lam * media + (1.0 - lam) * fila
+        cov = lam * cov + (1.0 - lam) * np.outer(fila, fila)
+        n += 1
+    return dict(estado, fecha=dias[-1].item(), precios=precios[-1].copy(), cuenta=cuenta, media=media,
+                cov=cov, observaciones=n)
+
+
+def ewma(tickers: list, hasta: date = None, lam: float = None, ventana: int = None) -> dict:
+    """
+    Covarianza EWMA diaria de `tickers` a `hasta`, actualizando el estado
+    cacheado con las barras nuevas (o arrancándolo si no hay, si es
+    posterior a `hasta` o si el hueco es demasiado grande).
+    """
+    tickers = normalizar(tickers)
+    if not tickers:
+        return None
+    hasta = hasta or dia_mercado()
+    lam = float(lam or _lambda())
+    ventana = int(ventana or _ventana())
+    clave = f"covarianza:ewma:{_firma(tickers)}:{lam}:{ventana}"
+
+    estado = cache.get(clave)
+    if estado and estado["fecha"] <= hasta and (hasta - estado["fecha"]).days <= MAX_HUECO_EWMA:
+        if estado["fecha"] < hasta:
+            avanzado = _avanzar_ewma(estado, tickers, hasta, lam)
+            if avanzado is not estado:
+                estado = avanzado
+                cache.set(clave, estado, timeout=TTL)
+    else:
+        estado = _iniciar_ewma(tickers, hasta, ventana, lam)
+        if estado is None:
+            return None
+        cache.set(clave, estado, timeout=TTL)
+
+    cov = contraer(estado["cov"], estado["contraccion"])
+    return _resultado(tickers, hasta, "ewma", estado["observaciones"], estado["cuenta"], estado["media"],
+                      cov, estado["contraccion"])
+
+
+# ------------------- salida -------------------
+
+def obtener(tickers: list, metodo: str = "ledoit_wolf", ventana: int = None, hasta: date = None) -> dict:
+    if ventana is not None and not 2 <= ventana <= MAX_VENTANA:
+        raise ValueError(f"ventana debe estar entre 2 y {MAX_VENTANA}")
+    if len(normalizar(tickers)) > MAX_TICKERS:
+        raise ValueError(f"Como máximo {MAX_TICKERS} tickers")
+    if metodo == "ledoit_wolf":
+        return matriz(tickers, ventana, hasta)
+    if metodo == "ewma":
+        return ewma(tickers, hasta, ventana=ventana)
+    raise ValueError(f"Método no soportado: {metodo}")
+
+
+def serializar(res: dict) -> dict:
+    """Versión JSON de un resultado: matrices en listas y volatilidades anuales."""
+    if not res:
+        return None
+    vol = np.sqrt(np.clip(np.diag(anualizar(res["cov"])), 0.0, None))
+    return dict(
+        res,
+        media=np.round(res["media"], 8).tolist(),
+        cov=np.round(res["cov"], 10).tolist(),
+        corr=np.round(res["corr"], 4).tolist(),
+        volatilidad_pct=dict(zip(res["tickers"], np.round(vol * 100, 2).tolist())),
+    )
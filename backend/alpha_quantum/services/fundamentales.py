@@ -0,0 +1,209 @@
+# alpha_quantum/services/fundamentales.py
+"""
+Almacén de fundamentales por ticker (modelo FundamentalTicker) con una
+política de frescura distinta por tipo de estado:
+
+- OVERVIEW: caduca a las FUNDAMENTALES_OVERVIEW_TTL horas.
+- INCOME_STATEMENT / BALANCE_SHEET: solo se vuelven a pedir cuando toca un
+  nuevo trimestre (fin del último periodo + 3 meses + plazo de presentación).
+- EARNINGS: cuando han pasado ~3 meses desde la última publicación.
+
+Las vistas leen siempre de BD; si un estado está vencido se refresca en
+segundo plano. Solo se descarga en la petición si no hay nada guardado.
+"""
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from ..models.fundamental_ticker import FundamentalTicker
+from . import limitador
+from .proveedores import ErrorProveedor, alphavantage
+from .segundo_plano import lanzar
+
+TRIMESTRE = timedelta(days=91)
+N_PERIODOS = 20
+
+
+def _num(v):
+    try:
+        if v in (None, "", "N/A", "None", "-"):
+            return None
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def _fecha(v):
+    try:
+        return datetime.strptime(v, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return None
+
+
+# ------------------- descarga + normalización -------------------
+
+def _consultar(function: str, ticker: str) -> dict:
+    data = alphavantage.get("query", {"function": function, "symbol": ticker}).json() or {}
+    if "Note" in data:
+        limitador.agotar("alphavantage")
+    return data
+
+
+def _overview(ticker: str):
+    data = _consultar("OVERVIEW", ticker)
+    if "Note" in data:
+        return {"error": "Límite de peticiones de Alpha Vantage alcanzado. Intenta más tarde."}, None
+    if not data or "Name" not in data:
+        return None, None
+    return {
+        "nombre": data.get("Name"),
+        "sector": data.get("Sector"),
+        "industria": data.get("Industry"),
+        "pais": data.get("Country"),
+        "capitalizacion": data.get("MarketCapitalization"),
+        "empleados": data.get("FullTimeEmployees"),
+        "PER": data.get("PERatio"),
+        "PEG": data.get("PEGRatio"),
+        "ROE": data.get("ReturnOnEquityTTM"),
+        "ROA": data.get("ReturnOnAssetsTTM"),
+        "EPS": data.get("EPS"),
+        "deuda_equity": data.get("DebtEquityRatio"),
+        "dividendo": data.get("DividendYield"),
+    }, _fecha(data.get("LatestQuarter"))
+
+
+def _income(ticker: str):
+    rows = (_consultar("INCOME_STATEMENT", ticker).get("quarterlyReports") or [])[:N_PERIODOS]
+    datos = [{
+        "fecha": r.get("fiscalDateEnding"),
+        "ingresos": _num(r.get("totalRevenue")),
+        "beneficio_bruto": _num(r.get("grossProfit")),
+        "resultado_operativo": _num(r.get("operatingIncome")),
+        "beneficio_neto": _num(r.get("netIncome")),
+    } for r in rows]
+    return datos or None, _fecha(datos[0]["fecha"]) if datos else None
+
+
+def _balance(ticker: str):
+    rows = (_consultar("BALANCE_SHEET", ticker).get("quarterlyReports") or [])[:N_PERIODOS]
+    datos = [{
+        "fecha": r.get("fiscalDateEnding"),
+        "activos": _num(r.get("totalAssets")),
+        "pasivos": _num(r.get("totalLiabilities")),
+    } for r in rows]
+    return datos or None, _fecha(datos[0]["fecha"]) if datos else None
+
+
+def _earnings(ticker: str):
+    rows = (_consultar("EARNINGS", ticker).get("quarterlyEarnings") or [])[:N_PERIODOS]
+    datos = [{
+        "fecha": r.get("reportedDate"),
+        "periodo": r.get("fiscalDateEnding"),
+        "eps": _num(r.get("reportedEPS")),
+        "eps_estimado": _num(r.get("estimatedEPS")),
+    } for r in rows]
+    return datos or None, _fecha(datos[0]["fecha"]) if datos else None
+
+
+# tipo -> descarga(ticker) -> (datos normalizados | None, último periodo)
+DESCARGAS = {
+    "OVERVIEW": _overview,
+    "INCOME_STATEMENT": _income,
+    "BALANCE_SHEET": _balance,
+    "EARNINGS": _earnings,
+}
+
+
+# ------------------- política de frescura -------------------
+
+def proximo_refresco(reg: FundamentalTicker):
+    """Momento a partir del cual merece la pena volver a pedir este estado."""
+    reintento = timedelta(hours=getattr(settings, "FUNDAMENTALES_REINTENTO_HORAS", 24))
+    if reg.tipo == "OVERVIEW" or reg.ultimo_periodo is None:
+        ttl = timedelta(hours=getattr(settings, "FUNDAMENTALES_OVERVIEW_TTL", 24))
+        base = reg.actualizado + ttl if reg.actualizado else reg.comprobado + reintento
+        return max(base, reg.comprobado + reintento)
+
+    desfase = timedelta(days=getattr(settings, "FUNDAMENTALES_DESFASE_PRESENTACION", 45))
+    if reg.tipo == "EARNINGS":
+        vence = reg.ultimo_periodo + TRIMESTRE            # fecha de publicación
+    else:
+        vence = reg.ultimo_periodo + TRIMESTRE + desfase  # fin de periodo + plazo
+    vence = timezone.make_aware(datetime.combine(vence, datetime.min.time()))
+    # si ya tocaba y no había nada nuevo, no insistimos más de una vez por reintento
+    return max(vence, reg.comprobado + reintento)
+
+
+def vencido(reg: FundamentalTicker) -> bool:
+    return timezone.now() >= proximo_refresco(reg)
+
+
+# ------------------- lectura / refresco -------------------
+
+def refrescar(ticker: str, tipo: str):
+    """Descarga y guarda un estado. Devuelve lo descargado (o None)."""
+    ticker = ticker.upper().strip()
+    ahora = timezone.now()
+    try:
+        datos, ultimo = DESCARGAS[tipo](ticker)
+    except (ErrorProveedor, ValueError) as e:
+        print(f"[FUNDAMENTALES] {ticker} {tipo}: {e}")
+        datos, ultimo = None, None
+
+    if datos and not (isinstance(datos, dict) and datos.get("error")):
+        FundamentalTicker.objects.update_or_create(
+            ticker=ticker, tipo=tipo,
+            defaults={"datos": datos, "ultimo_periodo": ultimo, "actualizado": ahora, "comprobado": ahora},
+        )
+    else:
+        # se registra el intento aunque no haya fila todavía: así obtener()
+        # respeta el reintento en vez de volver a llamar a AV en cada vista
+        FundamentalTicker.objects.update_or_create(
+            ticker=ticker, tipo=tipo,
+            defaults={"comprobado": ahora},
+            create_defaults={"comprobado": ahora, "actualizado": None, "datos": []},
+        )
+    return datos
+
+
+def _refrescar_fondo(ticker: str, tipo: str) -> None:
+    try:
+        refrescar(ticker, tipo)
+    finally:
+        cache.delete(f"fundamentales:refrescando:{ticker}:{tipo}")
+
+
+def obtener(ticker: str, tipo: str):
+    """
+    Datos normalizados de `tipo` para `ticker` desde BD. Si no hay nada se
+    descargan en el momento; si están vencidos se sirven igualmente y se
+    refrescan en segundo plano.
+    """
+    if not alphavantage.configurado:
+        return None
+    ticker = ticker.upper().strip()
+    reg = FundamentalTicker.objects.filter(ticker=ticker, tipo=tipo).first()
+    if reg is None or reg.actualizado is None:
+        if reg is not None and not vencido(reg):
+            return None  # ya se intentó hace poco sin éxito
+        return refrescar(ticker, tipo)
+
+    if vencido(reg) and cache.add(f"fundamentales:refrescando:{ticker}:{tipo}", 1, timeout=300):
+        lanzar(_refrescar_fondo, ticker, tipo)
+    return reg.datos
+
+
+def refrescar_vencidos(tickers) -> int:
+    """Refresca (en el hilo actual) los estados vencidos o ausentes de `tickers`."""
+    n = 0
+    tickers = {t.upper().strip() for t in tickers if t}
+    existentes = {(r.ticker, r.tipo): r for r in FundamentalTicker.objects.filter(ticker__in=tickers)}
+    for t in sorted(tickers):
+        for tipo in DESCARGAS:
+            reg = existentes.get((t, tipo))
+            if reg is None or vencido(reg):
+                refrescar(t, tipo)
+                n += 1
+    return n
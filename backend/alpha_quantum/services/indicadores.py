@@ -0,0 +1,349 @@
+# alpha_quantum/services/indicadores.py
+"""
+Indicadores técnicos sobre las barras diarias compartidas (BarraDiaria):
+SMA, EMA, RSI, MACD, bandas de Bollinger y ATR.
+
+Cada indicador guarda su estado (ventana, medias de Wilder, EMAs...) y
+actualizar() incorpora una barra nueva en O(1). La primera vez se calcula
+la serie entera (SMA y Bollinger vectorizados con NumPy; las medias
+exponenciales son recursivas y se recorren una vez) y se cachea por
+(ticker, indicador, parámetros), compartida entre todos los usuarios que
+siguen el ticker. En las siguientes consultas solo se leen y se añaden las
+barras posteriores a la última cacheada, siempre que esa última no haya
+cambiado (la carga incremental solo escribe barras posteriores a la última
+guardada, así que es la única que puede reescribir una pasada concurrente);
+si ha cambiado, la serie se recalcula entera. La caché caduca a las TTL
+segundos, de modo que cualquier otra corrección acaba recalculándose.
+"""
+import abc
+import inspect
+import math
+from collections import deque
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from ..models import BarraDiaria
+
+_NAN = float("nan")
+TTL = 24 * 3600
+
+
+def _max_barras() -> int:
+    return int(getattr(settings, "INDICADORES_BARRAS", 1000))
+
+
+# ------------------- indicadores con estado -------------------
+
+class Indicador(abc.ABC):
+    """Base: `salidas` nombra los valores que devuelve actualizar()."""
+    salidas = ("valor",)
+
+    @abc.abstractmethod
+    def actualizar(self, cierre: float, maximo: float, minimo: float) -> tuple:
+        """Incorpora una barra y devuelve una tupla con un valor por salida."""
+
+    def calcular(self, cierre: np.ndarray, maximo: np.ndarray, minimo: np.ndarray) -> dict:
+        """Serie completa ({salida: array}); deja el estado tras la última barra."""
+        filas = [self.actualizar(c, h, l) for c, h, l in zip(cierre.tolist(), maximo.tolist(), minimo.tolist())]
+        columnas = np.array(filas, dtype=float).reshape(len(filas), len(self.salidas))
+        return {s: columnas[:, j] for j, s in enumerate(self.salidas)}
+
+
+class _Media:
+    """Media exponencial con semilla SMA de los primeros `n` valores."""
+    __slots__ = ("n", "alpha", "valor", "vistos", "suma")
+
+    def __init__(self, n: int, alpha: float = None):
+        self.n = n
+        self.alpha = alpha if alpha is not None else 2.0 / (n + 1)
+        self.valor = _NAN
+        self.vistos = 0
+        self.suma = 0.0
+
+    def actualizar(self, x: float) -> float:
+        if self.vistos < self.n:
+            self.vistos += 1
+            self.suma += x
+            if self.vistos == self.n:
+                self.valor = self.suma / self.n
+        else:
+            self.valor += self.alpha * (x - self.valor)
+        return self.valor
+
+
+class SMA(Indicador):
+    def __init__(self, periodo: int = 20):
+        self.periodo = periodo
+        self.ventana = deque(maxlen=periodo)
+        self.suma = 0.0
+
+    def actualizar(self, cierre, maximo=None, minimo=None):
+        if len(self.ventana) == self.periodo:
+            self.suma -= self.ventana[0]
+        self.ventana.append(cierre)
+        self.suma += cierre
+        return (self.suma / self.periodo if len(self.ventana) == self.periodo else _NAN,)
+
+    def calcular(self, cierre, maximo, minimo):
+        n = self.periodo
+        valor = np.full(len(cierre), np.nan)
+        if len(cierre) >= n:
+            acum = np.concatenate(([0.0], np.cumsum(cierre)))
+            valor[n - 1:] = (acum[n:] - acum[:-n]) / n
+        self.ventana = deque(cierre[-n:].tolist(), maxlen=n)
+        self.suma = float(sum(self.ventana))
+        return {"valor": valor}
+
+
+class EMA(Indicador):
+    def __init__(self, periodo: int = 20):
+        self.media = _Media(periodo)
+
+    def actualizar(self, cierre, maximo=None, minimo=None):
+        return (self.media.actualizar(cierre),)
+
+
+class RSI(Indicador):
+    """RSI de Wilder."""
+
+    def __init__(self, periodo: int = 14):
+        self.anterior = None
+        self.subidas = _Media(periodo, alpha=1.0 / periodo)
+        self.bajadas = _Media(periodo, alpha=1.0 / periodo)
+
+    def actualizar(self, cierre, maximo=None, minimo=None):
+        if self.anterior is None:
+            self.anterior = cierre
+            return (_NAN,)
+        cambio = cierre - self.anterior
+        self.anterior = cierre
+        sube = self.subidas.actualizar(max(cambio, 0.0))
+        baja = self.bajadas.actualizar(max(-cambio, 0.0))
+        if math.isnan(sube):
+            return (_NAN,)
+        return (100.0 if baja == 0 else 100.0 - 100.0 / (1.0 + sube / baja),)
+
+
+class MACD(Indicador):
+    salidas = ("macd", "senal", "histograma")
+
+    def __init__(self, rapida: int = 12, lenta: int = 26, senal: int = 9):
+        self.rapida = _Media(rapida)
+        self.lenta = _Media(lenta)
+        self.senal = _Media(senal)
+
+    def actualizar(self, cierre, maximo=None, minimo=None):
+        r = self.rapida.actualizar(cierre)
+        l = self.lenta.actualizar(cierre)
+        if math.isnan(r) or math.isnan(l):
+            return (_NAN, _NAN, _NAN)
+        macd = r - l
+        s = self.senal.actualizar(macd)
+        return (macd, s, macd - s)
+
+
+class Bollinger(Indicador):
+    salidas = ("media", "superior", "inferior")
+
+    def __init__(self, periodo: int = 20, desviaciones: float = 2.0):
+        self.periodo = periodo
+        self.k = desviaciones
+        self.ventana = deque(maxlen=periodo)
+        self.suma = 0.0
+        self.suma2 = 0.0
+
+    def _bandas(self):
+        n = self.periodo
+        media = self.suma / n
+        sd = math.sqrt(max(self.suma2 / n - media * media, 0.0))
+        return (media, media + self.k * sd, media - self.k * sd)
+
+    def actualizar(self, cierre, maximo=None, minimo=None):
+        if len(self.ventana) == self.periodo:
+            viejo = self.ventana[0]
+            self.suma -= viejo
+            self.suma2 -= viejo * viejo
+        self.ventana.append(cierre)
+        self.suma += cierre
+        self.suma2 += cierre * cierre
+        return self._bandas() if len(self.ventana) == self.periodo else (_NAN, _NAN, _NAN)
+
+    def calcular(self, cierre, maximo, minimo):
+        n = self.periodo
+        media = np.full(len(cierre), np.nan)
+        sd = np.full(len(cierre), np.nan)
+        if len(cierre) >= n:
+            ventanas = np.lib.stride_tricks.sliding_window_view(cierre, n)
+            media[n - 1:] = ventanas.mean(axis=1)
+            sd[n - 1:] = ventanas.std(axis=1)
+        self.ventana = deque(cierre[-n:].tolist(), maxlen=n)
+        self.suma = float(sum(self.ventana))
+        self.suma2 = float(sum(x * x for x in self.ventana))
+        return {"media": media, "superior": media + self.k * sd, "inferior": media - self.k * sd}
+
+
+class ATR(Indicador):
+    """Average True Range de Wilder (sin máximo/mínimo se usa el cierre)."""
+
+    def __init__(self, periodo: int = 14):
+        self.anterior = None
+        self.media = _Media(periodo, alpha=1.0 / periodo)
+
+    def actualizar(self, cierre, maximo=None, minimo=None):
+        h = cierre if maximo is None or math.isnan(maximo) else maximo
+        l = cierre if minimo is None or math.isnan(minimo) else minimo
+        rango = h - l
+        if self.anterior is not None:
+            rango = max(rango, abs(h - self.anterior), abs(l - self.anterior))
+        self.anterior = cierre
+        return (self.media.actualizar(rango),)
+
+
+INDICADORES = {
+    "sma": SMA,
+    "ema": EMA,
+    "rsi": RSI,
+    "macd": MACD,
+    "bollinger": Bollinger,
+    "atr": ATR,
+}
+
+
+def parametros(nombre: str, valores: dict) -> dict:
+    """
+    Parámetros de `nombre` con sus valores por defecto, tomando de
+    `valores` los que vengan (p. ej. request.GET). ValueError si el
+    indicador no existe o un valor no es válido.
+    """
+    cls = INDICADORES.get((nombre or "").lower())
+    if cls is None:
+        raise ValueError(f"Indicador no soportado: {nombre}")
+    params = {}
+    for p in list(inspect.signature(cls.__init__).parameters.values())[1:]:
+        tipo = type(p.default)
+        v = tipo(valores[p.name]) if valores.get(p.name) not in (None, "") else p.default
+        valido = 1 <= v <= 500 if tipo is int else math.isfinite(v) and v > 0
+        if not valido:
+            raise ValueError(f"Valor no válido para {p.name}: {v}")
+        params[p.name] = v
+    return params
+
+
+# ------------------- series cacheadas por ticker -------------------
+
+class SerieIndicador:
+    """Indicador con su estado y la serie calculada hasta `ultima`."""
+
+    def __init__(self, indicador: Indicador):
+        self.indicador = indicador
+        self.fechas = []
+        self.valores = {s: [] for s in indicador.salidas}
+        self.ultima = None
+        self.barra = None  # última barra incorporada: (fecha, cierre, maximo, minimo)
+
+    def _recortar(self):
+        sobra = len(self.fechas) - _max_barras()
+        if sobra > 0:
+            del self.fechas[:sobra]
+            for s in self.valores.values():
+                del s[:sobra]
+
+    def cargar(self, barras: list) -> None:
+        if not barras:
+            return
+        fechas, cierre, maximo, minimo = zip(*barras)
+        series = self.indicador.calcular(
+            np.array(cierre, dtype=float),
+            np.array([np.nan if h is None else h for h in maximo], dtype=float),
+            np.array([np.nan if l is None else l for l in minimo], dtype=float),
+        )
+        self.fechas = list(fechas)
+        self.valores = {s: series[s].tolist() for s in self.indicador.salidas}
+        self.ultima = fechas[-1]
+        self.barra = barras[-1]
+        self._recortar()
+
+    def anadir(self, fecha, cierre, maximo, minimo) -> None:
+        fila = self.indicador.actualizar(cierre, maximo, minimo)
+        self.fechas.append(fecha)
+        for s, v in zip(self.indicador.salidas, fila):
+            self.valores[s].append(v)
+        self.ultima = fecha
+        self.barra = (fecha, cierre, maximo, minimo)
+        self._recortar()
+
+
+def _barras(ticker: str, desde=None) -> list:
+    qs = BarraDiaria.objects.filter(instrumento_id=ticker)
+    if desde:
+        qs = qs.filter(fecha__gte=desde)
+        filas = qs.order_by("fecha").values_list("fecha", "cierre", "maximo", "minimo")
+    else:
+        # calentamiento de las medias: más barras de las que se guardan
+        filas = qs.order_by("-fecha").values_list("fecha", "cierre", "maximo", "minimo")[: 2 * _max_barras()]
+        filas = list(filas)[::-1]
+    return [(f, float(c), None if h is None else float(h), None if l is None else float(l))
+            for f, c, h, l in filas]
+
+
+def _clave(ticker: str, nombre: str, params: dict) -> str:
+    return f"indicadores:{ticker}:{nombre}:" + ",".join(f"{k}={v}" for k, v in sorted(params.items()))
+
+
+def serie(ticker: str, nombre: str, params: dict = None) -> SerieIndicador:
+    """Serie del indicador para `ticker`, al día con las barras guardadas."""
+    ticker = ticker.upper().strip()
+    nombre = nombre.lower()
+    params = params if params is not None else parametros(nombre, {})
+    clave = _clave(ticker, nombre, params)
+    s = cache.get(clave)
+    if s is not None and s.ultima:
+        barras = _barras(ticker, s.ultima)  # la última incorporada y las posteriores
+        if not barras or barras[0] != s.barra:
+            s = None  # se ha reescrito la última barra incorporada: el estado no vale
+        elif len(barras) == 1:
+            return s
+        else:
+            for barra in barras[1:]:
+                s.anadir(*barra)
+    if s is None or not s.ultima:
+        s = SerieIndicador(INDICADORES[nombre](**params))
+        s.cargar(_barras(ticker))
+    cache.set(clave, s, timeout=TTL)
+    return s
+
+
+def _ultimo(s: SerieIndicador, salida: str = "valor"):
+    v = s.valores[salida][-1] if s.fechas else _NAN
+    return None if math.isnan(v) else round(v, 4)
+
+
+def resumen(ticker: str) -> dict:
+    """RSI, MACD, volatilidad y momentum a 30 sesiones de `ticker` (para la tabla)."""
+    ticker = ticker.upper().strip()
+    rsi = _ultimo(serie(ticker, "rsi"))
+    macd = serie(ticker, "macd")
+    fila = {
+        "ticker": ticker,
+        "rsi": rsi,
+        "macd": _ultimo(macd, "macd"),
+        "signal": _ultimo(macd, "senal"),
+        "hist": _ultimo(macd, "histograma"),
+        "volatilidad": None,
+        "momento": None,
+        "senial": None,
+    }
+    cierres = np.array([c for _, c in (BarraDiaria.objects.filter(instrumento_id=ticker)
+                                        .order_by("-fecha").values_list("fecha", "cierre")[:31])][::-1], dtype=float)
+    if len(cierres) >= 2:
+        fila["volatilidad"] = float(np.diff(np.log(cierres)).std(ddof=1) * np.sqrt(252) * 100) if len(cierres) > 2 else 0.0
+        fila["momento"] = float((cierres[-1] / cierres[0] - 1) * 100)
+    if rsi is not None and rsi >= 70:
+        fila["senial"] = "Sobrecompra"
+    elif rsi is not None and rsi <= 30:
+        fila["senial"] = "Sobreventa"
+    elif fila["hist"] is not None:
+        fila["senial"] = "Alcista" if fila["hist"] > 0 else "Bajista"
+    return fila
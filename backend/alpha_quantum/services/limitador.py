@@ -0,0 +1,196 @@
+# alpha_quantum/services/limitador.py
+"""
+Limitador de peticiones por proveedor (token bucket) compartido entre
+procesos a través de la base de datos (modelo CupoProveedor).
+
+- El bucket se recarga a `por_minuto / 60` tokens por segundo con capacidad
+  `por_minuto`; además se lleva el consumo del día contra `por_dia`.
+- Las peticiones interactivas (las de una vista) tienen prioridad: el trabajo
+  de fondo (cron, revalidaciones) no puede bajar el bucket ni el cupo diario
+  por debajo de la fracción PROVEEDORES_RESERVA_INTERACTIVA.
+- Una petición puede costar varios créditos (Twelve Data cobra uno por
+  símbolo en las consultas por lotes): `coste` tokens de una vez.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from ..models.cupo_proveedor import CupoProveedor
+
+# Planes gratuitos por defecto; se sobrescriben con settings.PROVEEDORES_LIMITES
+LIMITES_POR_DEFECTO = {
+    "twelvedata": {"por_minuto": 8, "por_dia": 800},
+    "finnhub": {"por_minuto": 60, "por_dia": None},
+    "alphavantage": {"por_minuto": 5, "por_dia": 25},
+}
+
+_prioridad: ContextVar = ContextVar("prioridad_proveedores", default="interactiva")
+
+
+@contextmanager
+def prioridad_fondo():
+    """Marca las llamadas a proveedores dentro del bloque como trabajo de fondo."""
+    token = _prioridad.set("fondo")
+    try:
+        yield
+    finally:
+        _prioridad.reset(token)
+
+
+def es_fondo() -> bool:
+    return _prioridad.get() == "fondo"
+
+
+def _limites(proveedor: str):
+    limites = {**LIMITES_POR_DEFECTO, **getattr(settings, "PROVEEDORES_LIMITES", {})}
+    return limites.get(proveedor)
+
+
+def _reserva() -> float:
+    return float(getattr(settings, "PROVEEDORES_RESERVA_INTERACTIVA", 0.25))
+
+
+def _cupo(proveedor: str, capacidad: float) -> CupoProveedor:
+    ahora = timezone.now()
+    cupo, _ = CupoProveedor.objects.get_or_create(
+        proveedor=proveedor,
+        defaults={
+            "tokens": capacidad,
+            "actualizado": ahora,
+            "dia": timezone.localdate(ahora),
+            "minuto": ahora.replace(second=0, microsecond=0),
+        },
+    )
+    return cupo
+
+
+def _recargar(cupo: CupoProveedor, capacidad: float, ahora) -> None:
+    """Recarga el bucket y reinicia las ventanas de minuto/día si han cambiado."""
+    transcurrido = max(0.0, (ahora - cupo.actualizado).total_seconds())
+    cupo.tokens = min(capacidad, cupo.tokens + transcurrido * capacidad / 60.0)
+    cupo.actualizado = ahora
+
+    hoy = timezone.localdate(ahora)
+    if cupo.dia != hoy:
+        cupo.dia = hoy
+        cupo.usados_dia = 0
+        cupo.rechazados_dia = 0
+    minuto = ahora.replace(second=0, microsecond=0)
+    if cupo.minuto != minuto:
+        cupo.minuto = minuto
+        cupo.usados_minuto = 0
+
+
+def _intentar(proveedor: str, limites: dict, fondo: bool, coste: int = 1):
+    """
+    Intenta consumir `coste` tokens. Devuelve 0 si lo consigue, los segundos
+    a esperar hasta que los haya, o None si el cupo diario está agotado.
+    """
+    capacidad = float(limites["por_minuto"])
+    por_dia = limites.get("por_dia")
+    reserva = _reserva() if fondo else 0.0
+    _cupo(proveedor, capacidad)
+
+    with transaction.atomic():
+        cupo = CupoProveedor.objects.select_for_update().get(proveedor=proveedor)
+        _recargar(cupo, capacidad, timezone.now())
+
+        if por_dia and cupo.usados_dia + coste > por_dia * (1 - reserva):
+            cupo.rechazados_dia += 1
+            cupo.save()
+            return None
+
+        suelo = capacidad * reserva
+        if cupo.tokens - coste >= suelo:
+            cupo.tokens -= coste
+            cupo.usados_dia += coste
+            cupo.usados_minuto += coste
+            cupo.save()
+            return 0
+
+        cupo.save()
+        return (coste + suelo - cupo.tokens) * 60.0 / capacidad
+
+
+def coste_maximo(proveedor: str):
+    """
+    Créditos que puede llegar a conceder una sola petición con la prioridad
+    actual (capacidad menos la reserva interactiva), o None si no hay límite.
+    Sirve para dimensionar los lotes.
+    """
+    limites = _limites(proveedor)
+    if not limites or not limites.get("por_minuto"):
+        return None
+    reserva = _reserva() if es_fondo() else 0.0
+    return max(1, int(float(limites["por_minuto"]) * (1 - reserva)))
+
+
+def adquirir(proveedor: str, coste: int = 1) -> bool:
+    """
+    Reserva una petición de `coste` créditos a `proveedor`. Las interactivas
+    esperan como mucho PROVEEDORES_ESPERA_MAX segundos y las de fondo
+    PROVEEDORES_ESPERA_FONDO. Devuelve False si no hay cupo (la llamada no
+    debe hacerse) o si `coste` supera coste_maximo().
+    """
+    limites = _limites(proveedor)
+    if not limites or not limites.get("por_minuto"):
+        return True
+    if coste > coste_maximo(proveedor):
+        return False
+
+    fondo = es_fondo()
+    if fondo:
+        espera_max = float(getattr(settings, "PROVEEDORES_ESPERA_FONDO", 60.0))
+    else:
+        espera_max = float(getattr(settings, "PROVEEDORES_ESPERA_MAX", 2.0))
+    limite = time.monotonic() + espera_max
+
+    while True:
+        espera = _intentar(proveedor, limites, fondo, coste)
+        if espera == 0:
+            return True
+        if espera is None:
+            return False
+        if time.monotonic() + espera > limite:
+            CupoProveedor.objects.filter(proveedor=proveedor).update(
+                rechazados_dia=F("rechazados_dia") + 1
+            )
+            return False
+        time.sleep(espera)
+
+
+def agotar(proveedor: str) -> None:
+    """El proveedor ha respondido con límite alcanzado: vaciamos el bucket."""
+    limites = _limites(proveedor)
+    if not limites or not limites.get("por_minuto"):
+        return
+    _cupo(proveedor, float(limites["por_minuto"]))
+    CupoProveedor.objects.filter(proveedor=proveedor).update(tokens=0, actualizado=timezone.now())
+
+
+def estado() -> list:
+    """Consumo por minuto y por día de cada proveedor (para admin/monitorización)."""
+    ahora = timezone.now()
+    cupos = {c.proveedor: c for c in CupoProveedor.objects.all()}
+    filas = []
+    for nombre in sorted({**LIMITES_POR_DEFECTO, **getattr(settings, "PROVEEDORES_LIMITES", {})}):
+        limites = _limites(nombre) or {}
+        cupo = cupos.get(nombre)
+        if cupo:
+            _recargar(cupo, float(limites.get("por_minuto") or 0), ahora)
+        filas.append({
+            "proveedor": nombre,
+            "por_minuto": limites.get("por_minuto"),
+            "usados_minuto": cupo.usados_minuto if cupo else 0,
+            "tokens": round(cupo.tokens, 2) if cupo else limites.get("por_minuto"),
+            "por_dia": limites.get("por_dia"),
+            "usados_dia": cupo.usados_dia if cupo else 0,
+            "rechazados_dia": cupo.rechazados_dia if cupo else 0,
+            "reserva_interactiva": _reserva(),
+        })
+    return filas
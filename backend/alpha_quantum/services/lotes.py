@@ -0,0 +1,165 @@
+# alpha_quantum/services/lotes.py
+"""
+Motor de lotes y coste de adquisición (Decimal) para las transacciones de
+un usuario, en una sola pasada O(n) en orden cronológico.
+
+Métodos:
+- "MEDIO": coste medio ponderado (el de siempre en la app).
+- "FIFO": las ventas consumen primero los lotes más antiguos.
+
+Para cada ticker da cantidad, coste y coste medio de lo abierto, lotes
+abiertos, P/L realizado y dividendos; para cada transacción, su P/L y
+rentabilidad. El resultado se cachea por usuario y método junto a la versión
+de sus transacciones (posiciones.version_transacciones(): se recalcula si
+otro proceso las ha cambiado) y las señales de Transaccion lo invalidan.
+"""
+from collections import deque
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from ..models.transaccion import Transaccion
+from .posiciones import TTL, version_transacciones
+from .valoracion import COMPRAS, VENTAS
+
+METODOS = ("MEDIO", "FIFO")
+_CERO = Decimal("0")
+_CIEN = Decimal("100")
+
+
+def metodo_por_defecto() -> str:
+    return getattr(settings, "LOTES_METODO", "MEDIO")
+
+
+class PosicionTicker:
+    __slots__ = ("ticker", "cantidad", "coste", "lotes", "realizado", "dividendos")
+
+    def __init__(self, ticker: str):
+        self.ticker = ticker
+        self.cantidad = _CERO
+        self.coste = _CERO       # coste de lo que sigue abierto (con comisiones)
+        self.lotes = deque()     # [fecha, cantidad, coste_unitario] abiertos
+        self.realizado = _CERO
+        self.dividendos = _CERO
+
+    @property
+    def coste_medio(self) -> Decimal:
+        return self.coste / self.cantidad if self.cantidad > 0 else _CERO
+
+    def no_realizado(self, precio) -> Decimal:
+        return self.cantidad * Decimal(str(precio or 0)) - self.coste
+
+
+class ResultadoLotes:
+    def __init__(self, metodo: str):
+        self.metodo = metodo
+        self.por_ticker = {}        # {TICKER: PosicionTicker}
+        self.por_transaccion = {}   # {id: (pnl, rentabilidad_pct)}
+
+    @property
+    def realizado_total(self) -> Decimal:
+        return sum((p.realizado for p in self.por_ticker.values()), _CERO)
+
+    def posicion(self, ticker: str) -> PosicionTicker:
+        t = ticker.upper().strip()
+        return self.por_ticker.get(t) or PosicionTicker(t)
+
+
+def _vender(p: PosicionTicker, cantidad: Decimal, metodo: str) -> Decimal:
+    """Saca `cantidad` de lo abierto y devuelve su coste de adquisición."""
+    vendidas = min(cantidad, p.cantidad)
+    if vendidas <= 0:
+        return _CERO
+
+    if metodo == "FIFO":
+        base, resto = _CERO, vendidas
+        while resto > 0 and p.lotes:
+            lote = p.lotes[0]
+            usa = min(resto, lote[1])
+            base += usa * lote[2]
+            lote[1] -= usa
+            resto -= usa
+            if lote[1] <= 0:
+                p.lotes.popleft()
+    else:
+        base = p.coste_medio * vendidas
+        resto = vendidas
+        while resto > 0 and p.lotes:  # los lotes solo informan de cantidades
+            usa = min(resto, p.lotes[0][1])
+            p.lotes[0][1] -= usa
+            resto -= usa
+            if p.lotes[0][1] <= 0:
+                p.lotes.popleft()
+
+    p.cantidad -= vendidas
+    p.coste = p.coste - base if p.cantidad > 0 else _CERO
+    return base
+
+
+def calcular(movimientos, metodo: str = None) -> ResultadoLotes:
+    """
+    `movimientos`: iterable de (id, ticker, tipo, cantidad, precio, comision,
+    fecha) en orden cronológico.
+    """
+    metodo = (metodo or metodo_por_defecto()).upper()
+    if metodo not in METODOS:
+        raise ValueError(f"Método de lotes no soportado: {metodo}")
+
+    res = ResultadoLotes(metodo)
+    for pk, ticker, tipo, cantidad, precio, comision, fecha in movimientos:
+        t = ticker.upper().strip()
+        p = res.por_ticker.get(t)
+        if p is None:
+            p = res.por_ticker[t] = PosicionTicker(t)
+        tipo = (tipo or "").upper()
+        cantidad, precio, comision = Decimal(cantidad or 0), Decimal(precio or 0), Decimal(comision or 0)
+
+        if tipo in COMPRAS:
+            total = cantidad * precio + comision
+            if cantidad > 0:
+                p.lotes.append([fecha, cantidad, total / cantidad])
+            p.cantidad += cantidad
+            p.coste += total
+            res.por_transaccion[pk] = (_CERO, _CERO)
+        elif tipo in VENTAS:
+            base = _vender(p, cantidad, metodo)
+            pnl = cantidad * precio - comision - base
+            p.realizado += pnl
+            res.por_transaccion[pk] = (pnl, pnl / base * _CIEN if base > 0 else _CERO)
+        else:  # DIV
+            importe = cantidad * precio
+            p.dividendos += importe
+            res.por_transaccion[pk] = (importe, _CERO)
+    return res
+
+
+# ------------------- por usuario, con caché -------------------
+
+def _clave(user_id, metodo: str) -> str:
+    return f"lotes:{user_id}:{metodo}"
+
+
+def de_usuario(user, metodo: str = None) -> ResultadoLotes:
+    """Resultado del motor para todas las transacciones de `user` (cacheado)."""
+    user_id = getattr(user, "pk", user)
+    metodo = (metodo or "").upper()
+    if metodo not in METODOS:
+        metodo = metodo_por_defecto()
+    version = version_transacciones(user_id)
+    guardado = cache.get(_clave(user_id, metodo))
+    if guardado is not None and guardado[0] == version:
+        return guardado[1]
+    filas = (Transaccion.objects.filter(user_id=user_id)
+             .order_by("fecha", "id")
+             .values_list("id", "ticker", "tipo", "cantidad", "precio", "comision", "fecha"))
+    res = calcular(filas.iterator(chunk_size=2000), metodo)
+    cache.set(_clave(user_id, metodo), (version, res), timeout=TTL)
+    return res
+
+
+def invalidar(user_id) -> None:
+    claves = [_clave(user_id, m) for m in METODOS]
+    cache.delete_many(claves)
+    transaction.on_commit(lambda: cache.delete_many(claves))
@@ -0,0 +1,196 @@
+# alpha_quantum/services/montecarlo.py
+"""
+Simulación Monte Carlo del valor futuro de la cartera actual.
+
+Las trayectorias (GBM correlacionado o bootstrap por bloques) se generan
+en tramos de TRAMO, cada uno con su propia semilla derivada con
+SeedSequence.spawn, y los tramos se reparten en MONTECARLO_BLOQUES trozos
+entre los procesos de un ProcessPoolExecutor: el resultado solo depende de
+la semilla, no del número de bloques ni de procesos. Cada proceso devuelve
+el valor en unos pocos puntos de control (float32) y aquí se calculan los
+percentiles del abanico.
+
+Los resultados se guardan en SimulacionMonteCarlo (compartidos entre el
+comando `simular_montecarlo` y las vistas) y en la caché de Django, con una
+clave que incluye las posiciones actuales: al comprar o vender se calcula
+una simulación nueva.
+
+Desde la web los parámetros se acotan más (MONTECARLO_WEB_MAX_*), la
+semilla es siempre la de por defecto y cada usuario tiene como mucho una
+simulación en curso; las grandes quedan para el comando.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from ..models.simulacion import SimulacionMonteCarlo
+from . import riesgo, trayectorias
+
+METODOS = ("gbm", "bootstrap")
+PERCENTILES = (5, 25, 50, 75, 95)
+# trayectorias por semilla derivada
+TRAMO = 1000
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _ajuste(nombre: str, defecto):
+    return getattr(settings, nombre, defecto)
+
+
+def _executor() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: los hijos no heredan hilos ni conexiones del servidor
+            _pool = ProcessPoolExecutor(
+                max_workers=int(_ajuste("MONTECARLO_PROCESOS", os.cpu_count() or 2)),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def parametros(metodo: str = None, horizonte: int = None, trayectorias_: int = None, semilla: int = None,
+               web: bool = False) -> dict:
+    """
+    Parámetros normalizados y acotados de una simulación. Con `web` se
+    aplican los topes de las peticiones HTTP y se ignora `semilla`.
+    """
+    metodo = (metodo or "gbm").lower()
+    if web:
+        max_horizonte = int(_ajuste("MONTECARLO_WEB_MAX_HORIZONTE", 252))
+        max_trayectorias = int(_ajuste("MONTECARLO_WEB_MAX_TRAYECTORIAS", 200_000))
+        semilla = None
+    else:
+        max_horizonte = 756
+        max_trayectorias = int(_ajuste("MONTECARLO_MAX_TRAYECTORIAS", 1_000_000))
+    return {
+        "metodo": metodo if metodo in METODOS else "gbm",
+        "horizonte": max(1, min(int(horizonte or _ajuste("MONTECARLO_HORIZONTE", 21)), max_horizonte)),
+        "trayectorias": max(1000, min(int(trayectorias_ or _ajuste("MONTECARLO_TRAYECTORIAS", 100_000)),
+                                      max_trayectorias)),
+        "semilla": int(semilla if semilla is not None else _ajuste("MONTECARLO_SEMILLA", 12345)),
+    }
+
+
+def _cartera(user_id) -> list:
+    """Posiciones abiertas [[ticker, cantidad], ...] de `user_id`."""
+    tickers, cantidades = riesgo.exposiciones(user_id)
+    return [[t, float(c)] for t, c in zip(tickers, cantidades)]
+
+
+def _clave(params: dict, dia, cartera: list) -> str:
+    texto = json.dumps({**params, "dia": dia.isoformat(), "cartera": cartera}, sort_keys=True)
+    return hashlib.sha256(texto.encode()).hexdigest()
+
+
+def puntos_control(horizonte: int, maximo: int = 60) -> np.ndarray:
+    """Pasos (incluido el 0) en los que se guarda el valor de cada trayectoria."""
+    return np.unique(np.linspace(0, horizonte, min(horizonte, maximo) + 1).round().astype(int))
+
+
+def calcular(user, params: dict) -> dict:
+    """Ejecuta la simulación para `user` (None si no hay datos suficientes)."""
+    dia = riesgo.dia_mercado()
+    tickers, cantidades = riesgo.exposiciones(user)
+    if not tickers:
+        return None
+    _, precios, r = riesgo.matriz_rendimientos(tickers, dia, int(_ajuste("RIESGO_VENTANA", 252)))
+    exposicion = cantidades * np.nan_to_num(precios[-1])
+    r = r[np.any(r != 0, axis=1)]
+    if exposicion.sum() <= 0 or len(r) < riesgo.MIN_OBSERVACIONES:
+        return None
+
+    puntos = puntos_control(params["horizonte"])
+    tamanos = [TRAMO] * (params["trayectorias"] // TRAMO)
+    if params["trayectorias"] % TRAMO:
+        tamanos.append(params["trayectorias"] % TRAMO)
+    tramos = list(zip(tamanos, np.random.SeedSequence(params["semilla"]).spawn(len(tamanos))))
+    n_bloques = max(1, min(int(_ajuste("MONTECARLO_BLOQUES", 16)), len(tramos)))
+
+    futuros = [
+        _executor().submit(trayectorias.generar_tramos, params["metodo"], r, exposicion,
+                           params["horizonte"], [tramos[i] for i in bloque], puntos)
+        for bloque in np.array_split(np.arange(len(tramos)), n_bloques)
+    ]
+    valores = np.concatenate([f.result() for f in futuros]).astype(np.float64)
+
+    inicial = float(exposicion.sum())
+    finales = valores[:, -1]
+    perdidas = inicial - finales
+    var95 = float(np.quantile(perdidas, 0.95))
+    return {
+        "fecha": dia.isoformat(),
+        "parametros": params,
+        "valor_inicial": round(inicial, 2),
+        "pasos": puntos.tolist(),
+        "percentiles": {
+            f"p{p}": np.round(np.percentile(valores, p, axis=0), 2).tolist() for p in PERCENTILES
+        },
+        "var_95": round(var95, 2),
+        "es_95": round(float(perdidas[perdidas >= var95].mean()), 2),
+        "prob_perdida": round(float((finales < inicial).mean()), 4),
+    }
+
+
+def resultado(user, params: dict):
+    """Resultado ya calculado hoy para estos parámetros (caché o BD), o None."""
+    user_id = getattr(user, "pk", user)
+    clave = _clave(params, riesgo.dia_mercado(), _cartera(user_id))
+    res = cache.get(f"montecarlo:{user_id}:{clave}")
+    if res is None:
+        fila = SimulacionMonteCarlo.objects.filter(user_id=user_id, clave=clave).first()
+        if fila is not None:
+            res = fila.resultado
+            cache.set(f"montecarlo:{user_id}:{clave}", res, timeout=24 * 3600)
+    return res
+
+
+def simular(user, params: dict) -> dict:
+    """Calcula y guarda la simulación (vacía si no hay datos)."""
+    user_id = getattr(user, "pk", user)
+    dia = riesgo.dia_mercado()
+    clave = _clave(params, dia, _cartera(user_id))
+    res = calcular(user_id, params) or {}
+    SimulacionMonteCarlo.objects.filter(user_id=user_id, dia__lt=dia).delete()  # días ya pasados
+    SimulacionMonteCarlo.objects.update_or_create(
+        user_id=user_id, clave=clave,
+        defaults={"dia": dia, "parametros": params, "resultado": res},
+    )
+    cache.set(f"montecarlo:{user_id}:{clave}", res, timeout=24 * 3600)
+    return res
+
+
+def _marca(user_id) -> str:
+    return f"montecarlo:{user_id}:calculando"
+
+
+def _simular_fondo(user_id, params: dict) -> None:
+    try:
+        simular(user_id, params)
+    finally:
+        cache.delete(_marca(user_id))
+
+
+def solicitar(user, params: dict):
+    """
+    Devuelve el resultado si ya existe; si no, lanza la simulación en
+    segundo plano y devuelve None. Cada usuario tiene como mucho una en
+    curso: mientras tanto no se encolan otras (se pedirán de nuevo).
+    """
+    res = resultado(user, params)
+    if res is not None:
+        return res
+    user_id = getattr(user, "pk", user)
+    if cache.add(_marca(user_id), 1, timeout=600):
+        from .segundo_plano import lanzar
+        lanzar(_simular_fondo, user_id, params)
+    return None
@@ -0,0 +1,252 @@
+# alpha_quantum/services/optimizacion.py
+"""
+Optimización walk-forward de parámetros de las estrategias de backtest.py.
+
+La rejilla (producto cartesiano de valores por parámetro) se reparte en
+tareas de OPTIMIZACION_CELDAS_POR_TAREA combinaciones por unidad (cada
+ticker en las estrategias por ticker, la cesta entera en momentum /
+rebalanceo) entre los procesos de un ProcessPoolExecutor. La matriz de
+cierres se publica una sola vez en multiprocessing.shared_memory: las
+tareas solo llevan su nombre y cada proceso lee de ahí sus columnas, en
+vez de recibir una copia serializada.
+
+Cada combinación se simula una vez sobre todo el periodo y de su curva se
+sacan Sharpe y rentabilidad de cada ventana de entrenamiento y de prueba.
+En cada partición se elige, por unidad, la combinación con mejor Sharpe de
+entrenamiento y se mide fuera de muestra en la ventana de prueba.
+
+El resultado se guarda en BarridoParametros con la clave de su
+configuración; un barrido terminado no se vuelve a calcular.
+"""
+import hashlib
+import itertools
+import json
+import math
+import multiprocessing
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from multiprocessing import shared_memory
+
+import django
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from ..models.optimizacion import BarridoParametros
+from . import backtest
+from .valoracion import arrastrar, matriz_precios, rejilla as rejilla_dias
+
+ANUAL = 252
+# columnas del array de métricas por (combinación, partición)
+SHARPE_ENT, RENT_ENT, SHARPE_PRU, RENT_PRU = range(4)
+
+
+def _ajuste(nombre: str, defecto):
+    return getattr(settings, nombre, defecto)
+
+
+def rejilla(estrategia: str, valores: dict) -> list:
+    """
+    Combinaciones de parámetros: `valores` = {parámetro: [valores]}; los que
+    falten toman su valor por defecto. Se descartan las no válidas.
+    """
+    defecto = backtest.ESTRATEGIAS.get(estrategia)
+    if defecto is None:
+        raise ValueError(f"Estrategia no soportada: {estrategia}")
+    desconocidos = set(valores) - set(defecto)
+    if desconocidos:
+        raise ValueError(f"Parámetros desconocidos: {', '.join(sorted(desconocidos))}")
+    ejes = [list(valores.get(k) or [d]) for k, d in defecto.items()]
+    combos = []
+    for tupla in itertools.product(*ejes):
+        try:
+            combos.append(backtest.parametros(estrategia, dict(zip(defecto, tupla))))
+        except ValueError:
+            continue
+    return combos
+
+
+def particiones(n_dias: int, entrenamiento: int, prueba: int) -> list:
+    """
+    Ventanas walk-forward rodantes [(ini_ent, fin_ent, ini_pru, fin_pru)]
+    en índices de día (fin exclusivo); avanzan `prueba` días cada vez.
+    """
+    out = []
+    ini = 1  # el día 0 solo sirve de base para el primer rendimiento
+    while ini + entrenamiento + prueba <= n_dias:
+        out.append((ini, ini + entrenamiento, ini + entrenamiento, ini + entrenamiento + prueba))
+        ini += prueba
+    return out
+
+
+def _num(x, decimales: int = 4):
+    """float redondeado, o None si es NaN (JSON válido)."""
+    x = float(x)
+    return None if math.isnan(x) else round(x, decimales)
+
+
+def _metricas(equity: np.ndarray, a: int, b: int):
+    """(Sharpe anualizado, rentabilidad) de la curva en los días [a, b)."""
+    base = equity[a - 1:b]
+    if base[0] <= 0:
+        return np.nan, np.nan
+    r = np.diff(base) / np.where(base[:-1] > 0, base[:-1], 1.0)
+    sd = r.std(ddof=1) if len(r) > 1 else 0.0
+    return (float(r.mean() / sd * np.sqrt(ANUAL)) if sd > 0 else 0.0), float(base[-1] / base[0] - 1.0)
+
+
+# ------------------- trabajo de cada proceso -------------------
+
+def _evaluar(memoria: str, forma: tuple, dias: np.ndarray, columnas: list, estrategia: str,
+             combos: list, splits: list, capital: float, comision: float, comision_pct: float) -> np.ndarray:
+    """Métricas float32 (combinaciones, particiones, 4) de `combos` en `columnas`."""
+    shm = shared_memory.SharedMemory(name=memoria)
+    try:
+        p = np.ndarray(forma, dtype=np.float64, buffer=shm.buf)[:, columnas]  # copia solo sus columnas
+    finally:
+        shm.close()
+    out = np.full((len(combos), len(splits), 4), np.nan, dtype=np.float32)
+    for i, params in enumerate(combos):
+        equity = backtest.curva(p, dias, estrategia, params, capital, comision, comision_pct)[0]
+        for s, (a, b, c, d) in enumerate(splits):
+            out[i, s, SHARPE_ENT], out[i, s, RENT_ENT] = _metricas(equity, a, b)
+            out[i, s, SHARPE_PRU], out[i, s, RENT_PRU] = _metricas(equity, c, d)
+    return out
+
+
+# ------------------- orquestación -------------------
+
+def clave(configuracion: dict) -> str:
+    return hashlib.sha256(json.dumps(configuracion, sort_keys=True).encode()).hexdigest()
+
+
+def configurar(estrategia: str, tickers: list, valores: dict, desde: date = None, hasta: date = None,
+               entrenamiento: int = None, prueba: int = None, capital: float = 10000.0,
+               comision: float = 0.0, comision_pct: float = 0.0) -> dict:
+    """Configuración normalizada (y serializable) de un barrido."""
+    hasta = hasta or date.today() - timedelta(days=1)
+    return {
+        "estrategia": estrategia,
+        "tickers": sorted({t.upper().strip() for t in tickers if t}),
+        "rejilla": {k: list(v) for k, v in sorted(valores.items())},
+        "desde": (desde or hasta - timedelta(days=5 * 365)).isoformat(),
+        "hasta": hasta.isoformat(),
+        "entrenamiento": int(entrenamiento or _ajuste("OPTIMIZACION_ENTRENAMIENTO", 504)),
+        "prueba": int(prueba or _ajuste("OPTIMIZACION_PRUEBA", 126)),
+        "capital": float(capital),
+        "comision": float(comision),
+        "comision_pct": float(comision_pct),
+    }
+
+
+def _clasificar(combos: list, unidades: list, metricas: np.ndarray, splits: list, dias) -> dict:
+    """Ranking de combinaciones y resultado walk-forward por unidad."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # combinaciones sin datos
+        ent = np.nanmean(metricas[:, :, :, SHARPE_ENT], axis=(0, 2))
+        pru = np.nanmean(metricas[:, :, :, SHARPE_PRU], axis=(0, 2))
+    orden = np.argsort(-np.nan_to_num(ent, nan=-np.inf))[: int(_ajuste("OPTIMIZACION_RANKING", 50))]
+    ranking = [
+        {"parametros": combos[i], "sharpe_entrenamiento": _num(ent[i]), "sharpe_prueba": _num(pru[i])}
+        for i in orden.tolist()
+    ]
+
+    walk_forward = []
+    for u, nombre in enumerate(unidades):
+        elegidos = np.argmax(np.nan_to_num(metricas[u, :, :, SHARPE_ENT], nan=-np.inf), axis=0)
+        s_idx = np.arange(len(splits))
+        rent = np.nan_to_num(metricas[u, elegidos, s_idx, RENT_PRU].astype(np.float64))
+        sharpe = metricas[u, elegidos, s_idx, SHARPE_PRU]
+        sharpe = sharpe[~np.isnan(sharpe)]
+        walk_forward.append({
+            "unidad": nombre,
+            "parametros": [combos[i] for i in elegidos.tolist()],
+            "rentabilidad_pct": round(float((np.prod(1 + rent) - 1) * 100), 2),
+            "sharpe_prueba": _num(sharpe.mean()) if len(sharpe) else None,
+        })
+    rentas = [w["rentabilidad_pct"] for w in walk_forward]
+    return {
+        "combinaciones": len(combos),
+        "unidades": len(unidades),
+        "particiones": [
+            {"entrenamiento": [str(dias[a]), str(dias[b - 1])], "prueba": [str(dias[c]), str(dias[d - 1])]}
+            for a, b, c, d in splits
+        ],
+        "ranking": ranking,
+        "walk_forward": walk_forward,
+        "rentabilidad_fuera_muestra_pct": round(float(np.mean(rentas)), 2) if rentas else None,
+    }
+
+
+def calcular(config: dict, procesos: int = None) -> dict:
+    """Ejecuta el barrido de `config` (ver configurar()) en el pool de procesos."""
+    estrategia = config["estrategia"]
+    combos = rejilla(estrategia, config["rejilla"])
+    dias = rejilla_dias(date.fromisoformat(config["desde"]), date.fromisoformat(config["hasta"]))
+    splits = particiones(len(dias), config["entrenamiento"], config["prueba"])
+    if not combos or not splits or not config["tickers"]:
+        raise ValueError("Sin combinaciones, particiones o tickers: revisa rejilla, fechas y ventanas")
+
+    p = arrastrar(matriz_precios(config["tickers"], dias))
+    con_datos = [j for j in range(p.shape[1]) if not np.isnan(p[:, j]).all()]
+    if not con_datos:
+        raise ValueError("No hay cierres para esos tickers y fechas")
+    if estrategia in backtest.POR_TICKER:
+        # cada ticker es una manga con su parte del capital
+        unidades = [(config["tickers"][j], [j]) for j in con_datos]
+        capital = config["capital"] / len(unidades)
+    else:
+        unidades = [("cesta", con_datos)]
+        capital = config["capital"]
+
+    shm = shared_memory.SharedMemory(create=True, size=p.nbytes)
+    try:
+        np.ndarray(p.shape, dtype=np.float64, buffer=shm.buf)[:] = p
+        tam = int(_ajuste("OPTIMIZACION_CELDAS_POR_TAREA", 100))
+        metricas = np.empty((len(unidades), len(combos), len(splits), 4), dtype=np.float32)
+        with ProcessPoolExecutor(
+            max_workers=int(procesos or _ajuste("OPTIMIZACION_PROCESOS", 4)),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=django.setup,  # spawn: los procesos cargan Django antes de importar servicios
+        ) as pool:
+            futuros = {}
+            for u, (_, columnas) in enumerate(unidades):
+                for ini in range(0, len(combos), tam):
+                    f = pool.submit(_evaluar, shm.name, p.shape, dias, columnas, estrategia,
+                                    combos[ini:ini + tam], splits, capital, config["comision"],
+                                    config["comision_pct"])
+                    futuros[f] = (u, ini)
+            for f, (u, ini) in futuros.items():
+                bloque = f.result()
+                metricas[u, ini:ini + len(bloque)] = bloque
+    finally:
+        shm.close()
+        shm.unlink()
+
+    return _clasificar(combos, [n for n, _ in unidades], metricas, splits, dias)
+
+
+def optimizar(config: dict, procesos: int = None, forzar: bool = False) -> BarridoParametros:
+    """
+    Devuelve el barrido de `config`: el guardado si ya terminó (salvo
+    `forzar`) o uno nuevo calculado ahora.
+    """
+    barrido, _ = BarridoParametros.objects.get_or_create(
+        clave=clave(config),
+        defaults={"estrategia": config["estrategia"], "configuracion": config},
+    )
+    if barrido.estado == BarridoParametros.LISTO and not forzar:
+        return barrido
+
+    barrido.estado, barrido.error = BarridoParametros.CALCULANDO, ""
+    barrido.save(update_fields=["estado", "error"])
+    try:
+        barrido.resultado = calcular(config, procesos)
+        barrido.estado = BarridoParametros.LISTO
+    except Exception as e:
+        print(f"[OPTIMIZACION] {barrido.clave[:12]}: {e}")
+        barrido.estado, barrido.error = BarridoParametros.ERROR, str(e)
+    barrido.terminado = timezone.now()
+    barrido.save(update_fields=["estado", "error", "resultado", "terminado"])
+    return barrido
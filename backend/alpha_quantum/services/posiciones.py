@@ -0,0 +1,103 @@
+# alpha_quantum/services/posiciones.py
+"""
+Libro de posiciones por usuario: para cada ticker, la cantidad neta
+acumulada (compras - ventas) en cada fecha en que cambia. Se construye con
+una sola consulta ordenada y se guarda en la caché de Django junto a la
+versión de las transacciones del usuario (version_transacciones()), que
+suben las señales de Transaccion en cada cambio: si otro proceso las ha
+cambiado, la versión no coincide y se reconstruye. Las señales además lo
+invalidan en el acto. La cantidad a una fecha es un bisect en memoria.
+"""
+from bisect import bisect_right
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from ..models.transaccion import Transaccion
+from ..models.version_transacciones import VersionTransacciones
+from .valoracion import COMPRAS, VENTAS
+
+_CERO = Decimal("0")
+# tope de vida de las entradas, por si un cambio se salta las señales
+# (update() o bulk_create() sobre Transaccion)
+TTL = 3600
+
+
+def _clave(user_id) -> str:
+    return f"posiciones:{user_id}"
+
+
+def version_transacciones(user_id) -> int:
+    """Versión actual de las transacciones de un usuario (0 si nunca ha tenido)."""
+    return (VersionTransacciones.objects.filter(user_id=user_id)
+            .values_list("version", flat=True).first()) or 0
+
+
+def subir_version(user_id, crear: bool = True) -> None:
+    """
+    Sube la versión de las transacciones de `user_id`. Las bajas pasan
+    crear=False: si la fila ya no existe es que se está borrando el usuario.
+    """
+    if VersionTransacciones.objects.filter(user_id=user_id).update(version=F("version") + 1) or not crear:
+        return
+    _, creada = VersionTransacciones.objects.get_or_create(user_id=user_id, defaults={"version": 1})
+    if not creada:  # otro proceso la creó entre medias
+        VersionTransacciones.objects.filter(user_id=user_id).update(version=F("version") + 1)
+
+
+class LibroPosiciones:
+    def __init__(self, series: dict):
+        # {TICKER: ([fechas], [cantidad acumulada tras cada fecha])}
+        self._series = series
+
+    def cantidad(self, ticker: str, fecha) -> Decimal:
+        """Acciones netas de `ticker` al cierre de `fecha` (puede ser negativa)."""
+        fechas, acumulado = self._series.get(ticker.upper().strip(), ((), ()))
+        i = bisect_right(fechas, fecha)
+        return acumulado[i - 1] if i else _CERO
+
+    def tickers(self) -> list:
+        return sorted(self._series)
+
+
+def _construir(user_id) -> dict:
+    series = {}
+    filas = (Transaccion.objects.filter(user_id=user_id)
+             .order_by("fecha", "id")
+             .values_list("ticker", "tipo", "cantidad", "fecha"))
+    for ticker, tipo, cantidad, fecha in filas:
+        tipo = (tipo or "").upper()
+        if tipo in COMPRAS:
+            delta = Decimal(cantidad or 0)
+        elif tipo in VENTAS:
+            delta = -Decimal(cantidad or 0)
+        else:
+            continue
+        fechas, acumulado = series.setdefault(ticker.upper().strip(), ([], []))
+        total = (acumulado[-1] if acumulado else _CERO) + delta
+        if fechas and fechas[-1] == fecha:
+            acumulado[-1] = total
+        else:
+            fechas.append(fecha)
+            acumulado.append(total)
+    return series
+
+
+def libro(user) -> LibroPosiciones:
+    """Libro de posiciones de `user` (instancia o id), desde caché si existe."""
+    user_id = getattr(user, "pk", user)
+    version = version_transacciones(user_id)
+    guardado = cache.get(_clave(user_id))
+    if guardado is not None and guardado[0] == version:
+        return LibroPosiciones(guardado[1])
+    series = _construir(user_id)
+    cache.set(_clave(user_id), (version, series), timeout=TTL)
+    return LibroPosiciones(series)
+
+
+def invalidar(user_id) -> None:
+    cache.delete(_clave(user_id))
+    # y otra vez al confirmar, por si alguien lo reconstruyó antes del commit
+    transaction.on_commit(lambda: cache.delete(_clave(user_id)))
@@ -0,0 +1,82 @@
+# alpha_quantum/services/precios.py
+"""
+Refresco de Accion.precio_actual fuera del ciclo de la petición.
+
+El comando `actualizar_precios` (cron o bucle con --cada) llama a
+refrescar_precios() para todas las posiciones; las vistas solo leen de BD
+y, si ven precios ausentes o más viejos que PRECIOS_MAX_EDAD, piden un
+refresco en segundo plano con solicitar_refresco().
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from ..models import Accion
+from ..utils import obtener_precios_actuales
+from .segundo_plano import lanzar
+
+
+def _max_edad() -> timedelta:
+    return timedelta(seconds=int(getattr(settings, "PRECIOS_MAX_EDAD", 900)))
+
+
+def refrescar_precios(tickers=None) -> int:
+    """
+    Descarga en lote los precios de las posiciones abiertas (o solo de
+    `tickers`) y los guarda con un único bulk_update. Devuelve las filas
+    actualizadas; si el proveedor falla se conserva el último precio.
+    """
+    acciones = list(
+        Accion.objects.filter(cantidad__gt=0).only("id", "ticker", "precio_actual", "precio_actualizado")
+    )
+    if tickers is not None:
+        pedidos = {t.upper().strip() for t in tickers if t}
+        acciones = [a for a in acciones if a.ticker.upper().strip() in pedidos]
+    if not acciones:
+        return 0
+
+    precios = obtener_precios_actuales([a.ticker for a in acciones])
+    ahora = timezone.now()
+    cambiadas = []
+    for a in acciones:
+        p = precios.get(a.ticker.upper().strip())
+        if p and p > 0:
+            a.precio_actual = Decimal(str(p)).quantize(Decimal("0.01"))
+            a.precio_actualizado = ahora
+            cambiadas.append(a)
+
+    Accion.objects.bulk_update(cambiadas, ["precio_actual", "precio_actualizado"], batch_size=500)
+    return len(cambiadas)
+
+
+def _refrescar_fondo(clave: str, tickers: list) -> None:
+    try:
+        refrescar_precios(tickers)
+    finally:
+        cache.delete(clave)
+
+
+def solicitar_refresco(acciones) -> None:
+    """
+    Si alguna posición no tiene precio o lo tiene caducado, encola un
+    refresco de sus tickers en segundo plano (uno en vuelo por usuario).
+    """
+    limite = timezone.now() - _max_edad()
+    tickers = sorted({
+        a.ticker.upper().strip() for a in acciones
+        if a.cantidad and (a.precio_actualizado is None or a.precio_actualizado < limite)
+    })
+    if not tickers:
+        return
+    clave = f"precios:refrescando:{acciones[0].user_id}"
+    if cache.add(clave, 1, timeout=120):
+        lanzar(_refrescar_fondo, clave, tickers)
+
+
+def precios_a_fecha(acciones):
+    """Momento del precio más antiguo de las posiciones abiertas (o None)."""
+    fechas = [a.precio_actualizado for a in acciones if a.cantidad and a.precio_actualizado]
+    return min(fechas) if fechas else None
@@ -0,0 +1,119 @@
+# alpha_quantum/services/proveedores.py
+"""
+Clientes HTTP de los proveedores de datos de mercado (Twelve Data, Finnhub,
+Alpha Vantage).
+
+Cada proveedor tiene un requests.Session propio con pool de conexiones
+keep-alive, timeouts uniformes y reintentos acotados con backoff exponencial
+y jitter. Las claves de API se leen de settings en un único sitio.
+"""
+import random
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from . import limitador
+from .vuelo_unico import GrupoVuelo, clave_llamada
+
+# Respuestas que merece la pena reintentar (límite o fallo transitorio)
+_REINTENTABLES = {429, 500, 502, 503, 504}
+
+
+class ErrorProveedor(Exception):
+    """Fallo de red o respuesta no válida de un proveedor de datos."""
+
+
+class CupoAgotado(ErrorProveedor):
+    """El limitador no ha concedido la petición (cupo por minuto o diario agotado)."""
+
+
+class ClienteProveedor:
+    def __init__(self, nombre: str, base_url: str, setting_clave: str, param_clave: str):
+        self.nombre = nombre
+        self.base_url = base_url.rstrip("/")
+        self.setting_clave = setting_clave
+        self.param_clave = param_clave
+        self._session = None
+        self._lock = threading.Lock()
+        self._vuelos = GrupoVuelo()
+
+    def __repr__(self):
+        return f"<ClienteProveedor {self.nombre}>"
+
+    @property
+    def api_key(self):
+        return getattr(settings, self.setting_clave, None)
+
+    @property
+    def configurado(self) -> bool:
+        return bool(self.api_key)
+
+    def session(self) -> requests.Session:
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    s = requests.Session()
+                    pool = int(getattr(settings, "PROVEEDORES_POOL", 10))
+                    adapter = HTTPAdapter(pool_connections=pool, pool_maxsize=pool, max_retries=0)
+                    s.mount("https://", adapter)
+                    s.mount("http://", adapter)
+                    self._session = s
+        return self._session
+
+    def _espera(self, intento: int) -> float:
+        """Backoff exponencial con 'full jitter'."""
+        base = float(getattr(settings, "PROVEEDORES_BACKOFF", 0.5))
+        tope = float(getattr(settings, "PROVEEDORES_BACKOFF_MAX", 4.0))
+        return random.uniform(0, min(tope, base * (2 ** intento)))
+
+    def get(self, ruta: str, params: dict = None, coste: int = 1) -> requests.Response:
+        """
+        GET a `ruta` (relativa a base_url) añadiendo la clave de API.
+        Reintenta errores de red y respuestas 429/5xx hasta
+        PROVEEDORES_REINTENTOS veces; lanza ErrorProveedor si no hay respuesta
+        y CupoAgotado si el limitador no concede la petición. `coste` son los
+        créditos que consume en el proveedor (p. ej. uno por símbolo).
+
+        Las llamadas idénticas concurrentes (mismo endpoint y parámetros) se
+        agrupan: solo una sale a red y todas reciben la misma respuesta.
+        """
+        return self._vuelos.hacer(clave_llamada(self.nombre, ruta, params), self._get, ruta, params, coste)
+
+    def _get(self, ruta: str, params: dict = None, coste: int = 1) -> requests.Response:
+        url = f"{self.base_url}/{ruta.lstrip('/')}"
+        query = dict(params or {})
+        query[self.param_clave] = self.api_key
+        reintentos = int(getattr(settings, "PROVEEDORES_REINTENTOS", 2))
+        timeout = getattr(settings, "PROVEEDORES_TIMEOUT", (3.05, 15))
+
+        for intento in range(reintentos + 1):
+            if not limitador.adquirir(self.nombre, coste):
+                raise CupoAgotado(f"{self.nombre}: cupo de peticiones agotado")
+            try:
+                r = self.session().get(url, params=query, timeout=timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if intento >= reintentos:
+                    raise ErrorProveedor(f"{self.nombre} {ruta}: {e}") from e
+            else:
+                if r.status_code == 429:
+                    limitador.agotar(self.nombre)
+                if r.status_code not in _REINTENTABLES or intento >= reintentos:
+                    return r
+            time.sleep(self._espera(intento))
+
+    def get_json(self, ruta: str, params: dict = None, coste: int = 1):
+        """Como get() pero exige 2xx y devuelve el JSON decodificado."""
+        r = self.get(ruta, params, coste)
+        try:
+            r.raise_for_status()
+            return r.json()
+        except (requests.HTTPError, ValueError) as e:
+            raise ErrorProveedor(f"{self.nombre} {ruta}: {e}") from e
+
+
+twelvedata = ClienteProveedor("twelvedata", "https://api.twelvedata.com", "TWELVE_DATA_API_KEY", "apikey")
+finnhub = ClienteProveedor("finnhub", "https://finnhub.io/api/v1", "FINNHUB_API_KEY", "token")
+alphavantage = ClienteProveedor("alphavantage", "https://www.alphavantage.co", "ALPHA_VANTAGE_API_KEY", "apikey")
@@ -0,0 +1,68 @@
+# alpha_quantum/services/recalculo.py
+"""
+Mantenimiento incremental de HistoricoCartera cuando cambian transacciones.
+
+Las señales de Transaccion llaman a marcar(user_id, fecha) con la fecha más
+antigua afectada. Todas las marcas de un mismo commit se funden (fecha
+mínima por usuario) y, vía transaction.on_commit, se encola un recálculo
+desde esa fecha en segundo plano.
+
+Sin ATOMIC_REQUESTS cada save() es su propio commit, así que además se
+agrupan los commits seguidos: mientras el recálculo de un usuario sigue en
+cola, los nuevos commits solo adelantan su fecha en vez de encolar otro.
+"""
+import threading
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from . import valoracion
+from .segundo_plano import lanzar
+
+_estado = threading.local()
+
+# recálculos encolados y aún sin empezar: {user_id: fecha mínima}
+_en_cola = {}
+_lock = threading.Lock()
+
+
+def _pendientes() -> dict:
+    if not hasattr(_estado, "pendientes"):
+        _estado.pendientes = {}
+    return _estado.pendientes
+
+
+def marcar(user_id: int, fecha: date) -> None:
+    """Anota que el histórico de `user_id` es incorrecto a partir de `fecha`."""
+    if fecha is None:
+        return
+    pendientes = _pendientes()
+    pendientes[user_id] = min(fecha, pendientes.get(user_id, fecha))
+    # se registra en cada marca: si el bloque hace rollback la callback se
+    # descarta, y la primera que se ejecute tras el commit consume la entrada
+    transaction.on_commit(lambda: _aplicar(user_id))
+
+
+def _aplicar(user_id: int) -> None:
+    desde = _pendientes().pop(user_id, None)
+    if desde is None or desde >= date.today():
+        return  # ya aplicado en este commit, o solo afecta al snapshot de hoy
+    with _lock:
+        encolado = user_id in _en_cola
+        _en_cola[user_id] = min(desde, _en_cola.get(user_id, desde))
+    if not encolado:
+        lanzar(_recalcular_encolado, user_id)
+
+
+def _recalcular_encolado(user_id: int) -> int:
+    # lo que llegue desde aquí encola un recálculo nuevo
+    with _lock:
+        desde = _en_cola.pop(user_id)
+    return recalcular(user_id, desde)
+
+
+def recalcular(user_id: int, desde: date) -> int:
+    """Reescribe las filas de HistoricoCartera de `user_id` desde `desde`."""
+    user = get_user_model().objects.get(pk=user_id)
+    return valoracion.valorar(user, desde=desde)
@@ -0,0 +1,191 @@
+# alpha_quantum/services/riesgo.py
+"""
+Motor de riesgo (NumPy): VaR y Expected Shortfall a un día de la cartera
+actual de un usuario, por tres métodos:
+
+- histórico: cuantiles empíricos de la serie de P/L simulada;
+- paramétrico: normal con la media y volatilidad de esa serie;
+- Cornish-Fisher: cuantil normal corregido por asimetría y curtosis.
+
+La serie sale de aplicar las posiciones de hoy a la matriz de rendimientos
+diarios de los últimos RIESGO_VENTANA días laborables. El resultado se
+cachea por usuario y día de mercado.
+"""
+from datetime import date, timedelta
+from statistics import NormalDist
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from ..models import Accion
+from .valoracion import arrastrar, matriz_precios, rejilla
+
+NIVELES = (0.95, 0.99)
+MIN_OBSERVACIONES = 30
+_N = NormalDist()
+
+
+def _ventana() -> int:
+    return int(getattr(settings, "RIESGO_VENTANA", 252))
+
+
+def dia_mercado(hoy: date = None) -> date:
+    """Último día laborable hasta hoy (incluido)."""
+    d = hoy or date.today()
+    while d.weekday() >= 5:
+        d -= timedelta(days=1)
+    return d
+
+
+# ------------------- datos de entrada -------------------
+
+def exposiciones(user):
+    """(tickers, cantidades) de las posiciones abiertas de `user`."""
+    cantidades = {}
+    for ticker, cantidad in Accion.objects.filter(user=user, cantidad__gt=0).values_list("ticker", "cantidad"):
+        t = ticker.upper().strip()
+        cantidades[t] = cantidades.get(t, 0.0) + float(cantidad)
+    tickers = sorted(cantidades)
+    return tickers, np.array([cantidades[t] for t in tickers])
+
+
+def matriz_rendimientos(tickers: list, hasta: date, dias: int):
+    """
+    (fechas, precios, R): precios arrastrados (dias+1 x tickers) y
+    rendimientos simples diarios (dias x tickers); 0 donde no hay dato.
+    """
+    inicio = hasta - timedelta(days=int(dias * 7 / 5) + 10)
+    fechas = rejilla(inicio, hasta)[-(dias + 1):]
+    precios = arrastrar(matriz_precios(tickers, fechas))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        r = precios[1:] / precios[:-1] - 1.0
+    return fechas, precios, np.nan_to_num(r, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+def serie_pyg(user, hasta: date = None, dias: int = None):
+    """
+    Serie de P/L diario (€) de la cartera actual sobre la ventana, y el
+    valor actual de la cartera. Devuelve (None, 0) si no hay datos.
+    """
+    tickers, cantidades = exposiciones(user)
+    if not tickers:
+        return None, 0.0
+    _, precios, r = matriz_rendimientos(tickers, hasta or dia_mercado(), dias or _ventana())
+    ultimo = np.nan_to_num(precios[-1]) if len(precios) else np.zeros(len(tickers))
+    exposicion = cantidades * ultimo
+    valor = float(exposicion.sum())
+    # descartamos días sin ningún movimiento (falta de datos, festivos)
+    r = r[np.any(r != 0, axis=1)]
+    if valor <= 0 or len(r) < MIN_OBSERVACIONES:
+        return None, valor
+    return r @ exposicion, valor
+
+
+# ------------------- medidas -------------------
+
+def var_es_historico(x: np.ndarray, nivel: float):
+    """VaR y ES (pérdidas en positivo) por simulación histórica."""
+    q = np.quantile(x, 1 - nivel)
+    cola = x[x <= q]
+    return float(-q), float(-cola.mean()) if len(cola) else float(-q)
+
+
+def var_es_parametrico(mu: float, sigma: float, nivel: float):
+    z = _N.inv_cdf(1 - nivel)
+    var = -(mu + z * sigma)
+    es = -(mu - sigma * _N.pdf(z) / (1 - nivel))
+    return float(var), float(es)
+
+
+def _z_cornish_fisher(z, s: float, k: float):
+    return (z + (z ** 2 - 1) * s / 6 + (z ** 3 - 3 * z) * k / 24
+            - (2 * z ** 3 - 5 * z) * s ** 2 / 36)
+
+
+def var_es_cornish_fisher(mu: float, sigma: float, s: float, k: float, nivel: float):
+    """
+    VaR con el cuantil de Cornish-Fisher (asimetría `s`, curtosis en exceso
+    `k`); ES como media de los cuantiles CF de la cola.
+    """
+    z = _N.inv_cdf(1 - nivel)
+    var = -(mu + _z_cornish_fisher(z, s, k) * sigma)
+    colas = np.linspace(1e-4, 1 - nivel, 200)
+    zs = np.array([_N.inv_cdf(p) for p in colas])
+    es = -(mu + _z_cornish_fisher(zs, s, k).mean() * sigma)
+    return float(var), float(es)
+
+
+def momentos(x: np.ndarray):
+    """(media, desviación, asimetría, curtosis en exceso)."""
+    mu = float(x.mean())
+    sigma = float(x.std(ddof=1))
+    if sigma == 0:
+        return mu, 0.0, 0.0, 0.0
+    z = (x - mu) / sigma
+    return mu, sigma, float((z ** 3).mean()), float((z ** 4).mean() - 3.0)
+
+
+def _fila(var: float, es: float, valor: float) -> dict:
+    return {
+        "var_abs": round(var, 2),
+        "var_pct": round(var / valor * 100, 2),
+        "es_abs": round(es, 2),
+        "es_pct": round(es / valor * 100, 2),
+    }
+
+
+def calcular(user, hasta: date = None) -> dict:
+    """Informe de riesgo de `user` (None si no hay datos suficientes)."""
+    hasta = hasta or dia_mercado()
+    pyg, valor = serie_pyg(user, hasta)
+    if pyg is None:
+        return None
+
+    mu, sigma, s, k = momentos(pyg)
+    metodos = {"historico": {}, "parametrico": {}, "cornish_fisher": {}}
+    for nivel in NIVELES:
+        clave = str(int(nivel * 100))
+        metodos["historico"][clave] = _fila(*var_es_historico(pyg, nivel), valor)
+        metodos["parametrico"][clave] = _fila(*var_es_parametrico(mu, sigma, nivel), valor)
+        metodos["cornish_fisher"][clave] = _fila(*var_es_cornish_fisher(mu, sigma, s, k, nivel), valor)
+
+    cuentas, bordes = np.histogram(pyg / valor * 100, bins=30)
+    return {
+        "fecha": hasta.isoformat(),
+        "observaciones": int(len(pyg)),
+        "valor_cartera": round(valor, 2),
+        "metodos": metodos,
+        "estadisticos": {
+            "media_pct": round(mu / valor * 100, 4),
+            "volatilidad_pct": round(sigma / valor * 100, 4),
+            "asimetria": round(s, 4),
+            "curtosis_exceso": round(k, 4),
+        },
+        "histograma": {
+            "labels": [f"{(a + b) / 2:.2f}" for a, b in zip(bordes[:-1], bordes[1:])],
+            "counts": cuentas.tolist(),
+        },
+    }
+
+
+# ------------------- caché por usuario y día -------------------
+
+def _clave(user_id, dia: date) -> str:
+    return f"riesgo:{user_id}:{dia.isoformat()}"
+
+
+def informe(user) -> dict:
+    """calcular() cacheado por usuario y día de mercado."""
+    user_id = getattr(user, "pk", user)
+    dia = dia_mercado()
+    clave = _clave(user_id, dia)
+    res = cache.get(clave)
+    if res is None:
+        res = calcular(user, dia) or {}
+        cache.set(clave, res, timeout=24 * 3600)
+    return res or None
+
+
+def invalidar(user_id) -> None:
+    cache.delete(_clave(user_id, dia_mercado()))
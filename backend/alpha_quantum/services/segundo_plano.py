@@ -0,0 +1,75 @@
+# alpha_quantum/services/segundo_plano.py
+"""
+Ejecutores compartidos:
+- tareas cortas fuera del ciclo de la petición (revalidaciones de caché,
+  refrescos oportunistas...) con lanzar();
+- abanicos de llamadas concurrentes dentro de una petición con un plazo
+  global, con en_paralelo().
+"""
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import connection
+
+from .limitador import prioridad_fondo
+
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, "SEGUNDO_PLANO_WORKERS", 4),
+    thread_name_prefix="aq-bg",
+)
+_executor_peticiones = ThreadPoolExecutor(
+    max_workers=getattr(settings, "PARALELO_WORKERS", 16),
+    thread_name_prefix="aq-fanout",
+)
+
+
+def _ejecutar(fn, *args, **kwargs):
+    try:
+        with prioridad_fondo():
+            return fn(*args, **kwargs)
+    except Exception as e:
+        print(f"[BG] Error en tarea {getattr(fn, '__name__', fn)}: {e}")
+    finally:
+        # cada hilo abre su propia conexión: la cerramos al terminar
+        connection.close()
+
+
+def lanzar(fn, *args, **kwargs):
+    """Encola fn(*args, **kwargs) en el pool de segundo plano y devuelve el Future."""
+    return _executor.submit(_ejecutar, fn, *args, **kwargs)
+
+
+def _ejecutar_en_peticion(fn, *args):
+    try:
+        return fn(*args)
+    finally:
+        connection.close()
+
+
+def en_paralelo(tareas: dict, plazo: float):
+    """
+    Ejecuta concurrentemente {nombre: (fn, *args)} y espera como mucho
+    `plazo` segundos en total. Devuelve (resultados, faltan): los resultados
+    que llegaron a tiempo y los nombres de las tareas que no (por plazo o
+    por excepción). Las tareas rezagadas, también las que seguían en cola,
+    terminan solas en segundo plano.
+    """
+    futuros = {}
+    for nombre, (fn, *args) in tareas.items():
+        ctx = contextvars.copy_context()  # conserva la prioridad del limitador
+        futuros[_executor_peticiones.submit(ctx.run, _ejecutar_en_peticion, fn, *args)] = nombre
+
+    # las pendientes no se cancelan, ni siquiera las aún en cola: al terminar
+    # dejan su resultado en las cachés para la siguiente carga
+    hechos, pendientes = wait(futuros, timeout=plazo)
+
+    resultados, faltan = {}, [futuros[f] for f in pendientes]
+    for f in hechos:
+        nombre = futuros[f]
+        try:
+            resultados[nombre] = f.result()
+        except Exception as e:
+            print(f"[PARALELO] {nombre}: {e}")
+            faltan.append(nombre)
+    return resultados, faltan
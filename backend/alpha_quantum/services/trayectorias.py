@@ -0,0 +1,68 @@
+# alpha_quantum/services/trayectorias.py
+"""
+Núcleo de generación de trayectorias para el Monte Carlo (solo NumPy).
+
+Se ejecuta en procesos hijos del ProcessPoolExecutor de montecarlo.py, así
+que no importa nada de Django: recibe arrays y devuelve arrays.
+"""
+import numpy as np
+
+
+def _cholesky(cov: np.ndarray) -> np.ndarray:
+    """Cholesky con un pequeño ajuste en la diagonal si la matriz no es PD."""
+    ajuste = 0.0
+    for _ in range(6):
+        try:
+            return np.linalg.cholesky(cov + ajuste * np.eye(len(cov)))
+        except np.linalg.LinAlgError:
+            ajuste = max(ajuste * 10, 1e-12)
+    return np.diag(np.sqrt(np.clip(np.diag(cov), 0, None)))
+
+
+def generar(metodo: str, rendimientos: np.ndarray, exposicion: np.ndarray, horizonte: int,
+            n: int, semilla, puntos: np.ndarray, bloque: int = 5) -> np.ndarray:
+    """
+    Valor de la cartera en los pasos `puntos` (0..horizonte) para `n`
+    trayectorias: array float32 (n, len(puntos)).
+
+    - "gbm": browniano geométrico correlacionado con media y covarianza de
+      los log-rendimientos históricos.
+    - "bootstrap": bootstrap por bloques de `bloque` días de los
+      rendimientos históricos (conserva correlaciones y colas).
+    """
+    rng = np.random.default_rng(semilla)
+    t, k = rendimientos.shape
+    crecimiento = np.ones((n, k))
+    salida = np.empty((n, len(puntos)), dtype=np.float32)
+    siguiente = 0
+    if puntos[0] == 0:
+        salida[:, 0] = exposicion.sum()
+        siguiente = 1
+
+    if metodo == "gbm":
+        logs = np.log1p(rendimientos)
+        mu = logs.mean(axis=0)
+        chol = _cholesky(np.atleast_2d(np.cov(logs, rowvar=False)))
+        for paso in range(1, horizonte + 1):
+            z = rng.standard_normal((n, k))
+            crecimiento *= np.exp(mu + z @ chol.T)
+            if siguiente < len(puntos) and puntos[siguiente] == paso:
+                salida[:, siguiente] = crecimiento @ exposicion
+                siguiente += 1
+    else:
+        n_bloques = -(-horizonte // bloque)
+        inicios = rng.integers(0, t, size=(n, n_bloques))
+        filas = ((inicios[:, :, None] + np.arange(bloque)) % t).reshape(n, -1)[:, :horizonte]
+        for paso in range(1, horizonte + 1):
+            crecimiento *= 1.0 + rendimientos[filas[:, paso - 1]]
+            if siguiente < len(puntos) and puntos[siguiente] == paso:
+                salida[:, siguiente] = crecimiento @ exposicion
+                siguiente += 1
+    return salida
+
+
+def generar_tramos(metodo: str, rendimientos: np.ndarray, exposicion: np.ndarray, horizonte: int,
+                   tramos: list, puntos: np.ndarray) -> np.ndarray:
+    """generar() para cada tramo (n, semilla) de la lista, apilados en orden."""
+    return np.vstack([generar(metodo, rendimientos, exposicion, horizonte, n, semilla, puntos)
+                      for n, semilla in tramos])
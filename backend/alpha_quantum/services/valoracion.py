@@ -0,0 +1,199 @@
+# alpha_quantum/services/valoracion.py
+"""
+Valoración histórica de la cartera de un usuario, vectorizada con NumPy.
+
+- Posiciones: matriz (días x tickers) = suma acumulada de las compras y
+  ventas de Transaccion (si un ticker no tiene transacciones se toma la
+  Accion como una compra en su fecha).
+- Precios: cierres de la rejilla de días laborables desde el almacén memmap
+  (o BarraDiaria si el almacén no tiene el ticker), arrastrando el último
+  cierre conocido y, antes del primero, el precio de la operación.
+- Invertido: coste medio de las posiciones abiertas.
+
+valorar() reescribe HistoricoCartera con un único upsert por lotes.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.db import transaction
+
+from ..models import Accion, BarraDiaria
+from ..models.historico import HistoricoCartera
+from ..models.transaccion import Transaccion
+from . import almacen_cierres
+
+COMPRAS = {"BUY", "COMPRA"}
+VENTAS = {"SELL", "VENTA"}
+
+
+def operaciones(user) -> list:
+    """
+    [(fecha, TICKER, cantidad_con_signo, precio, comision)] en orden
+    cronológico; compras en positivo, ventas en negativo.
+    """
+    ops = []
+    con_transacciones = set()
+    filas = (Transaccion.objects.filter(user=user)
+             .order_by("fecha", "id")
+             .values_list("fecha", "ticker", "tipo", "cantidad", "precio", "comision"))
+    for fecha, ticker, tipo, cantidad, precio, comision in filas:
+        t = ticker.upper().strip()
+        tipo = (tipo or "").upper()
+        if tipo in COMPRAS:
+            signo = 1.0
+        elif tipo in VENTAS:
+            signo = -1.0
+        else:
+            continue  # DIV no cambia la posición
+        con_transacciones.add(t)
+        ops.append((fecha, t, signo * float(cantidad or 0), float(precio or 0), float(comision or 0)))
+
+    for fecha, ticker, cantidad, precio in (Accion.objects.filter(user=user, cantidad__gt=0)
+                                            .values_list("fecha", "ticker", "cantidad", "precio_compra")):
+        t = ticker.upper().strip()
+        if t not in con_transacciones:
+            ops.append((fecha, t, float(cantidad), float(precio or 0), 0.0))
+
+    ops.sort(key=lambda o: o[0])
+    return ops
+
+
+def rejilla(desde: date, hasta: date) -> np.ndarray:
+    """Días laborables entre `desde` y `hasta` (ambos incluidos)."""
+    dias = np.arange(np.datetime64(desde, "D"), np.datetime64(hasta, "D") + 1, dtype="datetime64[D]")
+    return dias[np.is_busday(dias)]
+
+
+def arrastrar(m: np.ndarray) -> np.ndarray:
+    """Forward-fill por columnas de los NaN de `m`."""
+    filas = np.where(~np.isnan(m), np.arange(m.shape[0])[:, None], 0)
+    np.maximum.accumulate(filas, axis=0, out=filas)
+    return m[filas, np.arange(m.shape[1])]
+
+
+def matriz_precios(tickers: list, dias: np.ndarray) -> np.ndarray:
+    """Cierres (días x tickers) sin arrastrar; NaN donde no hay barra."""
+    p = np.full((len(dias), len(tickers)), np.nan)
+    if not len(dias):
+        return p
+
+    fechas_alm, m = almacen_cierres.matriz(tickers, dias[0], dias[-1])
+    if len(fechas_alm):
+        pos = np.searchsorted(dias, fechas_alm)
+        ok = (pos < len(dias)) & (dias[np.minimum(pos, len(dias) - 1)] == fechas_alm)
+        p[pos[ok]] = m[ok]
+
+    # tickers que el almacén no tiene: directamente desde BD
+    faltan = [t for j, t in enumerate(tickers) if np.isnan(p[:, j]).all()]
+    if faltan:
+        col = {t: tickers.index(t) for t in faltan}
+        filas = (BarraDiaria.objects
+                 .filter(instrumento_id__in=faltan, fecha__gte=dias[0].item(), fecha__lte=dias[-1].item())
+                 .values_list("instrumento_id", "fecha", "cierre"))
+        for t, f, c in filas.iterator(chunk_size=5000):
+            i = np.searchsorted(dias, np.datetime64(f, "D"))
+            if i < len(dias) and dias[i] == np.datetime64(f, "D"):
+                p[i, col[t]] = float(c)
+    return p
+
+
+def calcular(user, hasta: date = None):
+    """
+    (dias, valor, invertido) de la cartera de `user` para cada día laborable
+    desde la primera operación hasta `hasta` (por defecto, ayer).
+    """
+    hasta = hasta or date.today() - timedelta(days=1)
+    vacio = np.empty(0, dtype="datetime64[D]"), np.empty(0), np.empty(0)
+    ops = [o for o in operaciones(user) if o[0] <= hasta]
+    if not ops:
+        return vacio
+
+    dias = rejilla(ops[0][0], hasta)
+    if not len(dias):
+        return vacio  # operaciones y `hasta` en el mismo fin de semana
+    tickers = sorted({o[1] for o in ops})
+    col = {t: j for j, t in enumerate(tickers)}
+    n, k = len(dias), len(tickers)
+
+    # índice de cada operación en la rejilla (las de fin de semana, al lunes)
+    fechas_ops = np.array([o[0] for o in ops], dtype="datetime64[D]")
+    fila = np.minimum(np.searchsorted(dias, fechas_ops), n - 1)
+    columna = np.array([col[o[1]] for o in ops])
+    cantidades = np.array([o[2] for o in ops])
+    precios_ops = np.array([o[3] for o in ops])
+
+    # coste medio: secuencial por operación, acumulado luego en bloque
+    delta_coste = np.zeros(len(ops))
+    pos, coste = np.zeros(k), np.zeros(k)
+    for i, (_, t, q, precio, comision) in enumerate(ops):
+        j = col[t]
+        if q > 0:
+            d = q * precio + comision
+        else:
+            vendidas = min(-q, pos[j])
+            d = -(coste[j] / pos[j] * vendidas) if pos[j] > 0 else 0.0
+        pos[j] = max(0.0, pos[j] + q)
+        coste[j] += d
+        if pos[j] == 0:
+            d -= coste[j]  # sin posición no queda coste residual
+            coste[j] = 0.0
+        delta_coste[i] = d
+
+    movimientos = np.zeros((n, k))
+    np.add.at(movimientos, (fila, columna), cantidades)
+    posiciones = np.clip(np.cumsum(movimientos, axis=0), 0, None)
+
+    costes = np.zeros((n, k))
+    np.add.at(costes, (fila, columna), delta_coste)
+    invertido = np.cumsum(costes, axis=0).sum(axis=1)
+
+    precios = matriz_precios(tickers, dias)
+    # antes del primer cierre conocido vale el precio de la operación
+    semilla = np.isnan(precios[fila, columna])
+    precios[fila[semilla], columna[semilla]] = precios_ops[semilla]
+    precios = np.nan_to_num(arrastrar(precios))
+
+    valor = (posiciones * precios).sum(axis=1)
+    return dias, valor, invertido
+
+
+def _dec(x: float) -> Decimal:
+    return Decimal(str(round(float(x), 2)))
+
+
+def valorar(user, desde: date = None, hasta: date = None) -> int:
+    """
+    Recalcula y guarda HistoricoCartera de `user` (desde `desde` o desde la
+    primera operación) con un único bulk_create(update_conflicts=True).
+    Dentro del tramo se borran los días que ya no están en la rejilla (fines
+    de semana o anteriores a la primera operación); el de hoy lo gestiona
+    snapshot_cartera_diario. Devuelve las filas escritas.
+    """
+    hoy = date.today()
+    dias, valor, invertido = calcular(user, hasta)
+    if desde is not None:
+        ok = dias >= np.datetime64(desde, "D")
+        dias, valor, invertido = dias[ok], valor[ok], invertido[ok]
+
+    filas = [
+        HistoricoCartera(user=user, fecha=d, valor=_dec(v), invertido=_dec(i))
+        for d, v, i in zip(dias.tolist(), valor, invertido)
+    ]
+    with transaction.atomic():
+        viejas = HistoricoCartera.objects.filter(user=user, fecha__lt=hoy)
+        if desde is not None:
+            viejas = viejas.filter(fecha__gte=desde)
+        if filas:
+            viejas.filter(fecha__lt=filas[0].fecha).delete()
+            viejas.filter(fecha__week_day__in=[1, 7]).delete()  # domingo, sábado
+        else:
+            viejas.delete()
+        HistoricoCartera.objects.bulk_create(
+            filas,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=["user", "fecha"],
+            update_fields=["valor", "invertido"],
+        )
+    return len(filas)
@@ -0,0 +1,52 @@
+# alpha_quantum/services/vuelo_unico.py
+"""
+Single-flight: si varias peticiones piden a la vez la misma llamada
+(proveedor, endpoint, parámetros), solo la primera la ejecuta y el resto
+espera y comparte su resultado (o su excepción).
+"""
+import threading
+
+
+class _Llamada:
+    __slots__ = ("evento", "resultado", "error")
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.error = None
+
+
+class GrupoVuelo:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._en_vuelo = {}
+
+    def hacer(self, clave, fn, *args, **kwargs):
+        """Ejecuta fn(*args, **kwargs) una sola vez por `clave` en vuelo."""
+        with self._lock:
+            llamada = self._en_vuelo.get(clave)
+            lider = llamada is None
+            if lider:
+                llamada = self._en_vuelo[clave] = _Llamada()
+
+        if not lider:
+            llamada.evento.wait()
+            if llamada.error is not None:
+                raise llamada.error
+            return llamada.resultado
+
+        try:
+            llamada.resultado = fn(*args, **kwargs)
+        except BaseException as e:
+            llamada.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._en_vuelo[clave]
+            llamada.evento.set()
+        return llamada.resultado
+
+
+def clave_llamada(proveedor: str, endpoint: str, params: dict = None) -> tuple:
+    """Clave canónica (independiente del orden) para una llamada a proveedor."""
+    return (proveedor, endpoint, tuple(sorted((k, str(v)) for k, v in (params or {}).items())))
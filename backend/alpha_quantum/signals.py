@@ -1,8 +1,10 @@
 # backend/alpha_quantum/signals.py
 
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from alpha_quantum.models.accion import Accion
+from alpha_quantum.models.transaccion import Transaccion
+from alpha_quantum.services import lotes, posiciones, recalculo, riesgo
 from alpha_quantum.utils import obtener_eventos_financieros_alpha_vantage
 
 
@@ -14,3 +16,42 @@ def crear_eventos_financieros(sender, instance, created, **kwargs):
             obtener_eventos_financieros_alpha_vantage(instance.ticker, user)
         except Exception as e:
             print(f"❌ Error al generar eventos tras crear acción: {e}")
+
+
+@receiver(post_save, sender=Accion)
+@receiver(post_delete, sender=Accion)
+def accion_modificada(sender, instance, **kwargs):
+    # el informe de riesgo usa las posiciones actuales
+    riesgo.invalidar(instance.user_id)
+
+
+# --- Libro de posiciones e histórico de cartera al tocar transacciones ---
+
+@receiver(pre_save, sender=Transaccion)
+def recordar_fecha_transaccion(sender, instance, **kwargs):
+    # si se edita una fecha, también cambia el histórico desde la fecha anterior
+    instance._fecha_anterior = None
+    if instance.pk:
+        instance._fecha_anterior = (
+            Transaccion.objects.filter(pk=instance.pk).values_list("fecha", flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Transaccion)
+def transaccion_guardada(sender, instance, **kwargs):
+    posiciones.subir_version(instance.user_id)
+    posiciones.invalidar(instance.user_id)
+    lotes.invalidar(instance.user_id)
+    riesgo.invalidar(instance.user_id)
+    fechas = [f for f in (instance.fecha, getattr(instance, "_fecha_anterior", None)) if f]
+    if fechas:
+        recalculo.marcar(instance.user_id, min(fechas))
+
+
+@receiver(post_delete, sender=Transaccion)
+def transaccion_borrada(sender, instance, **kwargs):
+    posiciones.subir_version(instance.user_id, crear=False)
+    posiciones.invalidar(instance.user_id)
+    lotes.invalidar(instance.user_id)
+    riesgo.invalidar(instance.user_id)
+    recalculo.marcar(instance.user_id, instance.fecha)
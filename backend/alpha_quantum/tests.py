@@ -0,0 +1,1218 @@
+"""
+Pruebas de los servicios de alpha_quantum (services/). No usan proveedores
+externos: las llamadas de red y las lecturas de precios se sustituyen con
+mock donde hace falta.
+"""
+import json
+import multiprocessing
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock
+
+import numpy as np
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import views
+from .models import Accion, BarraDiaria, Cartera, Instrumento
+from .models.cupo_proveedor import CupoProveedor
+from .models.historico import HistoricoCartera
+from .models.transaccion import Transaccion
+from .models.version_transacciones import VersionTransacciones
+from .models.watchlist import Watchlist, WatchlistLista
+from .services import (
+    almacen_cierres, analitica, asignacion, backtest, benchmark, cache_cotizaciones, covarianza, indicadores,
+    limitador, lotes, montecarlo, optimizacion, posiciones, precios, recalculo, riesgo, segundo_plano, valoracion,
+)
+from .services.vuelo_unico import GrupoVuelo, clave_llamada
+
+
+@override_settings(COTIZACIONES_CACHE_TTL=60, COTIZACIONES_CACHE_STALE=300)
+class CacheCotizacionesTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.descargar = mock.Mock(side_effect=[101.0, 102.0])
+        # la revalidación corre en el propio hilo
+        p = mock.patch.object(cache_cotizaciones, "lanzar", side_effect=lambda f, *a: f(*a))
+        self.lanzar = p.start()
+        self.addCleanup(p.stop)
+
+    def _edad(self, segundos):
+        return mock.patch.object(cache_cotizaciones.time, "time",
+                                 return_value=cache_cotizaciones.time.time() + segundos)
+
+    def test_fallo_descarga_y_guarda(self):
+        self.assertEqual(cache_cotizaciones.obtener("aapl", self.descargar), 101.0)
+        self.descargar.assert_called_once_with("aapl")
+        self.assertEqual(cache_cotizaciones.leer("AAPL")[0], 101.0)
+        self.assertEqual(cache_cotizaciones.estadisticas()["misses"], 1)
+
+    def test_acierto_no_llama_al_proveedor(self):
+        cache_cotizaciones.obtener("AAPL", self.descargar)
+        with self._edad(30):
+            self.assertEqual(cache_cotizaciones.obtener("AAPL", self.descargar), 101.0)
+        self.assertEqual(self.descargar.call_count, 1)
+        self.lanzar.assert_not_called()
+        stats = cache_cotizaciones.estadisticas()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_caducado_sirve_el_anterior_y_revalida(self):
+        cache_cotizaciones.obtener("AAPL", self.descargar)
+        with self._edad(120):
+            self.assertEqual(cache_cotizaciones.obtener("AAPL", self.descargar), 101.0)
+        self.lanzar.assert_called_once()
+        self.assertEqual(cache_cotizaciones.leer("AAPL")[0], 102.0)
+        self.assertEqual(cache_cotizaciones.estadisticas()["stale"], 1)
+
+    def test_fuera_de_la_ventana_stale_vuelve_a_descargar(self):
+        cache_cotizaciones.obtener("AAPL", self.descargar)
+        with self._edad(400):
+            self.assertEqual(cache_cotizaciones.obtener("AAPL", self.descargar), 102.0)
+        self.lanzar.assert_not_called()
+        self.assertEqual(cache_cotizaciones.estadisticas()["misses"], 2)
+
+    def test_no_cachea_fallos_del_proveedor(self):
+        descargar = mock.Mock(return_value=0.0)
+        cache_cotizaciones.obtener("AAPL", descargar)
+        cache_cotizaciones.obtener("AAPL", descargar)
+        self.assertEqual(descargar.call_count, 2)
+
+    def test_lote_solo_pide_los_que_faltan(self):
+        cache_cotizaciones.guardar("AAPL", 100.0)
+        descargar_lote = mock.Mock(return_value={"MSFT": 300.0, "XXXX": 0.0})
+        precios = cache_cotizaciones.obtener_varios(["aapl", "MSFT", "XXXX"], descargar_lote)
+        descargar_lote.assert_called_once_with(["MSFT", "XXXX"])
+        self.assertEqual(precios, {"AAPL": 100.0, "MSFT": 300.0})
+
+
+@override_settings(
+    PROVEEDORES_LIMITES={"prueba": {"por_minuto": 6, "por_dia": 10}},
+    PROVEEDORES_RESERVA_INTERACTIVA=0.5,
+    PROVEEDORES_ESPERA_MAX=0.0,
+    PROVEEDORES_ESPERA_FONDO=0.0,
+)
+class LimitadorTests(TestCase):
+    def setUp(self):
+        self.ahora = timezone.make_aware(datetime(2024, 6, 3, 10, 0, 0))
+        p = mock.patch.object(limitador.timezone, "now", side_effect=lambda: self.ahora)
+        p.start()
+        self.addCleanup(p.stop)
+
+    def _avanzar(self, segundos):
+        self.ahora += timedelta(seconds=segundos)
+
+    def _cupo(self):
+        return CupoProveedor.objects.get(proveedor="prueba")
+
+    def test_bucket_lleno_y_recarga(self):
+        self.assertEqual(sum(limitador.adquirir("prueba") for _ in range(7)), 6)
+        self._avanzar(10)  # 6/min = 1 token cada 10 s
+        self.assertTrue(limitador.adquirir("prueba"))
+        self.assertFalse(limitador.adquirir("prueba"))
+        cupo = self._cupo()
+        self.assertEqual(cupo.usados_dia, 7)
+        self.assertEqual(cupo.rechazados_dia, 2)
+
+    def test_cupo_diario(self):
+        concedidas = 0
+        for _ in range(12):
+            concedidas += limitador.adquirir("prueba")
+            self._avanzar(60)
+        self.assertEqual(concedidas, 10)
+        self.assertEqual(self._cupo().usados_dia, 10)
+        self.ahora = self.ahora.replace(hour=0) + timedelta(days=1)  # día nuevo
+        self.assertTrue(limitador.adquirir("prueba"))
+
+    def test_el_fondo_respeta_la_reserva_interactiva(self):
+        with limitador.prioridad_fondo():
+            self.assertEqual(limitador.coste_maximo("prueba"), 3)
+            self.assertEqual(sum(limitador.adquirir("prueba") for _ in range(5)), 3)
+        self.assertEqual(self._cupo().tokens, 3)
+        self.assertEqual(sum(limitador.adquirir("prueba") for _ in range(5)), 3)
+
+    def test_reserva_del_cupo_diario(self):
+        with limitador.prioridad_fondo():
+            concedidas = 0
+            for _ in range(8):
+                concedidas += limitador.adquirir("prueba")
+                self._avanzar(60)
+        self.assertEqual(concedidas, 5)  # la mitad de 10
+        self.assertTrue(limitador.adquirir("prueba"))
+
+    def test_coste_mayor_que_la_capacidad(self):
+        self.assertFalse(limitador.adquirir("prueba", coste=7))
+        self.assertTrue(limitador.adquirir("prueba", coste=6))
+
+    def test_espera_y_luego_concede(self):
+        dormido = []
+
+        def dormir(segundos):
+            dormido.append(segundos)
+            self._avanzar(segundos)
+
+        limitador.agotar("prueba")
+        with override_settings(PROVEEDORES_ESPERA_MAX=30.0), \
+                mock.patch.object(limitador.time, "sleep", side_effect=dormir):
+            self.assertTrue(limitador.adquirir("prueba", coste=2))
+        self.assertEqual(len(dormido), 1)
+        self.assertAlmostEqual(dormido[0], 20.0)
+
+    def test_espera_demasiado_larga_deniega(self):
+        limitador.agotar("prueba")
+        with override_settings(PROVEEDORES_ESPERA_MAX=5.0), \
+                mock.patch.object(limitador.time, "sleep") as dormir:
+            self.assertFalse(limitador.adquirir("prueba"))
+        dormir.assert_not_called()
+        self.assertEqual(self._cupo().rechazados_dia, 1)
+
+    def test_sin_limites_no_toca_la_base_de_datos(self):
+        self.assertTrue(limitador.adquirir("desconocido"))
+        self.assertFalse(CupoProveedor.objects.exists())
+
+
+class VueloUnicoTests(SimpleTestCase):
+    HILOS = 8
+
+    def _a_la_vez(self, fn):
+        """Lanza HILOS llamadas idénticas a la vez; devuelve (resultados, errores)."""
+        grupo, salida = GrupoVuelo(), []
+        barrera = threading.Barrier(self.HILOS)
+
+        def pedir():
+            barrera.wait()
+            try:
+                salida.append(("ok", grupo.hacer(clave_llamada("prueba", "/quote", {"symbol": "AAPL"}), fn)))
+            except Exception as e:
+                salida.append(("error", e))
+
+        hilos = [threading.Thread(target=pedir) for _ in range(self.HILOS)]
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join(timeout=5)
+        self.assertEqual(len(salida), self.HILOS)
+        self.assertFalse(grupo._en_vuelo)
+        return salida
+
+    def test_comparten_una_sola_llamada(self):
+        llamadas = []
+
+        def proveedor():
+            llamadas.append(1)
+            time.sleep(0.2)  # deja que el resto de hilos se sume
+            return {"precio": 101.0}
+
+        salida = self._a_la_vez(proveedor)
+        self.assertEqual(len(llamadas), 1)
+        self.assertEqual(salida, [("ok", {"precio": 101.0})] * self.HILOS)
+
+    def test_comparten_la_excepcion(self):
+        llamadas = []
+
+        def proveedor():
+            llamadas.append(1)
+            time.sleep(0.2)
+            raise ConnectionError("caído")
+
+        salida = self._a_la_vez(proveedor)
+        self.assertEqual(len(llamadas), 1)
+        self.assertTrue(all(tipo == "error" and str(e) == "caído" for tipo, e in salida))
+
+    def test_llamadas_sucesivas_no_se_comparten(self):
+        grupo, llamadas = GrupoVuelo(), []
+        for i in range(3):
+            self.assertEqual(grupo.hacer("k", lambda: llamadas.append(1) or len(llamadas)), i + 1)
+
+    def test_clave_independiente_del_orden(self):
+        self.assertEqual(clave_llamada("p", "/e", {"a": 1, "b": "x"}), clave_llamada("p", "/e", {"b": "x", "a": "1"}))
+
+
+class EnParaleloTests(SimpleTestCase):
+    def test_las_lentas_no_retrasan_el_resultado(self):
+        lenta_hecha = threading.Event()
+
+        def lenta():
+            time.sleep(0.5)
+            lenta_hecha.set()
+            return "tarde"
+
+        def falla():
+            raise RuntimeError("proveedor caído")
+
+        inicio = time.monotonic()
+        res, faltan = segundo_plano.en_paralelo(
+            {"rapida": (lambda x: x * 2, 21), "lenta": (lenta,), "falla": (falla,)}, plazo=0.1,
+        )
+        self.assertLess(time.monotonic() - inicio, 0.4)
+        self.assertEqual(res, {"rapida": 42})
+        self.assertCountEqual(faltan, ["lenta", "falla"])
+        self.assertTrue(lenta_hecha.wait(2))  # la rezagada termina igualmente
+
+    def test_las_que_seguian_en_cola_tambien_terminan(self):
+        hechas = []
+        en_cola = threading.Event()
+
+        def tarea(nombre, segundos):
+            time.sleep(segundos)
+            hechas.append(nombre)
+            if nombre == "b":
+                en_cola.set()
+
+        with ThreadPoolExecutor(max_workers=1) as pool, \
+                mock.patch.object(segundo_plano, "_executor_peticiones", pool):
+            res, faltan = segundo_plano.en_paralelo({"a": (tarea, "a", 0.3), "b": (tarea, "b", 0)}, plazo=0.05)
+            self.assertEqual(res, {})
+            self.assertCountEqual(faltan, ["a", "b"])
+            self.assertTrue(en_cola.wait(2))
+        self.assertEqual(hechas, ["a", "b"])
+
+    @override_settings(FUNDAMENTAL_PLAZO=0.2)
+    def test_analisis_fundamental_no_espera_mas_del_plazo(self):
+        def lenta(*args):
+            time.sleep(1.0)
+            return []
+
+        request = RequestFactory().get("/analisis-fundamental/", {"ticker": "aapl"})
+        request.user = AnonymousUser()
+        with mock.patch.object(views, "obtener_precio_actual", return_value=190.0), \
+                mock.patch.object(views, "_serie_precios_twelvedata", side_effect=lenta), \
+                mock.patch.object(views, "_overview_con_fallback", return_value=({"nombre": "Apple"}, None)), \
+                mock.patch.object(views, "_income_quarterly", return_value=([], [], [], [], [])), \
+                mock.patch.object(views, "_earnings_eps_quarterly", side_effect=lenta), \
+                mock.patch.object(views, "_balance_quarterly", return_value=([], [], [])), \
+                mock.patch.object(views, "render", return_value=HttpResponse()) as render:
+            inicio = time.monotonic()
+            views.analisis_fundamental(request)
+            self.assertLess(time.monotonic() - inicio, 0.8)
+        ctx = render.call_args.args[2]
+        self.assertEqual(ctx["datos"]["precio"], 190.0)
+        self.assertEqual(ctx["datos"]["nombre"], "Apple")
+        self.assertEqual(ctx["paneles_pendientes"], ["Gráfico de precio", "BPA trimestral"])
+        self.assertEqual(ctx["ohlcv"], [])
+
+
+class DashboardDataTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        p = mock.patch("alpha_quantum.signals.obtener_eventos_financieros_alpha_vantage")
+        p.start()
+        self.addCleanup(p.stop)
+        self.user = get_user_model().objects.create_user("ana", "ana@example.com", "x")
+        cartera = Cartera.objects.create(usuario=self.user, nombre="Cartera Principal")
+        self.ahora = timezone.now()
+        for ticker, cantidad, compra, actual, actualizado in (
+            ("AAPL", 10, 100.0, "150.00", self.ahora),
+            ("MSFT", 5, 200.0, "180.00", self.ahora - timedelta(hours=2)),
+            ("NVDA", 2, 50.0, None, None),
+        ):
+            Accion.objects.create(user=self.user, cartera=cartera, nombre=ticker, ticker=ticker, cantidad=cantidad,
+                                  precio_compra=compra, precio_actual=actual, precio_actualizado=actualizado,
+                                  fecha=date(2024, 1, 2))
+
+    def test_lee_los_precios_de_la_base_de_datos(self):
+        request = RequestFactory().get("/")
+        request.user = self.user
+        with mock.patch.object(views, "obtener_precio_actual") as precio, \
+                mock.patch.object(views, "obtener_precios_actuales") as lote, \
+                mock.patch.object(precios, "lanzar") as lanzar:
+            respuesta = views.DashboardDataView.as_view()(request)
+        precio.assert_not_called()
+        lote.assert_not_called()
+        # los caducados o sin precio se refrescan en segundo plano
+        lanzar.assert_called_once()
+        self.assertEqual(lanzar.call_args.args[2], ["MSFT", "NVDA"])
+
+        datos = json.loads(respuesta.content)
+        self.assertEqual(datos["total_invertido"], 2100.0)
+        self.assertEqual(datos["valor_actual_total"], 2500.0)  # NVDA al precio de compra
+        self.assertEqual(datos["rentabilidad_total"], 19.05)
+        self.assertEqual(datos["top_ganadoras"][0]["ticker"], "AAPL")
+        self.assertEqual(datos["top_perdedoras"][0]["ticker"], "MSFT")
+        self.assertEqual(datos["precios_a_fecha"], (self.ahora - timedelta(hours=2)).isoformat())
+
+
+class AlmacenCierresTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        ajustes = override_settings(ALMACEN_CIERRES_DIR=self.dir.name, ALMACEN_CIERRES_ORIGEN="2024-01-01")
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        dias = valoracion.rejilla(date(2024, 1, 1), date(2024, 1, 31))
+        almacen_cierres.actualizar("TEST", dias, np.arange(len(dias), dtype=float))
+
+    def test_hasta_en_fin_de_semana_no_incluye_el_lunes(self):
+        for hasta in (date(2024, 1, 12), date(2024, 1, 13), date(2024, 1, 14)):
+            fechas, m = almacen_cierres.matriz(["TEST"], date(2024, 1, 10), hasta)
+            self.assertEqual(str(fechas[-1]), "2024-01-12")
+            self.assertEqual(m.shape, (3, 1))
+        fechas, _ = almacen_cierres.matriz(["TEST"], date(2024, 1, 10), date(2024, 1, 15))
+        self.assertEqual(str(fechas[-1]), "2024-01-15")
+
+
+class ValoracionTests(SimpleTestCase):
+    """valoracion.calcular en los bordes de la rejilla de días laborables."""
+
+    def _calcular(self, ops, hasta):
+        def sin_cierres(tickers, dias):
+            return np.full((len(dias), len(tickers)), np.nan)
+
+        with mock.patch.object(valoracion, "operaciones", return_value=ops), \
+                mock.patch.object(valoracion, "matriz_precios", side_effect=sin_cierres):
+            return valoracion.calcular(None, hasta)
+
+    def test_operacion_y_hasta_en_el_mismo_fin_de_semana(self):
+        ops = [(date(2026, 10, 17), "AAPL", 5.0, 100.0, 1.0)]  # sábado
+        for hasta in (date(2026, 10, 17), date(2026, 10, 18)):
+            dias, valor, invertido = self._calcular(ops, hasta)
+            self.assertEqual(len(dias), 0)
+            self.assertEqual(len(valor), 0)
+            self.assertEqual(len(invertido), 0)
+
+    def test_operacion_de_fin_de_semana_cuenta_el_lunes(self):
+        ops = [(date(2026, 10, 17), "AAPL", 5.0, 100.0, 1.0)]
+        dias, valor, invertido = self._calcular(ops, date(2026, 10, 19))
+        self.assertEqual(dias.tolist(), [date(2026, 10, 19)])
+        self.assertEqual(valor.tolist(), [500.0])      # al precio de la operación
+        self.assertEqual(invertido.tolist(), [501.0])  # con la comisión
+
+    def test_venta_total_deja_invertido_a_cero(self):
+        ops = [
+            (date(2026, 10, 12), "AAPL", 5.0, 100.0, 0.0),
+            (date(2026, 10, 14), "AAPL", -5.0, 120.0, 0.0),
+        ]
+        dias, valor, invertido = self._calcular(ops, date(2026, 10, 16))
+        self.assertEqual(len(dias), 5)
+        self.assertEqual(invertido.tolist(), [500.0, 500.0, 0.0, 0.0, 0.0])
+        self.assertEqual(valor[-1], 0.0)
+
+
+class RecalculoTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("ana", "ana@example.com", "x")
+        for pendientes in (recalculo._en_cola, recalculo._pendientes()):
+            pendientes.clear()
+            self.addCleanup(pendientes.clear)
+        p = mock.patch.object(recalculo, "lanzar")
+        self.lanzar = p.start()
+        self.addCleanup(p.stop)
+
+    def _guardar(self, *fechas):
+        for f in fechas:
+            Transaccion.objects.create(user=self.user, ticker="AAPL", tipo="BUY", cantidad=1, precio=100, fecha=f)
+
+    def _ejecutar_encolado(self):
+        fn, user_id = self.lanzar.call_args.args
+        with mock.patch.object(recalculo.valoracion, "valorar", return_value=0) as valorar:
+            fn(user_id)
+        return valorar.call_args.kwargs["desde"]
+
+    def test_un_solo_recalculo_por_commit_desde_la_fecha_minima(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self._guardar(date(2024, 3, 5), date(2024, 1, 10), date(2024, 2, 1))
+                self.lanzar.assert_not_called()  # nada antes del commit
+        self.lanzar.assert_called_once()
+        self.assertEqual(self._ejecutar_encolado(), date(2024, 1, 10))
+
+    def test_commits_seguidos_se_agrupan_mientras_sigue_en_cola(self):
+        for fecha in (date(2024, 3, 5), date(2024, 1, 10), date(2024, 2, 1)):
+            with self.captureOnCommitCallbacks(execute=True):
+                self._guardar(fecha)
+        self.lanzar.assert_called_once()
+        self.assertEqual(self._ejecutar_encolado(), date(2024, 1, 10))
+
+        # una vez empezado, el siguiente commit encola otro recálculo
+        with self.captureOnCommitCallbacks(execute=True):
+            self._guardar(date(2024, 4, 1))
+        self.assertEqual(self.lanzar.call_count, 2)
+        self.assertEqual(self._ejecutar_encolado(), date(2024, 4, 1))
+
+    def test_rollback_descarta_las_marcas(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self._guardar(date(2024, 1, 10))
+                raise RuntimeError
+        self.lanzar.assert_not_called()
+
+    def test_solo_hoy_no_recalcula(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._guardar(date.today())
+        self.lanzar.assert_not_called()
+
+
+class _ConTransacciones(TestCase):
+    """Usuario con transacciones; sin recálculos del histórico en segundo plano."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user("ana", "ana@example.com", "x")
+        p = mock.patch.object(recalculo, "lanzar")
+        p.start()
+        self.addCleanup(p.stop)
+
+    def _crear(self, ticker, tipo, cantidad, precio, fecha, comision=0):
+        return Transaccion.objects.create(user=self.user, ticker=ticker, tipo=tipo, cantidad=cantidad,
+                                          precio=precio, comision=comision, fecha=fecha)
+
+    @contextmanager
+    def _como_otro_proceso(self):
+        """Las señales no borran la caché local: solo queda la versión en BD."""
+        with mock.patch.object(posiciones, "invalidar"), mock.patch.object(lotes, "invalidar"):
+            yield
+
+
+class PosicionesTests(_ConTransacciones):
+    def setUp(self):
+        super().setUp()
+        self.compra = self._crear("AAPL", "BUY", 10, 100, date(2024, 1, 2))
+        self._crear("AAPL", "SELL", 4, 120, date(2024, 2, 1))
+
+    def test_cantidad_a_una_fecha(self):
+        libro = posiciones.libro(self.user)
+        self.assertEqual(libro.cantidad("AAPL", date(2024, 1, 1)), 0)
+        self.assertEqual(libro.cantidad("aapl", date(2024, 1, 15)), 10)
+        self.assertEqual(libro.cantidad("AAPL", date(2024, 3, 1)), 6)
+        self.assertEqual(libro.tickers(), ["AAPL"])
+
+    def test_acierto_de_cache_es_una_consulta(self):
+        posiciones.libro(self.user)
+        with self.assertNumQueries(1):  # la versión
+            self.assertEqual(posiciones.libro(self.user).cantidad("AAPL", date(2024, 3, 1)), 6)
+
+    def test_editar_solo_el_ticker(self):
+        posiciones.libro(self.user)
+        with self._como_otro_proceso():
+            self.compra.ticker = "MSFT"
+            self.compra.save()
+        libro = posiciones.libro(self.user)
+        self.assertEqual(libro.cantidad("MSFT", date(2024, 3, 1)), 10)
+        self.assertEqual(libro.cantidad("AAPL", date(2024, 3, 1)), -4)
+
+    def test_editar_solo_el_tipo(self):
+        posiciones.libro(self.user)
+        with self._como_otro_proceso():
+            self.compra.tipo = "SELL"
+            self.compra.save()
+        self.assertEqual(posiciones.libro(self.user).cantidad("AAPL", date(2024, 3, 1)), -14)
+
+    def test_baja_y_borrado_del_usuario(self):
+        posiciones.libro(self.user)
+        with self._como_otro_proceso():
+            self.compra.delete()
+        self.assertEqual(posiciones.libro(self.user).cantidad("AAPL", date(2024, 3, 1)), -4)
+        self.user.delete()  # las bajas en cascada no recrean la versión
+        self.assertFalse(VersionTransacciones.objects.exists())
+
+
+class LotesTests(SimpleTestCase):
+    MOVIMIENTOS = [
+        (1, "aapl", "BUY", "10", "100", "0", date(2024, 1, 2)),
+        (2, "AAPL", "BUY", "10", "120", "0", date(2024, 2, 1)),
+        (3, "AAPL", "SELL", "15", "130", "0", date(2024, 3, 1)),
+    ]
+
+    def test_fifo_consume_primero_los_lotes_antiguos(self):
+        res = lotes.calcular(self.MOVIMIENTOS, "FIFO")
+        pos = res.posicion("AAPL")
+        self.assertEqual(res.por_transaccion[3][0], Decimal("350"))  # 1950 - (1000 + 600)
+        self.assertEqual(pos.cantidad, Decimal("5"))
+        self.assertEqual(pos.coste, Decimal("600"))
+        self.assertEqual([l[1] for l in pos.lotes], [Decimal("5")])
+
+    def test_coste_medio(self):
+        res = lotes.calcular(self.MOVIMIENTOS, "MEDIO")
+        pos = res.posicion("AAPL")
+        self.assertEqual(res.por_transaccion[3][0], Decimal("300"))  # 1950 - 15 * 110
+        self.assertEqual(pos.cantidad, Decimal("5"))
+        self.assertEqual(pos.coste_medio, Decimal("110"))
+
+    def test_comisiones_en_el_coste_y_el_resultado(self):
+        movs = [
+            (1, "MSFT", "BUY", "10", "100", "10", date(2024, 1, 2)),
+            (2, "MSFT", "SELL", "10", "110", "5", date(2024, 1, 3)),
+        ]
+        for metodo in lotes.METODOS:
+            res = lotes.calcular(movs, metodo)
+            self.assertEqual(res.realizado_total, Decimal("85"))  # 1100 - 5 - 1010
+            self.assertEqual(res.posicion("MSFT").coste, Decimal("0"))
+
+    def test_metodo_desconocido(self):
+        with self.assertRaises(ValueError):
+            lotes.calcular(self.MOVIMIENTOS, "LIFO")
+
+
+class LotesDeUsuarioTests(_ConTransacciones):
+    def setUp(self):
+        super().setUp()
+        self.compra = self._crear("AAPL", "BUY", 10, 100, date(2024, 1, 2))
+        self.venta = self._crear("AAPL", "SELL", 4, 120, date(2024, 2, 1))
+
+    def test_editar_solo_el_ticker(self):
+        self.assertEqual(lotes.de_usuario(self.user).realizado_total, Decimal("80"))
+        with self._como_otro_proceso():
+            self.compra.ticker = "MSFT"
+            self.compra.save()
+        res = lotes.de_usuario(self.user)
+        self.assertEqual(res.posicion("MSFT").coste, Decimal("1000"))
+        self.assertEqual(res.realizado_total, Decimal("480"))  # venta de AAPL sin coste
+
+    def test_editar_solo_el_tipo(self):
+        self.assertEqual(lotes.de_usuario(self.user, "FIFO").posicion("AAPL").cantidad, Decimal("6"))
+        with self._como_otro_proceso():
+            self.venta.tipo = "BUY"
+            self.venta.save()
+        res = lotes.de_usuario(self.user, "FIFO")
+        self.assertEqual(res.posicion("AAPL").cantidad, Decimal("14"))
+        self.assertEqual(res.posicion("AAPL").coste, Decimal("1480"))
+        self.assertEqual(res.realizado_total, Decimal("0"))
+
+
+class ExportarCsvTests(_ConTransacciones):
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.client.force_login(self.user)
+        # trozos de 2 filas: el CSV cruza varios lotes del iterador
+        p = mock.patch.object(views, "CSV_CHUNK", 2)
+        p.start()
+        self.addCleanup(p.stop)
+
+    def _consumir(self, respuesta):
+        trozos = [b.decode() for b in respuesta.streaming_content]
+        return trozos, "".join(trozos).splitlines()
+
+    def test_transacciones(self):
+        for i in range(5):
+            self._crear("AAPL", "BUY", Decimal("1.2345"), Decimal("100.5"), date(2024, 1, 2 + i),
+                        comision=Decimal("0.1"))
+        respuesta = self.client.get(reverse("transacciones_export_csv"))
+        self.assertEqual(respuesta["Content-Type"], "text/csv")
+        self.assertIn('filename="transacciones.csv"', respuesta["Content-Disposition"])
+        trozos, lineas = self._consumir(respuesta)
+        self.assertEqual(len(trozos), 6)  # una línea por trozo
+        self.assertEqual(lineas[0], "Fecha,Ticker,Tipo,Cantidad,Precio,Comision,Importe,P/L (aprox),Rentabilidad %")
+        self.assertEqual(len(lineas), 6)
+        for i, linea in enumerate(lineas[1:]):
+            self.assertEqual(linea, f"2024-01-0{2 + i},AAPL,Compra,1.2345,100.5,0.1,124.17,0.0,0.0")
+
+    def test_watchlist(self):
+        lista = WatchlistLista.objects.create(user=self.user, titulo="Tech")
+        for i, ticker in enumerate(("AAPL", "AMZN", "MSFT")):
+            Watchlist.objects.create(user=self.user, lista=lista, nombre=ticker, ticker=ticker,
+                                     precio_actual=Decimal("190.5") + i, valor_objetivo=Decimal("200"))
+        trozos, lineas = self._consumir(self.client.get(reverse("exportar_watchlist_csv", args=[lista.id])))
+        self.assertEqual(lineas[0].split(";")[:4], ["Ticker", "Nombre", "Precio", "Objetivo"])
+        self.assertEqual([l.split(";")[:4] for l in lineas[1:]], [
+            ["AAPL", "AAPL", "190.50", "200.00"],
+            ["AMZN", "AMZN", "191.50", "200.00"],
+            ["MSFT", "MSFT", "192.50", "200.00"],
+        ])
+
+    def test_otro_usuario_no_ve_nada(self):
+        self._crear("AAPL", "BUY", 1, 100, date(2024, 1, 2))
+        otro = get_user_model().objects.create_user("luis", "luis@example.com", "x")
+        self.client.force_login(otro)
+        _, lineas = self._consumir(self.client.get(reverse("transacciones_export_csv")))
+        self.assertEqual(len(lineas), 1)
+
+
+class RiesgoTests(SimpleTestCase):
+    X = np.arange(-50.0, 50.0)  # P/L de -50 a 49
+
+    def test_var_es_historico(self):
+        # cuantil 5 %: posición 0.05·99 = 4.95 → -45.05; cola -50..-46
+        var, es = riesgo.var_es_historico(self.X, 0.95)
+        self.assertAlmostEqual(var, 45.05)
+        self.assertAlmostEqual(es, 48.0)
+        var, es = riesgo.var_es_historico(self.X, 0.99)
+        self.assertAlmostEqual(var, 49.01)
+        self.assertAlmostEqual(es, 50.0)
+
+    def test_var_es_parametrico(self):
+        var, es = riesgo.var_es_parametrico(0.0, 1.0, 0.95)
+        self.assertAlmostEqual(var, 1.644854, places=5)
+        self.assertAlmostEqual(es, 2.062713, places=5)
+        var, _ = riesgo.var_es_parametrico(1.0, 2.0, 0.99)
+        self.assertAlmostEqual(var, 2 * 2.326348 - 1.0, places=5)
+
+    def test_cornish_fisher_sin_asimetria_ni_curtosis_es_la_normal(self):
+        var, es = riesgo.var_es_cornish_fisher(0.0, 1.0, 0.0, 0.0, 0.99)
+        var_n, es_n = riesgo.var_es_parametrico(0.0, 1.0, 0.99)
+        self.assertAlmostEqual(var, var_n)
+        self.assertAlmostEqual(es, es_n, delta=0.02 * es_n)
+        # una cola izquierda más gruesa da más pérdida
+        self.assertGreater(riesgo.var_es_cornish_fisher(0.0, 1.0, -1.0, 3.0, 0.99)[0], var)
+
+    def test_momentos(self):
+        mu, sigma, s, k = riesgo.momentos(np.array([1.0, 2.0, 3.0, 4.0]))
+        self.assertEqual(mu, 2.5)
+        self.assertAlmostEqual(sigma, np.std([1, 2, 3, 4], ddof=1))
+        self.assertAlmostEqual(s, 0.0)
+        self.assertEqual(riesgo.momentos(np.ones(5)), (1.0, 0.0, 0.0, 0.0))
+
+    def _calcular(self, r, cantidades=(10.0,)):
+        precios = np.full((len(r) + 1, len(cantidades)), 100.0)
+        with mock.patch.object(riesgo, "exposiciones", return_value=(["AAPL"], np.array(cantidades))), \
+                mock.patch.object(riesgo, "matriz_rendimientos", return_value=(None, precios, r)):
+            return riesgo.calcular(None, date(2024, 6, 3))
+
+    def test_poco_historico(self):
+        r = np.zeros((100, 1))
+        r[:riesgo.MIN_OBSERVACIONES - 1, 0] = 0.01  # el resto son días sin movimiento
+        self.assertIsNone(self._calcular(r))
+        with mock.patch.object(riesgo, "exposiciones", return_value=([], np.array([]))):
+            self.assertIsNone(riesgo.calcular(None, date(2024, 6, 3)))
+
+    def test_informe_sobre_el_pyg_de_la_cartera(self):
+        r = (self.X / 1000.0)[:, None]  # P/L = r · 10 · 100 = X
+        res = self._calcular(r)
+        self.assertEqual(res["observaciones"], 99)  # el día con rendimiento 0 se descarta
+        self.assertEqual(res["valor_cartera"], 1000.0)
+        hist = res["metodos"]["historico"]["95"]
+        var, es = riesgo.var_es_historico(self.X[self.X != 0], 0.95)
+        self.assertEqual(hist["var_abs"], round(var, 2))
+        self.assertEqual(hist["es_abs"], round(es, 2))
+        self.assertEqual(hist["var_pct"], round(var / 10, 2))
+        self.assertEqual(sum(res["histograma"]["counts"]), 99)
+
+
+class MonteCarloTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(4)
+        self.r = rng.normal(0.0005, 0.012, (120, 2))
+        precios = np.full((121, 2), 50.0)
+        for p in (
+            mock.patch.object(riesgo, "exposiciones", return_value=(["AAPL", "MSFT"], np.array([10.0, 4.0]))),
+            mock.patch.object(riesgo, "matriz_rendimientos", return_value=(None, precios, self.r)),
+        ):
+            p.start()
+            self.addCleanup(p.stop)
+
+    def _calcular(self, pool, bloques, **kwargs):
+        params = montecarlo.parametros(horizonte=10, trayectorias_=2500, **kwargs)
+        with override_settings(MONTECARLO_BLOQUES=bloques), \
+                mock.patch.object(montecarlo, "_executor", return_value=pool):
+            return montecarlo.calcular(None, params)
+
+    def test_mismo_resultado_con_cualquier_numero_de_bloques_y_procesos(self):
+        with ThreadPoolExecutor(max_workers=4) as hilos:
+            base = self._calcular(hilos, 1)
+            for bloques in (2, 3, 16):
+                self.assertEqual(self._calcular(hilos, bloques), base)
+            self.assertNotEqual(self._calcular(hilos, 3, semilla=7)["percentiles"], base["percentiles"])
+            self.assertEqual(self._calcular(hilos, 3, metodo="bootstrap"), self._calcular(hilos, 5, metodo="bootstrap"))
+        with ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context("spawn")) as procesos:
+            self.assertEqual(self._calcular(procesos, 3), base)
+
+    def test_resumen(self):
+        with ThreadPoolExecutor(max_workers=2) as hilos:
+            res = self._calcular(hilos, 4)
+        self.assertEqual(res["valor_inicial"], 700.0)
+        self.assertEqual(res["pasos"], list(range(11)))
+        self.assertEqual(res["percentiles"]["p50"][0], 700.0)
+        p5, p95 = res["percentiles"]["p5"][-1], res["percentiles"]["p95"][-1]
+        self.assertLess(p5, res["percentiles"]["p50"][-1])
+        self.assertLess(res["percentiles"]["p50"][-1], p95)
+        self.assertGreater(res["es_95"], res["var_95"])
+
+    def test_parametros_web_acotados(self):
+        params = montecarlo.parametros(horizonte=10_000, trayectorias_=10**9, semilla=1, web=True)
+        self.assertEqual(params["horizonte"], 252)
+        self.assertEqual(params["trayectorias"], 200_000)
+        self.assertEqual(params["semilla"], 12345)
+
+
+class MonteCarloCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        p = mock.patch("alpha_quantum.signals.obtener_eventos_financieros_alpha_vantage")
+        p.start()
+        self.addCleanup(p.stop)
+        self.user = get_user_model().objects.create_user("ana", "ana@example.com", "x")
+        cartera = Cartera.objects.create(usuario=self.user, nombre="Cartera Principal")
+        self.accion = Accion.objects.create(user=self.user, cartera=cartera, nombre="Apple", ticker="AAPL",
+                                            cantidad=10, precio_compra=100.0, fecha=date(2024, 1, 2))
+        self.params = montecarlo.parametros()
+
+    def test_comprar_o_vender_invalida_el_resultado(self):
+        with mock.patch.object(montecarlo, "calcular", return_value={"var_95": 1.0}):
+            montecarlo.simular(self.user, self.params)
+        self.assertEqual(montecarlo.resultado(self.user, self.params), {"var_95": 1.0})
+        cache.clear()  # también desde la BD, como otro proceso
+        self.assertEqual(montecarlo.resultado(self.user, self.params), {"var_95": 1.0})
+
+        self.accion.cantidad = 15
+        self.accion.save()
+        self.assertIsNone(montecarlo.resultado(self.user, self.params))
+        with mock.patch("alpha_quantum.services.segundo_plano.lanzar") as lanzar:
+            self.assertIsNone(montecarlo.solicitar(self.user, self.params))
+        lanzar.assert_called_once()
+
+
+class BenchmarkMetricasTests(SimpleTestCase):
+    def test_valores_a_mano(self):
+        rb = np.array([0.01, -0.01, 0.02, -0.02])
+        rp = np.array([0.02, 0.00, 0.01, -0.01])
+        m = benchmark.metricas(rp, rb)
+        # cov(rp, rb) = 0.0006/3, var(rb) = 0.0010/3 → beta 0.6
+        self.assertAlmostEqual(m["beta"], 0.6)
+        # (media rp - 0.6 · media rb) · 252 = 0.005 · 252
+        self.assertAlmostEqual(m["alpha_pct"], 126.0)
+        # activo = [.01, .01, -.01, .01]: desviación 0.01 → 0.01 · √252
+        self.assertAlmostEqual(m["tracking_error_pct"], 15.8745, places=4)
+        self.assertAlmostEqual(m["information_ratio"], 7.9373, places=4)
+        self.assertEqual(m["observaciones"], 4)
+
+    def test_cartera_apalancada_del_indice(self):
+        rb = np.array([0.01, -0.02, 0.03, 0.0])
+        m = benchmark.metricas(2 * rb + 0.001, rb)
+        self.assertAlmostEqual(m["beta"], 2.0)
+        self.assertAlmostEqual(m["alpha_pct"], 25.2)
+        self.assertAlmostEqual(m["correlacion"], 1.0)
+
+    def test_sin_observaciones_suficientes(self):
+        self.assertEqual(benchmark.metricas(np.array([0.01]), np.array([0.02])), {"observaciones": 1})
+
+
+class BenchmarkApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user("ana", "ana@example.com", "x")
+        self.client = Client()
+        self.client.force_login(self.user)
+        for i, valor in enumerate((1000, 1010, 1000, 1030)):
+            HistoricoCartera.objects.create(user=self.user, fecha=date(2024, 6, 3 + i), valor=valor, invertido=1000)
+        cierres = np.array([[100.0], [np.nan], [102.0], [101.0]])
+        for p in (
+            mock.patch.object(benchmark, "solicitar_refresco"),
+            mock.patch.object(benchmark, "matriz_precios", return_value=cierres),
+            mock.patch.object(benchmark, "flujos", side_effect=lambda user, fechas: np.zeros(len(fechas))),
+        ):
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_codigo_desconocido(self):
+        respuesta = self.client.get(reverse("api_benchmark", args=["xyz"]))
+        self.assertEqual(respuesta.status_code, 404)
+        self.assertIn("xyz", respuesta.json()["error"])
+
+    def test_fechas_no_validas(self):
+        respuesta = self.client.get(reverse("api_benchmark", args=["spx"]), {"from": "ayer"})
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_alineado_al_historico(self):
+        datos = self.client.get(reverse("api_benchmark", args=["SPX"]), {"to": "2024-06-06"}).json()
+        self.assertEqual(datos["codigo"], "spx")
+        self.assertEqual(datos["simbolo"], "SPY")
+        self.assertEqual(datos["labels"], ["2024-06-03", "2024-06-04", "2024-06-05", "2024-06-06"])
+        self.assertEqual(datos["values"], [0.0, 0.0, 2.0, 1.0])  # el hueco se arrastra
+        self.assertEqual(datos["cartera"], [0.0, 1.0, 0.0, 3.0])
+        self.assertEqual(datos["metricas"]["observaciones"], 3)
+
+
+def _ema(x, n, alpha=None):
+    """EMA con semilla SMA de los primeros `n`, en forma cerrada (sin recursión)."""
+    a = 2.0 / (n + 1) if alpha is None else alpha
+    res = np.full(len(x), np.nan)
+    if len(x) < n:
+        return res
+    y = x[n:]
+    i = np.arange(len(y))
+    pesos = np.tril(a * (1 - a) ** np.subtract.outer(i, i).clip(min=0))
+    res[n - 1] = x[:n].mean()
+    res[n:] = (1 - a) ** (i + 1) * res[n - 1] + pesos @ y
+    return res
+
+
+class IndicadoresTests(SimpleTestCase):
+    """La actualización barra a barra coincide con el cálculo vectorizado de la serie entera."""
+    N0 = 60  # barras de la carga inicial; el resto entra por actualizar()
+
+    def setUp(self):
+        rng = np.random.default_rng(11)
+        self.c = 100 * np.exp(np.cumsum(rng.normal(0, 0.015, 150)))
+        self.h = self.c * (1 + rng.uniform(0, 0.02, 150))
+        self.l = self.c * (1 - rng.uniform(0, 0.02, 150))
+
+    def _incremental(self, indicador):
+        n = self.N0
+        cols = indicador.calcular(self.c[:n], self.h[:n], self.l[:n])
+        filas = [indicador.actualizar(*b) for b in zip(self.c[n:].tolist(), self.h[n:].tolist(), self.l[n:].tolist())]
+        return {s: np.concatenate([cols[s], [f[j] for f in filas]]) for j, s in enumerate(indicador.salidas)}
+
+    def _comparar(self, obtenido, esperado):
+        np.testing.assert_allclose(obtenido, esperado, rtol=1e-9, atol=1e-9, equal_nan=True)
+        self.assertFalse(np.isnan(obtenido[-1]))
+
+    def test_sma(self):
+        esperado = np.full(150, np.nan)
+        esperado[19:] = np.convolve(self.c, np.ones(20) / 20, mode="valid")
+        self._comparar(self._incremental(indicadores.SMA(20))["valor"], esperado)
+
+    def test_ema(self):
+        self._comparar(self._incremental(indicadores.EMA(10))["valor"], _ema(self.c, 10))
+
+    def test_rsi(self):
+        cambio = np.diff(self.c)
+        sube = _ema(np.maximum(cambio, 0), 14, 1 / 14)
+        baja = _ema(np.maximum(-cambio, 0), 14, 1 / 14)
+        esperado = np.concatenate([[np.nan], 100 - 100 / (1 + sube / baja)])
+        self._comparar(self._incremental(indicadores.RSI(14))["valor"], esperado)
+
+    def test_macd(self):
+        macd = _ema(self.c, 12) - _ema(self.c, 26)
+        senal = np.full(150, np.nan)
+        senal[25:] = _ema(macd[25:], 9)
+        res = self._incremental(indicadores.MACD())
+        self._comparar(res["macd"], macd)
+        self._comparar(res["senal"], senal)
+        self._comparar(res["histograma"], macd - senal)
+
+    def test_bollinger(self):
+        ventanas = np.lib.stride_tricks.sliding_window_view(self.c, 20)
+        media = np.concatenate([np.full(19, np.nan), ventanas.mean(axis=1)])
+        sd = np.concatenate([np.full(19, np.nan), ventanas.std(axis=1)])
+        res = self._incremental(indicadores.Bollinger(20, 2.5))
+        # la varianza acumulada (suma de cuadrados) pierde algo de precisión
+        np.testing.assert_allclose(res["media"], media, rtol=1e-9, equal_nan=True)
+        np.testing.assert_allclose(res["superior"], media + 2.5 * sd, rtol=1e-7, equal_nan=True)
+        np.testing.assert_allclose(res["inferior"], media - 2.5 * sd, rtol=1e-7, equal_nan=True)
+
+    def test_atr(self):
+        anterior = np.concatenate([[np.nan], self.c[:-1]])
+        rango = np.fmax.reduce([self.h - self.l, np.abs(self.h - anterior), np.abs(self.l - anterior)])
+        self._comparar(self._incremental(indicadores.ATR(14))["valor"], _ema(rango, 14, 1 / 14))
+
+    def test_parametros(self):
+        self.assertEqual(indicadores.parametros("Bollinger", {"periodo": "10"}), {"periodo": 10, "desviaciones": 2.0})
+        for nombre, valores in (("sma", {"periodo": "0"}), ("sma", {"periodo": "501"}),
+                                ("bollinger", {"desviaciones": "nan"}), ("bollinger", {"desviaciones": "inf"}),
+                                ("bollinger", {"desviaciones": "-1"}), ("vwap", {})):
+            with self.subTest(nombre=nombre, valores=valores), self.assertRaises(ValueError):
+                indicadores.parametros(nombre, valores)
+
+
+class SerieIndicadorTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.instrumento = Instrumento.objects.create(ticker="AAPL")
+        self.cierres = [100.0 + (i % 7) - (i % 3) for i in range(40)]
+        self.fechas = [date(2024, 1, 1) + timedelta(days=i) for i in range(40)]
+
+    def _guardar(self, desde, hasta):
+        for f, c in zip(self.fechas[desde:hasta], self.cierres[desde:hasta]):
+            BarraDiaria.objects.create(instrumento=self.instrumento, fecha=f, cierre=Decimal(str(c)))
+
+    def test_incremental_igual_que_recalculada(self):
+        self._guardar(0, 30)
+        indicadores.serie("aapl", "sma", {"periodo": 5})
+        self._guardar(30, 40)
+        s = indicadores.serie("AAPL", "sma", {"periodo": 5})
+        self.assertEqual(s.fechas, self.fechas)
+        cache.clear()
+        np.testing.assert_allclose(s.valores["valor"], indicadores.serie("AAPL", "sma", {"periodo": 5}).valores["valor"],
+                                   rtol=1e-12, equal_nan=True)
+
+    def test_reescribir_la_ultima_barra_recalcula(self):
+        self._guardar(0, 30)
+        indicadores.serie("AAPL", "sma", {"periodo": 5})
+        BarraDiaria.objects.filter(fecha=self.fechas[29]).update(cierre=Decimal("200"))
+        s = indicadores.serie("AAPL", "sma", {"periodo": 5})
+        self.assertAlmostEqual(s.valores["valor"][-1], (sum(self.cierres[25:29]) + 200) / 5)
+
+
+def _simular_bucle(p, eventos, pesos, capital, comision, comision_pct):
+    """Referencia día a día de backtest.simular (participaciones y efectivo)."""
+    efectivo, acciones = capital, np.zeros(p.shape[1])
+    equity = np.zeros(len(p))
+    for t in range(len(p)):
+        valor = efectivo + acciones @ p[t]
+        if eventos[t]:
+            antes = acciones * p[t] / valor if valor > 0 else np.zeros_like(acciones)
+            deltas = pesos[t] - antes
+            deltas[np.abs(deltas) < backtest._UMBRAL] = 0.0
+            valor = valor * (1.0 - comision_pct * np.abs(deltas).sum()) - comision * (deltas != 0).sum()
+            acciones = pesos[t] * valor / p[t]
+            efectivo = valor * (1.0 - pesos[t].sum())
+        equity[t] = max(valor, 0.0)
+    return equity
+
+
+class BacktestTests(SimpleTestCase):
+    def test_simular_coincide_con_el_bucle(self):
+        rng = np.random.default_rng(7)
+        t, k = 300, 4
+        p = 100 * np.cumprod(1 + rng.normal(0.0003, 0.015, (t, k)), axis=0)
+        eventos = rng.random(t) < 0.08
+        eventos[0] = True
+        pesos = rng.dirichlet(np.ones(k + 1), t)[:, :k]  # el resto, en efectivo
+        for comision, comision_pct in ((0.0, 0.0), (2.0, 0.0), (0.0, 0.001), (1.5, 0.0005)):
+            equity, _, _ = backtest.simular(p, eventos, pesos, 10000.0, comision, comision_pct)
+            np.testing.assert_allclose(
+                equity, _simular_bucle(p, eventos, pesos, 10000.0, comision, comision_pct), rtol=1e-10,
+            )
+
+    def test_sin_eventos_no_se_invierte(self):
+        p = np.linspace(10, 20, 50)[:, None]
+        equity, _, _ = backtest.simular(p, np.zeros(50, dtype=bool), np.zeros((50, 1)), 1000.0, 0.0, 0.0)
+        np.testing.assert_allclose(equity, 1000.0)
+
+
+class OptimizacionTests(SimpleTestCase):
+    def test_particiones(self):
+        # el día 0 solo es base; la prueba avanza de 2 en 2 y no se sale de los 10 días
+        self.assertEqual(optimizacion.particiones(10, 4, 2), [(1, 5, 5, 7), (3, 7, 7, 9)])
+        self.assertEqual(optimizacion.particiones(11, 4, 2)[-1], (5, 9, 9, 11))
+        self.assertEqual(optimizacion.particiones(6, 4, 2), [])
+
+    def _metricas(self):
+        # (unidades, combinaciones, particiones, métricas); la combinación 2 no tiene datos
+        m = np.full((2, 3, 2, 4), np.nan, dtype=np.float32)
+        m[:, :2] = 0.0
+        m[0, 0, :, optimizacion.SHARPE_ENT] = [1.0, 1.0]
+        m[0, 1, :, optimizacion.SHARPE_ENT] = [2.0, 0.0]
+        m[1, 1, :, optimizacion.SHARPE_ENT] = [0.0, 3.0]
+        m[0, 1, 0, optimizacion.RENT_PRU], m[0, 1, 0, optimizacion.SHARPE_PRU] = 0.10, 1.0
+        m[0, 0, 1, optimizacion.RENT_PRU], m[0, 0, 1, optimizacion.SHARPE_PRU] = -0.05, 2.0
+        m[1, 0, 0, optimizacion.RENT_PRU], m[1, 0, 0, optimizacion.SHARPE_PRU] = 0.20, 0.5
+        m[1, 1, 1, optimizacion.SHARPE_PRU] = np.nan
+        return m
+
+    def test_clasificar(self):
+        combos = [{"n": 1}, {"n": 2}, {"n": 3}]
+        dias = [date(2024, 1, 1) + timedelta(days=i) for i in range(10)]
+        splits = optimizacion.particiones(10, 4, 2)
+        res = optimizacion._clasificar(combos, ["AAPL", "MSFT"], self._metricas(), splits, dias)
+
+        # Sharpe medio de entrenamiento: n=2 → 1.25, n=1 → 0.5, n=3 sin datos al final
+        self.assertEqual([r["parametros"] for r in res["ranking"]], [{"n": 2}, {"n": 1}, {"n": 3}])
+        self.assertEqual(res["ranking"][0]["sharpe_entrenamiento"], 1.25)
+        self.assertIsNone(res["ranking"][2]["sharpe_entrenamiento"])
+        self.assertEqual(res["particiones"][0], {"entrenamiento": ["2024-01-02", "2024-01-05"],
+                                                 "prueba": ["2024-01-06", "2024-01-07"]})
+
+        aapl, msft = res["walk_forward"]
+        self.assertEqual(aapl["parametros"], [{"n": 2}, {"n": 1}])
+        self.assertEqual(aapl["rentabilidad_pct"], 4.5)  # 1.10 · 0.95
+        self.assertEqual(aapl["sharpe_prueba"], 1.5)
+        self.assertEqual(msft["parametros"], [{"n": 1}, {"n": 2}])  # empate: la primera
+        self.assertEqual(msft["rentabilidad_pct"], 20.0)
+        self.assertEqual(msft["sharpe_prueba"], 0.5)  # la partición sin Sharpe no cuenta
+        self.assertEqual(res["rentabilidad_fuera_muestra_pct"], 12.25)
+
+        with self.settings(OPTIMIZACION_RANKING=1):
+            res = optimizacion._clasificar(combos, ["AAPL", "MSFT"], self._metricas(), splits, dias)
+        self.assertEqual([r["parametros"] for r in res["ranking"]], [{"n": 2}])
+
+
+class AnaliticaTests(TestCase):
+    def test_estadisticas(self):
+        e = analitica.estadisticas(np.array([0.1, -0.2, 0.05, 0.1]))
+        self.assertEqual(e["rentabilidad_pct"], 1.64)  # 1.1 · 0.8 · 1.05 · 1.1
+        self.assertEqual(e["max_drawdown_pct"], -20.0)  # de 1.1 a 0.88
+        # media 0.0125, desviación √(0.061875 / 3) → 0.0125 / 0.14361 · √252
+        self.assertEqual(e["sharpe"], 1.38)
+        # semidesviación √(0.04 / 4) = 0.1 → 0.0125 / 0.1 · √252
+        self.assertEqual(e["sortino"], 1.98)
+        self.assertEqual(e["calmar"], round(e["cagr_pct"] / 20, 2))
+        self.assertEqual(e["acierto_pct"], 75.0)
+        self.assertEqual(analitica.estadisticas(np.array([0.01])), {"observaciones": 1})
+
+    def test_rendimientos_descuentan_flujos(self):
+        r = analitica.rendimientos(np.array([100.0, 150.0, 140.0, 0.0, 10.0]),
+                                   np.array([0.0, 50.0, 0.0, 0.0, 0.0]))
+        np.testing.assert_allclose(r[:3], [0.0, -1 / 15, -1.0])
+        self.assertTrue(np.isnan(r[3]))  # el día anterior vale 0
+
+    @override_settings(ANALITICA_VENTANA_VOL=3)
+    def test_drawdown_y_volatilidad_movil(self):
+        user = get_user_model().objects.create_user("ana", "ana@example.com", "x")
+        for i, valor in enumerate(("100", "110", "99", "108.9", "119.79")):
+            HistoricoCartera.objects.create(user=user, fecha=date(2024, 6, 3 + i), valor=Decimal(valor),
+                                            invertido=100)
+        with mock.patch.object(analitica, "operaciones", return_value=[]):
+            res = analitica.calcular(user)
+        np.testing.assert_allclose(res["rendimientos_pct"][1:], [10.0, -10.0, 10.0, 10.0])
+        np.testing.assert_allclose(res["underwater_pct"], [0.0, 0.0, -10.0, -1.0, 0.0], atol=1e-4)
+        # ventanas [.1, -.1, .1] y [-.1, .1, .1]: desviación 0.11547 · √252
+        self.assertEqual(res["volatilidad_movil_pct"][:3], [None, None, None])
+        np.testing.assert_allclose(res["volatilidad_movil_pct"][3:], [183.303, 183.303], atol=1e-3)
+        self.assertEqual(res["estadisticas"]["max_drawdown_pct"], -10.0)
+
+
+class CovarianzaTests(SimpleTestCase):
+    def test_ledoit_wolf_es_combinacion_con_la_identidad_escalada(self):
+        rng = np.random.default_rng(1)
+        a = rng.normal(size=(5, 5))
+        r = rng.multivariate_normal(np.zeros(5), a @ a.T, size=200)
+        cov, intensidad = covarianza.ledoit_wolf(r)
+        muestral = np.cov(r, rowvar=False, bias=True)
+        mu = np.trace(muestral) / 5
+        self.assertTrue(0.0 <= intensidad <= 1.0)
+        np.testing.assert_allclose(cov, (1 - intensidad) * muestral + intensidad * mu * np.eye(5))
+        self.assertGreater(np.linalg.eigvalsh(cov).min(), 0)
+
+    def test_contraccion_segun_la_estructura(self):
+        rng = np.random.default_rng(2)
+        _, iid = covarianza.ledoit_wolf(rng.normal(size=(60, 10)))
+        a = rng.normal(size=(10, 10))
+        _, estructurada = covarianza.ledoit_wolf(rng.multivariate_normal(np.zeros(10), a @ a.T, size=2000))
+        self.assertGreater(iid, 0.5)
+        self.assertLess(estructurada, 0.1)
+
+    def test_correlacion(self):
+        c = covarianza.correlacion(np.array([[4.0, 2.0, 0.0], [2.0, 9.0, 0.0], [0.0, 0.0, 0.0]]))
+        np.testing.assert_allclose(np.diag(c), 1.0)
+        self.assertAlmostEqual(c[0, 1], 2.0 / 6.0)
+        self.assertEqual(c[0, 2], 0.0)
+
+    def test_tickers_sin_datos_se_marcan_antes_de_contraer(self):
+        rng = np.random.default_rng(3)
+        r = np.zeros((100, 4))
+        r[:, :2] = rng.normal(0, 0.01, (100, 2))
+        with mock.patch.object(covarianza, "matriz_rendimientos", return_value=(None, None, r)):
+            res = covarianza.calcular(["A", "B", "C", "D"], 100, date(2024, 6, 3))
+        self.assertEqual(res["con_datos"], [True, True, False, False])
+        self.assertTrue((np.diag(res["cov"]) > 0).all())  # por eso no basta con la diagonal
+
+    def test_limites_de_la_peticion(self):
+        with self.assertRaises(ValueError):
+            covarianza.obtener(["A", "B"], ventana=covarianza.MAX_VENTANA + 1)
+        with self.assertRaises(ValueError):
+            covarianza.obtener([f"T{i}" for i in range(covarianza.MAX_TICKERS + 1)])
+
+    def test_estado_ewma_caduca(self):
+        estado = {"fecha": date(2024, 6, 3), "cov": np.eye(2), "contraccion": 0.0, "observaciones": 10,
+                  "cuenta": np.array([10, 10]), "media": np.zeros(2)}
+        with mock.patch.object(covarianza, "_iniciar_ewma", return_value=estado), \
+                mock.patch.object(covarianza, "_resultado"), \
+                mock.patch.object(covarianza.cache, "get", return_value=None), \
+                mock.patch.object(covarianza.cache, "set") as guardar:
+            covarianza.ewma(["A", "B"], date(2024, 6, 3))
+        self.assertEqual(guardar.call_args.kwargs["timeout"], covarianza.TTL)
+
+
+class AsignacionTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        rng = np.random.default_rng(3)
+        a = rng.normal(size=(6, 6))
+        self.cov = (a @ a.T / 6 + np.eye(6)) * 0.04
+        self.w0 = np.full(6, 1 / 6)
+
+    def test_proyectar(self):
+        w = asignacion.proyectar(np.array([0.9, 0.5, 0.1]), 0.4)
+        np.testing.assert_allclose(w, [0.4, 0.4, 0.2])
+        w = asignacion.proyectar(np.array([3.0, -1.0, 0.2, 0.1]))
+        self.assertAlmostEqual(w.sum(), 1.0)
+        self.assertTrue((w >= 0).all())
+
+    def test_min_varianza_coincide_con_la_forma_cerrada(self):
+        w, _ = asignacion.min_varianza(self.cov, self.w0, 1.0, 5000, 1e-10)
+        inv = np.linalg.solve(self.cov, np.ones(6))
+        self.assertTrue((inv > 0).all())  # solución interior: sin restricciones activas
+        np.testing.assert_allclose(w, inv / inv.sum(), atol=1e-6)
+
+    def test_paridad_riesgo_iguala_contribuciones(self):
+        w, _ = asignacion.paridad_riesgo(self.cov, self.w0.copy(), 5000, 1e-12)
+        contrib = w * (self.cov @ w)
+        np.testing.assert_allclose(contrib / contrib.sum(), 1 / 6, atol=1e-8)
+
+    def test_max_sharpe_coincide_con_la_tangente(self):
+        media = self.cov @ np.array([1.0, 2.0, 1.5, 0.5, 1.0, 2.5])  # tangente con pesos positivos
+        w, _ = asignacion.max_sharpe(self.cov, media, 0.0, self.w0, 1.0, 5000, 1e-12)
+        t = np.linalg.solve(self.cov, media)
+        np.testing.assert_allclose(w, t / t.sum(), atol=1e-5)
+
+    def test_arranque_en_caliente_converge_a_lo_mismo(self):
+        frio, _ = asignacion.min_varianza(self.cov, self.w0, 1.0, 5000, 1e-10)
+        cov2 = self.cov * 1.01
+        caliente, _ = asignacion.min_varianza(cov2, frio, 1.0, 5000, 1e-10)
+        directa, _ = asignacion.min_varianza(cov2, self.w0, 1.0, 5000, 1e-10)
+        np.testing.assert_allclose(caliente, directa, atol=1e-6)
+
+    def test_operaciones_enteras_sin_pasar_del_efectivo(self):
+        cantidades = np.array([10.0, 5.0, 0.0])
+        precios = np.array([100.0, 50.0, 20.0])
+        ordenes, caja = asignacion.operaciones(cantidades, precios, np.array([0.3, 0.3, 0.4]), 500.0)
+        np.testing.assert_array_equal(ordenes, [-4, 5, 32])
+        self.assertAlmostEqual(caja, 10.0)
+        # sin efectivo ni ventas, no se compra nada
+        ordenes, caja = asignacion.operaciones(np.array([0.0, 0.0]), np.array([10.0, 20.0]),
+                                               np.array([0.5, 0.5]), 0.0)
+        np.testing.assert_array_equal(ordenes, [0, 0])
+        self.assertEqual(caja, 0.0)
+
+    def test_operaciones_aleatorias_respetan_caja_y_posiciones(self):
+        rng = np.random.default_rng(11)
+        for _ in range(200):
+            n = rng.integers(2, 8)
+            cantidades = rng.integers(0, 50, n).astype(float)
+            precios = rng.uniform(1, 500, n)
+            objetivo = rng.dirichlet(np.ones(n))
+            efectivo = float(rng.uniform(0, 5000))
+            ordenes, caja = asignacion.operaciones(cantidades, precios, objetivo, efectivo)
+            self.assertTrue(np.array_equal(ordenes, np.round(ordenes)))
+            self.assertGreaterEqual(caja, -1e-9)
+            self.assertTrue((cantidades + ordenes >= 0).all())
+            self.assertAlmostEqual(caja, efectivo - ordenes @ precios, places=6)
+
+    def test_pesos_excluye_tickers_sin_datos(self):
+        rng = np.random.default_rng(5)
+        r = np.zeros((200, 5))
+        r[:, :3] = rng.normal(0.0005, 0.01, (200, 3))
+        cov, intensidad = covarianza.ledoit_wolf(r)
+        res_cov = {
+            "tickers": ["A", "B", "C", "X", "Y"], "con_datos": [True, True, True, False, False],
+            "fecha": "2024-06-03", "metodo": "ledoit_wolf", "media": r.mean(axis=0), "cov": cov,
+        }
+        with mock.patch.object(covarianza, "obtener", return_value=res_cov):
+            res = asignacion.pesos(res_cov["tickers"], asignacion.parametros("paridad_riesgo"))
+        self.assertIsNone(res["pesos"]["X"])
+        self.assertIsNone(res["pesos"]["Y"])
+        self.assertAlmostEqual(sum(res["pesos"][t]["peso"] for t in "ABC"), 1.0)
+
+    def test_arranque_guardado_caduca(self):
+        res_cov = {"tickers": ["A", "B"], "con_datos": [True, True], "fecha": "2024-06-03", "metodo": "ledoit_wolf",
+                   "media": np.zeros(2), "cov": self.cov[:2, :2]}
+        with mock.patch.object(covarianza, "obtener", return_value=res_cov), \
+                mock.patch.object(asignacion.cache, "set") as guardar:
+            asignacion.pesos(res_cov["tickers"], asignacion.parametros("min_varianza"))
+        self.assertEqual(guardar.call_args.kwargs["timeout"], asignacion.TTL)
+
+    def test_parametros_no_validos(self):
+        for kwargs in ({"metodo": "x"}, {"vol_objetivo": "nan"}, {"maximo": "0"}, {"estimador": "x"}):
+            with self.assertRaises(ValueError):
+                asignacion.parametros(**kwargs)
+
+
+class CarteraVistaTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(get_user_model().objects.create_user("ana", "ana@example.com", "x"))
+        p = mock.patch.object(asignacion, "rebalanceo", return_value=None)
+        self.rebalanceo = p.start()
+        self.addCleanup(p.stop)
+
+    def test_efectivo_no_valido_no_cambia_el_metodo(self):
+        respuesta = self.client.get(reverse("cartera"), {"metodo": "min_varianza", "efectivo": "mil"})
+        self.assertEqual(respuesta.context["metodo_asignacion"], "min_varianza")
+        self.assertEqual(respuesta.context["efectivo"], 0.0)
+
+    def test_metodo_no_valido_no_cambia_el_efectivo(self):
+        respuesta = self.client.get(reverse("cartera"), {"metodo": "x", "efectivo": "250"})
+        self.assertEqual(respuesta.context["metodo_asignacion"], asignacion.parametros()["metodo"])
+        self.assertEqual(respuesta.context["efectivo"], 250.0)
@@ -25,6 +25,7 @@ urlpatterns = [
     path('api/dividendos/', dividendos_api, name='api_dividendos'),
     path("api/rentabilidad/", views.RentabilidadAPI, name="rentabilidad_api"),
     path("api/sparkline/", views.SparklineAPI.as_view(), name="api_sparkline"),
+    path("api/benchmark/<str:codigo>", views.benchmark_api, name="api_benchmark"),
 
     # Auth
     path('login/', views.user_login, name='login'),
@@ -62,16 +63,24 @@ urlpatterns = [
     # Noticias / Fundamental / Calendario
        # Módulos adicionales: Indicadores, Bots, Macroeconomía y Foro
     path('alpha-indicators/', views.alpha_indicators, name='alpha_indicators'),
+    path('api/indicadores/', views.indicadores_api, name='indicadores_api'),
     path('alpha-bots/', views.alpha_bots, name='alpha_bots'),
+    path('api/backtest/', views.backtest_api, name='backtest_api'),
     path('macroeconomia/', views.macroeconomia, name='macroeconomia'),
     path('foro/', views.foro, name='foro'),
 
     # Risk Lab
     path('alpha-risk/', views.alpha_risk_lab, name='alpha_risk_lab'),
+    path('api/riesgo/', views.riesgo_api, name='riesgo_api'),
+    path('api/analitica/', views.analitica_api, name='analitica_api'),
+    path('api/covarianza/', views.covarianza_api, name='covarianza_api'),
+    path('api/asignacion/', views.asignacion_api, name='asignacion_api'),
+    path('api/montecarlo/', views.montecarlo_api, name='montecarlo_api'),
  path('noticias/', views.noticias, name='noticias'),
     path('fundamental/', views.analisis_fundamental, name='fundamental'),
     path('calendario/', views.calendario, name='calendario'),
     path('api/eventos/', views.eventos_api, name='eventos_api'),
+    path('api/proveedores/estado/', views.estado_proveedores_api, name='estado_proveedores_api'),
 
     # Cashflow
     path('flujo-de-caja/', cashflow_dashboard, name='flujo_de_caja'),
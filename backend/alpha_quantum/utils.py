@@ -2,72 +2,183 @@ import datetime
 from datetime import date, timedelta
 from decimal import Decimal, InvalidOperation
 
-import requests
 from django.conf import settings
+from django.core.cache import cache
 from django.db import transaction
-from django.db.models import Sum
+from django.db.models import Max, Sum
 
-from .models import Accion, PrecioHistorico
+from .models import Accion, BarraDiaria, Instrumento
 from .models.historico import HistoricoCartera
 from .models.dividendo import Dividendo
 from .models.calendario import EventoFinanciero
 from .models.transaccion import Transaccion
-
-# === Claves de API (desde settings.py) ===
-TWELVE_DATA_API_KEY = getattr(settings, "TWELVE_DATA_API_KEY", None)
-FINNHUB_API_KEY = getattr(settings, "FINNHUB_API_KEY", None)
-ALPHA_VANTAGE_API_KEY = getattr(settings, "ALPHA_VANTAGE_API_KEY", None)
+from .services import almacen_cierres, cache_cotizaciones, fundamentales, limitador, posiciones, valoracion
+from .services.proveedores import alphavantage, finnhub, twelvedata
 
 
 # =============================================================================
 # Precios e históricos (Twelve Data)
 # =============================================================================
 def obtener_precio_actual(ticker: str) -> float:
-    """Devuelve el precio actual del ticker desde Twelve Data."""
-    if not TWELVE_DATA_API_KEY:
+    """
+    Devuelve el precio actual del ticker.
+    Pasa por la caché compartida de cotizaciones; solo va a Twelve Data si no
+    hay un precio válido cacheado.
+    """
+    return cache_cotizaciones.obtener(ticker, _descargar_precio_actual)
+
+
+def _descargar_precio_actual(ticker: str) -> float:
+    """Precio actual del ticker directamente desde Twelve Data (sin caché)."""
+    if not twelvedata.configurado:
         print("API Key de Twelve Data no configurada.")
         return 0.0
 
-    url = f"https://api.twelvedata.com/price?symbol={ticker}&apikey={TWELVE_DATA_API_KEY}"
     try:
-        r = requests.get(url, timeout=10)
-        r.raise_for_status()
-        data = r.json()
+        data = twelvedata.get_json("price", {"symbol": ticker})
         return float(data.get("price", 0.0))
     except Exception as e:
         print(f"Error al obtener precio actual para {ticker}: {e}")
         return 0.0
 
 
-def actualizar_historico(accion: Accion, dias: int = 365) -> None:
+def obtener_precios_actuales(tickers) -> dict:
+    """
+    Precios actuales de varios tickers de una vez: {TICKER: precio}.
+    Sirve desde la caché lo que pueda y pide el resto a Twelve Data en lotes
+    de TWELVE_DATA_LOTE símbolos por petición. Los tickers sin precio no
+    aparecen en el resultado.
+    """
+    return cache_cotizaciones.obtener_varios(tickers, _descargar_precios_lote)
+
+
+def _descargar_precios_lote(tickers: list) -> dict:
     """
-    Carga/actualiza precios históricos de una acción vía Twelve Data
-    y persiste en PrecioHistorico (intervalo diario).
+    Precios de una lista de tickers en lotes de TWELVE_DATA_LOTE símbolos
+    como mucho, y nunca más de los créditos que el limitador puede conceder
+    a una petición (Twelve Data cobra un crédito por símbolo).
     """
-    if not TWELVE_DATA_API_KEY:
+    if not twelvedata.configurado:
         print("API Key de Twelve Data no configurada.")
-        return
+        return {}
 
-    url = "https://api.twelvedata.com/time_series"
-    params = {
-        "symbol": accion.ticker,
-        "interval": "1day",
-        "outputsize": dias,
-        "apikey": TWELVE_DATA_API_KEY,
-    }
+    tam = max(1, int(getattr(settings, "TWELVE_DATA_LOTE", 50)))
+    tam = min(tam, limitador.coste_maximo("twelvedata") or tam)
+    precios = {}
+    for i in range(0, len(tickers), tam):
+        lote = tickers[i:i + tam]
+        try:
+            data = twelvedata.get_json("price", {"symbol": ",".join(lote)}, coste=len(lote))
+            # con un único símbolo la respuesta no va anidada
+            if len(lote) == 1:
+                data = {lote[0]: data}
+            for t in lote:
+                try:
+                    p = float((data.get(t) or {}).get("price", 0.0))
+                except (TypeError, ValueError):
+                    p = 0.0
+                if p > 0:
+                    precios[t] = p
+        except Exception as e:
+            print(f"Error al obtener precios en lote ({','.join(lote)}): {e}")
+    return precios
+
+
+def _ultimo_dia_habil(antes_de: date) -> date:
+    """Último día laborable (L-V) estrictamente anterior a `antes_de`."""
+    d = antes_de - timedelta(days=1)
+    while d.weekday() >= 5:
+        d -= timedelta(days=1)
+    return d
+
+
+def _decimal(v):
     try:
-        r = requests.get(url, params=params, timeout=15)
-        data = r.json()
-        for punto in data.get("values", []):
-            fecha = datetime.datetime.strptime(punto["datetime"], "%Y-%m-%d").date()
-            cierre = Decimal(str(punto["close"]))
-            PrecioHistorico.objects.update_or_create(
-                accion=accion,
-                fecha=fecha,
-                defaults={"precio_cierre": cierre},
-            )
+        return Decimal(str(v)).quantize(Decimal("0.0001")) if v not in (None, "") else None
+    except InvalidOperation:
+        return None
+
+
+def actualizar_historico(ticker: str, dias: int = 365) -> int:
+    """
+    Carga incremental de barras diarias (Twelve Data) en la serie compartida
+    del instrumento: solo pide las posteriores a la última guardada (o `dias`
+    barras si no hay ninguna) y las escribe con un único upsert. No guarda
+    la barra de hoy, que aún no está cerrada.
+    Devuelve el número de barras escritas.
+    """
+    if not twelvedata.configurado:
+        print("API Key de Twelve Data no configurada.")
+        return 0
+
+    ticker = ticker.upper().strip()
+    hoy = date.today()
+    instrumento, _ = Instrumento.objects.get_or_create(ticker=ticker)
+    ultima = instrumento.barras.aggregate(m=Max("fecha"))["m"]
+    if ultima and ultima >= _ultimo_dia_habil(hoy):
+        return 0  # al día
+
+    params = {"symbol": ticker, "interval": "1day"}
+    if ultima:
+        params["start_date"] = (ultima + timedelta(days=1)).isoformat()
+    else:
+        params["outputsize"] = dias
+
+    try:
+        data = twelvedata.get_json("time_series", params)
     except Exception as e:
-        print(f"Error al actualizar histórico para {accion.ticker}: {e}")
+        print(f"Error al actualizar histórico para {ticker}: {e}")
+        return 0
+
+    barras = []
+    for punto in data.get("values") or []:
+        try:
+            fecha = datetime.datetime.strptime(punto["datetime"][:10], "%Y-%m-%d").date()
+        except (KeyError, ValueError):
+            continue
+        cierre = _decimal(punto.get("close"))
+        if cierre is None or fecha >= hoy or (ultima and fecha <= ultima):
+            continue
+        volumen = punto.get("volume")
+        barras.append(BarraDiaria(
+            instrumento=instrumento,
+            fecha=fecha,
+            cierre=cierre,
+            apertura=_decimal(punto.get("open")),
+            maximo=_decimal(punto.get("high")),
+            minimo=_decimal(punto.get("low")),
+            volumen=int(float(volumen)) if volumen not in (None, "") else None,
+        ))
+
+    if barras:
+        BarraDiaria.objects.bulk_create(
+            barras,
+            update_conflicts=True,
+            unique_fields=["instrumento", "fecha"],
+            update_fields=["cierre", "apertura", "maximo", "minimo", "volumen"],
+        )
+        try:
+            almacen_cierres.actualizar(ticker, [b.fecha for b in barras], [float(b.cierre) for b in barras])
+        except Exception as e:
+            print(f"[ALMACEN] Error escribiendo cierres de {ticker}: {e}")
+    return len(barras)
+
+
+def serie_cierres(ticker: str, desde: date = None, hasta: date = None, ultimas: int = None):
+    """
+    Serie canónica de cierres diarios de `ticker` en orden cronológico:
+    lista de (fecha, cierre_float). `ultimas` limita a las N barras finales.
+    """
+    qs = BarraDiaria.objects.filter(instrumento_id=ticker.upper().strip())
+    if desde:
+        qs = qs.filter(fecha__gte=desde)
+    if hasta:
+        qs = qs.filter(fecha__lte=hasta)
+    if ultimas:
+        filas = list(qs.order_by("-fecha").values_list("fecha", "cierre")[:ultimas])[::-1]
+    else:
+        filas = list(qs.order_by("fecha").values_list("fecha", "cierre"))
+    return [(f, float(c)) for f, c in filas]
 
 
 def calcular_resumen(acciones):
@@ -103,19 +214,15 @@ def obtener_serie_precios_diaria(ticker: str, dias: int = 100):
     Prefiere Twelve Data. Si no hay clave, intenta Alpha Vantage.
     """
     # 1) Twelve Data
-    if TWELVE_DATA_API_KEY:
+    if twelvedata.configurado:
         try:
-            url = "https://api.twelvedata.com/time_series"
             params = {
                 "symbol": ticker,
                 "interval": "1day",
                 "outputsize": dias,
                 "order": "ASC",   # fechas en ascendente
-                "apikey": TWELVE_DATA_API_KEY,
             }
-            r = requests.get(url, params=params, timeout=15)
-            r.raise_for_status()
-            js = r.json()
+            js = twelvedata.get_json("time_series", params)
             vals = js.get("values", [])
             fechas = [row["datetime"][:10] for row in vals]
             cierres = [float(row["close"]) for row in vals]
@@ -124,18 +231,14 @@ def obtener_serie_precios_diaria(ticker: str, dias: int = 100):
             print(f"[TwelveData] Serie diaria error {ticker}: {e}")
 
     # 2) Alpha Vantage (fallback)
-    if ALPHA_VANTAGE_API_KEY:
+    if alphavantage.configurado:
         try:
-            url = "https://www.alphavantage.co/query"
             params = {
                 "function": "TIME_SERIES_DAILY_ADJUSTED",
                 "symbol": ticker,
                 "outputsize": "compact",  # ~100 días
-                "apikey": ALPHA_VANTAGE_API_KEY,
             }
-            r = requests.get(url, params=params, timeout=20)
-            r.raise_for_status()
-            js = r.json()
+            js = alphavantage.get_json("query", params)
             ts = js.get("Time Series (Daily)") or {}
             fechas = sorted(ts.keys())
             cierres = []
@@ -196,21 +299,19 @@ def _to_float(v):
 # =============================================================================
 def obtener_datos_finnhub(ticker: str):
     """Devuelve precio actual y métricas básicas (PER, 52w high/low) desde Finnhub."""
-    if not FINNHUB_API_KEY:
+    if not finnhub.configurado:
         print("API Key de Finnhub no configurada.")
         return None
     try:
         # Precio actual
-        url_quote = f"https://finnhub.io/api/v1/quote?symbol={ticker}&token={FINNHUB_API_KEY}"
-        r_quote = requests.get(url_quote, timeout=10)
+        r_quote = finnhub.get("quote", {"symbol": ticker})
         if r_quote.status_code != 200:
             print(f"Error Finnhub (quote): {r_quote.status_code} {r_quote.reason}")
             return None
         precio_actual = r_quote.json().get("c")
 
         # Métricas
-        url_metric = f"https://finnhub.io/api/v1/stock/metric?symbol={ticker}&metric=all&token={FINNHUB_API_KEY}"
-        r_metric = requests.get(url_metric, timeout=10)
+        r_metric = finnhub.get("stock/metric", {"symbol": ticker, "metric": "all"})
         if r_metric.status_code != 200:
             print(f"Error Finnhub (metric): {r_metric.status_code} {r_metric.reason}")
             return None
@@ -227,37 +328,83 @@ def obtener_datos_finnhub(ticker: str):
         return None
 
 
-def obtener_datos_fundamentales_alpha_vantage(ticker: str):
-    """Datos fundamentales (resumen) vía Alpha Vantage OVERVIEW."""
-    if not ALPHA_VANTAGE_API_KEY:
-        print("API Key de Alpha Vantage no configurada.")
+def obtener_datos_finnhub_lote(tickers) -> dict:
+    """
+    Igual que obtener_datos_finnhub pero para varios tickers: {TICKER: datos}.
+    El precio sale de obtener_precios_actuales (lotes + caché) y las métricas
+    de Finnhub, que solo admite un símbolo por llamada, se cachean
+    FINNHUB_METRICAS_TTL segundos porque cambian muy poco durante el día.
+    """
+    unicos = list(dict.fromkeys(t.upper().strip() for t in tickers if t and t.strip()))
+    precios = obtener_precios_actuales(unicos)
+    resultado = {}
+    for t in unicos:
+        metricas = _metricas_finnhub(t)
+        precio = precios.get(t)
+        if precio is None:
+            # sin precio en Twelve Data: solo la cotización de Finnhub (las
+            # métricas ya están arriba)
+            precio = _cotizacion_finnhub(t)
+            if precio is None or metricas is None:
+                continue
+        resultado[t] = {"precio_actual": precio, **(metricas or {})}
+    return resultado
+
+
+def _cotizacion_finnhub(ticker: str):
+    """Último precio de `ticker` en Finnhub (quote), o None."""
+    if not finnhub.configurado:
         return None
-
-    url = f"https://www.alphavantage.co/query?function=OVERVIEW&symbol={ticker}&apikey={ALPHA_VANTAGE_API_KEY}"
     try:
-        r = requests.get(url, timeout=15)
-        data = r.json()
+        r = finnhub.get("quote", {"symbol": ticker})
+        if r.status_code != 200:
+            print(f"Error Finnhub (quote): {r.status_code} {r.reason}")
+            return None
+        return r.json().get("c")
+    except Exception as e:
+        print(f"Error al obtener cotización de Finnhub para {ticker}: {e}")
+        return None
+
 
-        if "Note" in data:
-            return {"error": "Límite de peticiones de Alpha Vantage alcanzado. Intenta más tarde."}
-        if not data or "Name" not in data:
+def _metricas_finnhub(ticker: str):
+    """PER y máximos/mínimos 52 semanas desde Finnhub, con caché."""
+    clave = f"finnhub:metricas:{ticker}"
+    metricas = cache.get(clave)
+    if metricas is not None:
+        return metricas
+    if not finnhub.configurado:
+        return None
+    try:
+        r = finnhub.get("stock/metric", {"symbol": ticker, "metric": "all"})
+        if r.status_code != 200:
+            print(f"Error Finnhub (metric): {r.status_code} {r.reason}")
             return None
+        m = r.json().get("metric", {})
+    except Exception as e:
+        print(f"Error al obtener métricas de Finnhub para {ticker}: {e}")
+        return None
 
-        return {
-            "nombre": data.get("Name"),
-            "sector": data.get("Sector"),
-            "industria": data.get("Industry"),
-            "pais": data.get("Country"),
-            "capitalizacion": data.get("MarketCapitalization"),
-            "empleados": data.get("FullTimeEmployees"),
-            "PER": data.get("PERatio"),
-            "PEG": data.get("PEGRatio"),
-            "ROE": data.get("ReturnOnEquityTTM"),
-            "ROA": data.get("ReturnOnAssetsTTM"),
-            "EPS": data.get("EPS"),
-            "deuda_equity": data.get("DebtEquityRatio"),
-            "dividendo": data.get("DividendYield"),
-        }
+    metricas = {
+        "per": m.get("peInclExtraTTM"),
+        "max_52s": m.get("52WeekHigh"),
+        "min_52s": m.get("52WeekLow"),
+    }
+    cache.set(clave, metricas, timeout=getattr(settings, "FINNHUB_METRICAS_TTL", 6 * 3600))
+    return metricas
+
+
+def obtener_datos_fundamentales_alpha_vantage(ticker: str):
+    """
+    Datos fundamentales (resumen) vía Alpha Vantage OVERVIEW.
+    Se sirven desde el almacén de fundamentales por ticker, que solo vuelve
+    a Alpha Vantage cuando el resumen guardado ha caducado.
+    """
+    if not alphavantage.configurado:
+        print("API Key de Alpha Vantage no configurada.")
+        return None
+
+    try:
+        return fundamentales.obtener(ticker, "OVERVIEW")
     except Exception as e:
         print(f"Error OVERVIEW Alpha Vantage: {e}")
         return None
@@ -268,14 +415,13 @@ def obtener_eventos_financieros_alpha_vantage(ticker: str, user):
     Guarda eventos de Resultados y Dividendos en tu modelo EventoFinanciero.
     (Útil para el calendario)
     """
-    if not ALPHA_VANTAGE_API_KEY:
+    if not alphavantage.configurado:
         print("API Key de Alpha Vantage no configurada.")
         return
 
     try:
         # Earnings
-        url_earnings = f"https://www.alphavantage.co/query?function=EARNINGS&symbol={ticker}&apikey={ALPHA_VANTAGE_API_KEY}"
-        r = requests.get(url_earnings, timeout=15)
+        r = alphavantage.get("query", {"function": "EARNINGS", "symbol": ticker})
         if r.status_code == 200:
             data = r.json()
             for ev in data.get("quarterlyEarnings", []):
@@ -288,8 +434,7 @@ def obtener_eventos_financieros_alpha_vantage(ticker: str, user):
                 )
 
         # Dividendos (histórico)
-        url_div = f"https://www.alphavantage.co/query?function=DIVIDEND_HISTORY&symbol={ticker}&apikey={ALPHA_VANTAGE_API_KEY}"
-        r2 = requests.get(url_div, timeout=15)
+        r2 = alphavantage.get("query", {"function": "DIVIDEND_HISTORY", "symbol": ticker})
         if r2.status_code == 200:
             dividendos = r2.json()
             for d in dividendos.get("data", []):
@@ -381,46 +526,20 @@ def snapshot_cartera_diario(user):
         )
 
 
-def backfill_snapshots(user, days: int = 90):
+def backfill_snapshots(user, days: int = None) -> int:
     """
-    Rellena snapshots aproximados para los últimos 'days' días
-    usando el precio actual (si no tienes PrecioHistorico diario).
+    Reconstruye HistoricoCartera con la valoración histórica real (posiciones
+    de Transaccion x cierres diarios). Con `days` solo reescribe ese tramo
+    final; sin él, todo el histórico desde la primera operación.
     """
-    acciones = Accion.objects.filter(user=user)
-    hoy = date.today()
-    for i in range(days, -1, -1):
-        d = hoy - timedelta(days=i)
-        valor = Decimal("0")
-        invertido = Decimal("0")
-        for a in acciones:
-            qty = Decimal(str(a.cantidad or 0))
-            pa = Decimal(str(a.precio_actual or 0))  # aproximación
-            pc = Decimal(str(a.precio_compra or 0))
-            valor += qty * pa
-            invertido += qty * pc
-        with transaction.atomic():
-            HistoricoCartera.objects.update_or_create(
-                user=user,
-                fecha=d,
-                defaults={"valor": valor, "invertido": invertido},
-            )
+    desde = date.today() - timedelta(days=days) if days else None
+    return valoracion.valorar(user, desde=desde)
 
 
 def shares_on_date(user, ticker: str, fecha: date) -> Decimal:
     """
     Número de acciones del ticker que el usuario tenía en 'fecha'
-    (suma BUY - SELL de transacciones <= fecha).
+    (suma BUY - SELL de transacciones <= fecha), desde el libro de posiciones.
     """
-    qs = (
-        Transaccion.objects.filter(user=user, ticker__iexact=ticker, fecha__lte=fecha)
-        .order_by("fecha", "id")
-    )
-    pos = Decimal("0")
-    for t in qs:
-        qty = Decimal(str(t.cantidad or 0))
-        if t.tipo in ("BUY", "buy", "Compra", "compra"):
-            pos += qty
-        elif t.tipo in ("SELL", "sell", "Venta", "venta"):
-            pos -= qty
-        # DIV no cambia posición
+    pos = posiciones.libro(user).cantidad(ticker, fecha)
     return pos if pos > 0 else Decimal("0")
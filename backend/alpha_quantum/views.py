@@ -1,8 +1,8 @@
-.# alpha_quantum/views.py
+# alpha_quantum/views.py
 from __future__ import annotations
 from django.shortcuts import render, redirect, get_object_or_404
 from django.utils.timezone import now
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login, logout
@@ -18,12 +18,12 @@ from django.db.models import Sum
 from decimal import Decimal, InvalidOperation
 from datetime import date, datetime, timedelta
 import json
-import requests
+import math
 
 from django.views.decorators.http import require_POST
 
 # ===== Modelos y forms =====
-from .models import Accion, Cartera, PrecioHistorico
+from .models import Accion, Cartera
 from .models.historico import HistoricoCartera
 from .models.dividendo import Dividendo
 from .models.transaccion import Transaccion
@@ -33,6 +33,14 @@ from .models.propiedad_alquilada import PropiedadAlquiler
 from .models.prestamo import Prestamo
 from .models.calendario import EventoFinanciero
 
+from django.contrib.admin.views.decorators import staff_member_required
+
+from django.core.cache import cache
+from .services import analitica, asignacion, backtest, benchmark, cache_cotizaciones, covarianza, indicadores, limitador, lotes, montecarlo, precios, riesgo
+from .services.posiciones import libro as libro_posiciones
+from .services.segundo_plano import lanzar
+from .services.proveedores import ErrorProveedor, finnhub, twelvedata
+
 from .forms import (
     AccionForm, LoginForm, CustomUserCreationForm, WatchlistForm,
     CashFlowForm, PropiedadAlquilerForm, PrestamoForm,
@@ -40,9 +48,11 @@ from .forms import (
 )
 
 from .utils import (
-    obtener_precio_actual, calcular_resumen, calcular_upside, generar_recomendacion,
-    snapshot_cartera_diario, backfill_snapshots, obtener_datos_finnhub,
-    obtener_eventos_financieros_alpha_vantage, obtener_datos_fundamentales_alpha_vantage
+    obtener_precio_actual, obtener_precios_actuales, calcular_resumen, calcular_upside,
+    generar_recomendacion, snapshot_cartera_diario, backfill_snapshots,
+    obtener_datos_finnhub, obtener_datos_finnhub_lote,
+    obtener_eventos_financieros_alpha_vantage, obtener_datos_fundamentales_alpha_vantage,
+    actualizar_historico, serie_cierres,
 )
 
 # ===========================
@@ -85,16 +95,10 @@ def agregar_accion(request):
 def dashboard(request):
     user = request.user
 
-    # 1) Actualiza precios mínimamente (si API falla conserva último precio)
-    acciones_user = Accion.objects.filter(user=user)
-    for a in acciones_user:
-        try:
-            p = obtener_precio_actual(a.ticker) or 0.0
-            if p > 0:
-                a.precio_actual = Decimal(str(p))
-                a.save(update_fields=["precio_actual"])
-        except Exception:
-            pass
+    # 1) Precios desde BD (los mantiene el comando actualizar_precios);
+    #    si faltan o están caducados se piden en segundo plano
+    acciones_user = list(Accion.objects.filter(user=user))
+    precios.solicitar_refresco(acciones_user)
 
     # 2) Snapshot del día
     snapshot_cartera_diario(user)
@@ -132,7 +136,7 @@ def dashboard(request):
     # 5) Serie histórica
     qs_hist = HistoricoCartera.objects.filter(user=user).order_by("fecha")
     if not qs_hist.exists():
-        backfill_snapshots(user, days=90)
+        backfill_snapshots(user)
         qs_hist = HistoricoCartera.objects.filter(user=user).order_by("fecha")
 
     hist_labels = [h.fecha.strftime("%Y-%m-%d") for h in qs_hist]
@@ -156,6 +160,7 @@ def dashboard(request):
         "dist_values": json.dumps(dist_values),
         "dividendos": dividendos,
         "transacciones": transacciones,
+        "precios_a_fecha": precios.precios_a_fecha(acciones_user),
     }
     return render(request, "alpha_quantum/dashboard.html", context)
 
@@ -175,7 +180,8 @@ from .models import Accion
 @login_required
 def cartera(request):
     """
-    Vista de cartera con KPIs, tabla enriquecida y rebalanceo igual-ponderado.
+    Vista de cartera con KPIs, tabla enriquecida y rebalanceo hacia la
+    asignación óptima (services/asignacion.py) en acciones enteras.
     """
     acciones = Accion.objects.filter(user=request.user)  # <<-- IMPORTANTE filtrar por user
 
@@ -216,25 +222,18 @@ def cartera(request):
     rentab_total_eur = total_val - total_inv
     rentab_total_pct = (rentab_total_eur / total_inv * Decimal('100')) if total_inv > 0 else Decimal('0')
 
-    # Rebalanceo igual ponderado simple
-    n = len(items) or 1
-    target = Decimal('100') / Decimal(str(n))
-    rebalance = []
-    for it in items:
-        actual = Decimal(str(it["pct_total"]))
-        diff = target - actual
-        sug = 'ok'
-        if diff > Decimal('0.25'):
-            sug = 'buy'
-        elif diff < Decimal('-0.25'):
-            sug = 'sell'
-        rebalance.append({
-            "ticker": it["ticker"],
-            "target": float(target),
-            "actual": float(actual),
-            "diff": float(diff),
-            "sug": sug,
-        })
+    # Rebalanceo hacia la asignación óptima (?metodo=, ?efectivo=)
+    try:
+        params = asignacion.parametros(request.GET.get("metodo"))
+    except ValueError:
+        params = asignacion.parametros()
+    try:
+        efectivo = float(request.GET.get("efectivo") or 0)
+    except ValueError:
+        efectivo = 0.0
+    if not math.isfinite(efectivo) or efectivo < 0:
+        efectivo = 0.0
+    optima = asignacion.rebalanceo(request.user, params, efectivo) or {}
 
     context = {
         "items": items,
@@ -242,7 +241,11 @@ def cartera(request):
         "total_invertido": float(total_inv),
         "rentab_total_eur": float(rentab_total_eur),
         "rentab_total_pct": float(rentab_total_pct),
-        "rebalance": rebalance,
+        "rebalance": optima.get("rebalanceo", []),
+        "asignacion": optima,
+        "metodos_asignacion": asignacion.METODOS,
+        "metodo_asignacion": params["metodo"],
+        "efectivo": efectivo,
     }
     return render(request, "alpha_quantum/cartera.html", context)
 
@@ -254,47 +257,42 @@ from rest_framework.response import Response
 
 class SparklineAPI(APIView):
     """
-    Devuelve últimos 'days' precios para un ticker.
-    Funciona tanto si PrecioHistorico tiene un campo 'ticker' (CharField)
-    como si usa una FK 'accion' -> Accion (tu caso).
+    Devuelve los últimos 'days' cierres de un ticker desde la serie
+    compartida (BarraDiaria). Si aún no hay barras, las pide en segundo plano.
     """
     def get(self, request):
-        ticker = (request.GET.get("ticker") or "").strip()
+        ticker = (request.GET.get("ticker") or "").strip().upper()
         days = int(request.GET.get("days", 30))
         if not ticker:
             return Response({"labels": [], "values": []})
 
-        # ¿El modelo PrecioHistorico tiene un campo 'ticker'?
-        has_ticker_field = any(
-            getattr(f, "name", None) == "ticker"
-            for f in getattr(PrecioHistorico, "_meta").get_fields()
-        )
+        serie = serie_cierres(ticker, ultimas=days)
+        if not serie and cache.add(f"historico:cargando:{ticker}", 1, timeout=600):
+            lanzar(actualizar_historico, ticker)
+
+        return Response({
+            "labels": [f.strftime("%Y-%m-%d") for f, _ in serie],
+            "values": [c for _, c in serie],
+        })
 
-        if has_ticker_field:
-            qs = PrecioHistorico.objects.filter(
-                ticker__iexact=ticker
-            ).order_by("-fecha")[:days]
-        else:
-            # Caso habitual: FK a Accion
-            acc = Accion.objects.filter(
-                user=request.user, ticker__iexact=ticker
-            ).first()
-            if not acc:
-                return Response({"labels": [], "values": []})
-            qs = PrecioHistorico.objects.filter(
-                accion=acc
-            ).order_by("-fecha")[:days]
-
-        data = list(qs)[::-1]  # en orden cronológico ascendente
-        labels = [
-            (getattr(x, "fecha", date.today())).strftime("%Y-%m-%d")
-            for x in data
-        ]
-        # El campo de precio en tu modelo es 'valor'
-        values = [float(getattr(x, "valor", 0)) for x in data]
 
-        return Response({"labels": labels, "values": values})
 
+@login_required
+def benchmark_api(request, codigo):
+    """
+    Benchmark `codigo` (p. ej. spx) alineado al histórico de la cartera entre
+    ?from= y ?to= (YYYY-MM-DD): rentabilidad acumulada (%) en `values` y
+    beta, alpha, tracking error e information ratio en `metricas`.
+    """
+    try:
+        desde = date.fromisoformat(request.GET["from"]) if request.GET.get("from") else None
+        hasta = date.fromisoformat(request.GET["to"]) if request.GET.get("to") else None
+    except ValueError:
+        return JsonResponse({"error": "Fechas no válidas (YYYY-MM-DD)"}, status=400)
+    res = benchmark.comparar(request.user, codigo, desde, hasta)
+    if res is None:
+        return JsonResponse({"error": f"Benchmark desconocido: {codigo}"}, status=404)
+    return JsonResponse(res)
 
 
 @login_required
@@ -391,37 +389,25 @@ class HistoricoCarteraAPI(APIView):
         return Response({"labels": labels, "values": values})
 
 
-def _position_on(user, ticker: str, cutoff) -> Decimal:
-    """Acciones netas a la fecha (compras - ventas) <= cutoff."""
-    qs = Transaccion.objects.filter(user=user, ticker__iexact=ticker, fecha__lte=cutoff)
-    buys = qs.filter(tipo='BUY').aggregate(s=Sum('cantidad'))['s'] or Decimal('0')
-    sells = qs.filter(tipo='SELL').aggregate(s=Sum('cantidad'))['s'] or Decimal('0')
-    return Decimal(buys) - Decimal(sells)
-
 class DashboardDataView(LoginRequiredMixin, View):
     def get(self, request, *args, **kwargs):
-        user = request.user
-        acciones = Cartera.objects.filter(user=user)
+        # Precios desde BD (los mantiene el comando actualizar_precios);
+        # si faltan o están caducados se piden en segundo plano
+        acciones = list(Accion.objects.filter(user=request.user))
+        precios.solicitar_refresco(acciones)
+
+        def _valor(acc):
+            return Decimal(str(acc.cantidad)) * Decimal(str(acc.precio_actual or acc.precio_compra))
 
         total_invertido = Decimal("0")
         valor_actual_total = Decimal("0")
+        valor_actual = sum((_valor(a) for a in acciones), Decimal("0"))
         historico = []
-        top_ganadoras = []
-        top_perdedoras = []
 
         for acc in acciones:
-            try:
-                precio_actual = obtener_precio_actual(acc.ticker)
-                if precio_actual:
-                    acc.precio_actual = precio_actual
-                    acc.save(update_fields=["precio_actual"])
-            except Exception as e:
-                print(f"[DASHBOARD] Error actualizando {acc.ticker}: {e}")
-
-            inversion_accion = acc.cantidad * acc.precio_compra
-            valor_accion = acc.cantidad * (acc.precio_actual or acc.precio_compra)
+            inversion_accion = Decimal(str(acc.cantidad)) * Decimal(str(acc.precio_compra))
+            valor_accion = _valor(acc)
 
-            valor_actual = sum([accion.cantidad * obtener_precio_actual(accion.ticker) for accion in acciones])
             beneficio_neto = valor_actual - total_invertido
             rentabilidad_pct = (beneficio_neto / total_invertido * 100) if total_invertido > 0 else 0
             total_invertido += inversion_accion
@@ -432,8 +418,8 @@ class DashboardDataView(LoginRequiredMixin, View):
                 "ticker": acc.ticker,
                 "rentabilidad": float(round(rentabilidad, 2)),
                 "valor_actual": float(round(valor_accion, 2)),
-                'beneficio_neto': round(beneficio_neto, 2),
-                'rentabilidad_pct': round(rentabilidad_pct, 2),
+                'beneficio_neto': float(round(beneficio_neto, 2)),
+                'rentabilidad_pct': float(round(rentabilidad_pct, 2)),
             })
 
         # Ordenar para top 3 ganadoras y perdedoras
@@ -443,6 +429,7 @@ class DashboardDataView(LoginRequiredMixin, View):
 
         rentabilidad_total = ((valor_actual_total - total_invertido) / total_invertido * 100) if total_invertido > 0 else 0
 
+        a_fecha = precios.precios_a_fecha(acciones)
         data = {
             "total_invertido": float(round(total_invertido, 2)),
             "valor_actual_total": float(round(valor_actual_total, 2)),
@@ -450,6 +437,7 @@ class DashboardDataView(LoginRequiredMixin, View):
             "top_ganadoras": top_ganadoras,
             "top_perdedoras": top_perdedoras,
             "historico": historico,
+            "precios_a_fecha": a_fecha.isoformat() if a_fecha else None,
         }
         return JsonResponse(data)
 
@@ -471,10 +459,11 @@ def dividendos_api(request):
 
     items = []
     total_periodo = Decimal('0')
+    libro = libro_posiciones(request.user)
 
     for d in qs.order_by('-fecha'):
         tk = d.accion.ticker
-        qty_on_date = _position_on(request.user, tk, d.fecha)
+        qty_on_date = libro.cantidad(tk, d.fecha)
         cobro = (Decimal(d.monto) * Decimal(qty_on_date)).quantize(Decimal('0.01'))
         items.append({
             "fecha": d.fecha.strftime("%Y-%m-%d"),
@@ -506,17 +495,8 @@ def dividendos_api(request):
 class CarteraAPIView(APIView):
     """Usada por el doughnut de distribución."""
     def get(self, request):
-        acciones = Accion.objects.filter(user=request.user)
-
-        # Refresco ligero de precios
-        for a in acciones:
-            nuevo_precio = obtener_precio_actual(a.ticker)
-            if nuevo_precio is not None and nuevo_precio > 0:
-                try:
-                    a.precio_actual = Decimal(str(nuevo_precio))
-                    a.save(update_fields=["precio_actual"])
-                except (InvalidOperation, ValueError):
-                    continue
+        acciones = list(Accion.objects.filter(user=request.user))
+        precios.solicitar_refresco(acciones)
 
         total_cartera = Decimal('0.0')
         for a in acciones:
@@ -556,49 +536,62 @@ class CarteraAPIView(APIView):
             except Exception:
                 continue
 
-        return Response({"total_cartera": f"{total_cartera:.2f}", "acciones": data})
+        a_fecha = precios.precios_a_fecha(acciones)
+        return Response({
+            "total_cartera": f"{total_cartera:.2f}",
+            "acciones": data,
+            "precios_a_fecha": a_fecha.isoformat() if a_fecha else None,
+        })
 
 
 # ===========================
 #     TRANSACCIONES (CSV)
 # ===========================
+class _Eco:
+    """Pseudo-fichero para csv.writer: devuelve cada línea en vez de guardarla."""
+    def write(self, valor):
+        return valor
+
+
+CSV_CHUNK = 2000
+
+
+def _csv_en_streaming(nombre: str, cabecera, filas, delimiter=","):
+    """StreamingHttpResponse que va escribiendo `filas` (iterable) como CSV."""
+    import csv
+    writer = csv.writer(_Eco(), delimiter=delimiter)
+
+    def generar():
+        yield writer.writerow(cabecera)
+        for fila in filas:
+            yield writer.writerow(fila)
+
+    resp = StreamingHttpResponse(generar(), content_type="text/csv")
+    resp["Content-Disposition"] = f'attachment; filename="{nombre}"'
+    return resp
+
+
 @login_required
 def transacciones_export_csv(request):
-    import csv
-    qs = Transaccion.objects.filter(user=request.user).order_by('fecha', 'id')
-
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename=transacciones.csv'
-    writer = csv.writer(response)
-    writer.writerow(['Fecha','Ticker','Tipo','Cantidad','Precio','Comision','Importe','P/L (aprox)','Rentabilidad %'])
-
-    costo_avg, pos = {}, {}
-    for tr in qs:
-        tk = tr.ticker.upper()
-        if tk not in costo_avg:
-            costo_avg[tk] = 0.0; pos[tk] = 0.0
-        pnl = 0.0
-        rr  = 0.0
-        if tr.tipo == 'BUY':
-            total_cost = costo_avg[tk]*pos[tk] + float(tr.precio)*float(tr.cantidad) + float(tr.comision)
-            pos[tk] += float(tr.cantidad)
-            costo_avg[tk] = total_cost/pos[tk] if pos[tk] else 0.0
-        elif tr.tipo == 'SELL':
-            base_cost = costo_avg[tk] if pos[tk] > 0 else 0.0
-            pnl = ((float(tr.precio)-base_cost) * float(tr.cantidad) - float(tr.comision))
-            inv_base = base_cost * float(tr.cantidad)
-            rr  = (pnl / inv_base * 100.0) if inv_base > 0 else 0.0
-            pos[tk] = max(0.0, pos[tk]-float(tr.cantidad))
-            if pos[tk] == 0:
-                costo_avg[tk] = 0.0
-        else:  # DIV
-            pnl = float(tr.importe())
-
-        writer.writerow([
-            tr.fecha, tr.ticker, tr.get_tipo_display(), float(tr.cantidad), float(tr.precio),
-            float(tr.comision), round(float(tr.importe()),2), round(pnl,2), round(rr,2)
-        ])
-    return response
+    res = lotes.de_usuario(request.user, request.GET.get("metodo"))
+    tipos = dict(Transaccion.TIPO)
+    qs = (Transaccion.objects.filter(user=request.user).order_by('fecha', 'id')
+          .values_list('id', 'fecha', 'ticker', 'tipo', 'cantidad', 'precio', 'comision'))
+
+    def filas():
+        for pk, fecha, ticker, tipo, cantidad, precio, comision in qs.iterator(chunk_size=CSV_CHUNK):
+            importe = Transaccion(tipo=tipo, cantidad=cantidad, precio=precio, comision=comision).importe()
+            pnl, rr = res.por_transaccion.get(pk, (Decimal('0'), Decimal('0')))
+            yield [
+                fecha, ticker, tipos.get(tipo, tipo), float(cantidad), float(precio),
+                float(comision), round(float(importe),2), round(float(pnl),2), round(float(rr),2)
+            ]
+
+    return _csv_en_streaming(
+        "transacciones.csv",
+        ['Fecha','Ticker','Tipo','Cantidad','Precio','Comision','Importe','P/L (aprox)','Rentabilidad %'],
+        filas(),
+    )
 
 def transacciones_view(request):
     qs = Transaccion.objects.filter(user=request.user)
@@ -611,44 +604,21 @@ def transacciones_view(request):
     if anio:
         qs = qs.filter(fecha__year=anio)
 
-    # P/L realizado simple por ticker usando coste medio
-    costo_avg, pos = {}, {}
-    pnl_map, rr_map, realized = {}, {}, 0.0  # <-- añadimos rr_map
-
-    for tr in qs.order_by('fecha', 'id'):
-        tk = tr.ticker.upper()
-        if tk not in costo_avg:
-            costo_avg[tk] = 0.0
-            pos[tk] = 0.0
-
-        if tr.tipo == 'BUY':
-            # nuevo coste medio ponderado
-            total_cost = costo_avg[tk] * pos[tk] + float(tr.precio) * float(tr.cantidad) + float(tr.comision)
-            pos[tk] += float(tr.cantidad)
-            costo_avg[tk] = total_cost / pos[tk] if pos[tk] else 0.0
-            pnl_map[tr.id] = 0.0
-            rr_map[tr.id]  = 0.0
-        elif tr.tipo == 'SELL':
-            # si no hay posición previa, tratamos como cierre sin base (no debería pasar)
-            base_cost = costo_avg[tk] if pos[tk] > 0 else 0.0
-            pnl = (float(tr.precio) - base_cost) * float(tr.cantidad) - float(tr.comision)
-            pnl_map[tr.id] = round(pnl, 2)
-            inv_base = base_cost * float(tr.cantidad)
-            rr_map[tr.id]  = round((pnl / inv_base * 100.0), 2) if inv_base > 0 else 0.0
+    # P/L por operación con el motor de lotes (sobre todo el histórico)
+    res = lotes.de_usuario(request.user, request.GET.get("metodo"))
+    pnl_map, rr_map, realized = {}, {}, Decimal('0')
+    for tr_id, tipo in qs.values_list('id', 'tipo'):
+        pnl, rr = res.por_transaccion.get(tr_id, (Decimal('0'), Decimal('0')))
+        pnl_map[tr_id] = round(float(pnl), 2)
+        rr_map[tr_id] = round(float(rr), 2)
+        if tipo == 'SELL':
             realized += pnl
-            # reducimos posición
-            pos[tk] = max(0.0, pos[tk] - float(tr.cantidad))
-            if pos[tk] == 0:
-                costo_avg[tk] = 0.0
-        else:  # DIV
-            pnl_map[tr.id] = float(tr.importe())
-            rr_map[tr.id]  = 0.0
 
     return render(request, "alpha_quantum/transacciones.html", {
         "items": qs.order_by('-fecha', '-id'),
         "pnl_map": pnl_map,
         "rr_map": rr_map,                # <-- pasa rentabilidad por operación
-        "realized_total": round(realized, 2),
+        "realized_total": round(float(realized), 2),
     })
 
 # ===========================
@@ -1149,9 +1119,10 @@ def eliminar_watchlist(request: HttpRequest, lista_id: int, item_id: int):
 def refrescar_watchlist(request: HttpRequest, lista_id: int):
     lista = get_object_or_404(WatchlistLista, pk=lista_id, user=request.user)
     items = Watchlist.objects.filter(user=request.user, lista=lista)
+    datos_lote = obtener_datos_finnhub_lote([it.ticker for it in items])
     count = 0
     for it in items:
-        datos = obtener_datos_finnhub(it.ticker)
+        datos = datos_lote.get(it.ticker.upper().strip())
         if datos:
             it.precio_actual = datos.get("precio_actual")
             it.per = datos.get("per")
@@ -1192,12 +1163,28 @@ def refrescar_watchlist_item(request: HttpRequest, lista_id: int, item_id: int):
 @login_required
 def exportar_watchlist_csv(request: HttpRequest, lista_id: int) -> HttpResponse:
     lista = get_object_or_404(WatchlistLista, pk=lista_id, user=request.user)
-    items = Watchlist.objects.filter(user=request.user, lista=lista).order_by("ticker")
-
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = f'attachment; filename="watchlist_{lista.titulo}.csv"'
-    writer = csv.writer(response, delimiter=";")
-    writer.writerow(
+    items = (
+        Watchlist.objects.filter(user=request.user, lista=lista).order_by("ticker")
+        .values_list("ticker", "nombre", "precio_actual", "valor_objetivo", "upside",
+                     "per", "max_52s", "min_52s", "recomendacion")
+    )
+    filas = (
+        [
+            ticker,
+            nombre or "",
+            f"{precio or ''}",
+            f"{objetivo or ''}",
+            f"{upside or ''}",
+            f"{per or ''}",
+            f"{max_52s or ''}",
+            f"{min_52s or ''}",
+            recomendacion or "",
+        ]
+        for ticker, nombre, precio, objetivo, upside, per, max_52s, min_52s, recomendacion
+        in items.iterator(chunk_size=CSV_CHUNK)
+    )
+    return _csv_en_streaming(
+        f"watchlist_{lista.titulo}.csv",
         [
             "Ticker",
             "Nombre",
@@ -1208,23 +1195,10 @@ def exportar_watchlist_csv(request: HttpRequest, lista_id: int) -> HttpResponse:
             "Max52s",
             "Min52s",
             "Recomendación",
-        ]
+        ],
+        filas,
+        delimiter=";",
     )
-    for it in items:
-        writer.writerow(
-            [
-                it.ticker,
-                it.nombre or "",
-                f"{it.precio_actual or ''}",
-                f"{it.valor_objetivo or ''}",
-                f"{it.upside or ''}",
-                f"{it.per or ''}",
-                f"{it.max_52s or ''}",
-                f"{it.min_52s or ''}",
-                it.recomendacion or "",
-            ]
-        )
-    return response
 
 
 # ---------------------------
@@ -1354,17 +1328,17 @@ def calendario_financiero(request):
 # ===========================
 #        NOTICIAS
 # ===========================
-FINNHUB_API_KEY = 'd1vp4b1r01qmbi8pd5e0d1vp4b1r01qmbi8pd5eg'
-
 @login_required
 def noticias(request):
     categoria = request.GET.get("categoria", "general")
     categorias_validas = ["general", "forex", "crypto", "merger", "technology"]
     if categoria not in categorias_validas:
         categoria = "general"
-    url = f"https://finnhub.io/api/v1/news?category={categoria}&token={FINNHUB_API_KEY}"
-    response = requests.get(url)
-    noticias = response.json() if response.status_code == 200 else []
+    try:
+        noticias = finnhub.get_json("news", {"category": categoria}) or []
+    except ErrorProveedor as e:
+        print(f"[NOTICIAS] Error Finnhub: {e}")
+        noticias = []
     return render(request, "alpha_quantum/noticias.html", {
         "noticias": noticias,
         "categoria_actual": categoria,
@@ -1377,10 +1351,11 @@ def noticias(request):
 # ===========================
 # -*- coding: utf-8 -*-
 
-import requests
 from django.conf import settings
 from django.shortcuts import render
 
+from .services import fundamentales
+from .services.segundo_plano import en_paralelo
 from .utils import (
     obtener_precio_actual,
     obtener_datos_fundamentales_alpha_vantage,
@@ -1390,39 +1365,22 @@ from .models import Accion
 # importa tus modelos de watchlist (como los nombraste)
 from .models.watchlist import WatchlistLista
 
-TD_KEY = getattr(settings, "TWELVE_DATA_API_KEY", None)
-FH_KEY = getattr(settings, "FINNHUB_API_KEY", None)
-AV_KEY = getattr(settings, "ALPHA_VANTAGE_API_KEY", None)
-
 
 # ------------------- helpers -------------------
 
 def _serie_precios_twelvedata(ticker: str, days: int = 60):
     """Cierres diarios (últimos `days`) con TwelveData"""
-    if not TD_KEY:
+    if not twelvedata.configurado:
         return []
     try:
-        url = "https://api.twelvedata.com/time_series"
-        params = {"symbol": ticker, "interval": "1day", "outputsize": days, "apikey": TD_KEY}
-        r = requests.get(url, params=params, timeout=12)
-        dj = r.json()
+        params = {"symbol": ticker, "interval": "1day", "outputsize": days}
+        dj = twelvedata.get("time_series", params).json()
         values = list(reversed(dj.get("values") or []))
         return [{"t": v["datetime"], "c": float(v["close"])} for v in values]
     except Exception:
         return []
 
 
-def _av_get(function: str, ticker: str):
-    if not AV_KEY:
-        return {}
-    try:
-        url = "https://www.alphavantage.co/query"
-        r = requests.get(url, params={"function": function, "symbol": ticker, "apikey": AV_KEY}, timeout=15)
-        return r.json() or {}
-    except Exception:
-        return {}
-
-
 def _to_f(x, scale=1.0):
     try:
         return float(x) / scale
@@ -1431,42 +1389,39 @@ def _to_f(x, scale=1.0):
 
 
 def _income_quarterly(ticker: str, n: int = 8):
-    """INCOME_STATEMENT (quarterlyReports) → labels, revenue(M), gp, opInc, netInc"""
-    data = _av_get("INCOME_STATEMENT", ticker)
-    rows = data.get("quarterlyReports") or []
+    """INCOME_STATEMENT (almacén de fundamentales) → labels, revenue(M), gp, opInc, netInc"""
+    rows = fundamentales.obtener(ticker, "INCOME_STATEMENT") or []
     rows = rows[:n][::-1]  # últimos n, cronológico
     labels, revenue, gp, opi, ni = [], [], [], [], []
     for r in rows:
-        labels.append(r.get("fiscalDateEnding"))
-        revenue.append(_to_f(r.get("totalRevenue"), 1e6))
-        gp.append(_to_f(r.get("grossProfit"), 1e6))
-        opi.append(_to_f(r.get("operatingIncome"), 1e6))
-        ni.append(_to_f(r.get("netIncome"), 1e6))
+        labels.append(r.get("fecha"))
+        revenue.append(_to_f(r.get("ingresos"), 1e6))
+        gp.append(_to_f(r.get("beneficio_bruto"), 1e6))
+        opi.append(_to_f(r.get("resultado_operativo"), 1e6))
+        ni.append(_to_f(r.get("beneficio_neto"), 1e6))
     return labels, revenue, gp, opi, ni
 
 
 def _earnings_eps_quarterly(ticker: str, n: int = 8):
-    """EARNINGS (quarterlyEarnings) → labels, reportedEPS"""
-    data = _av_get("EARNINGS", ticker)
-    rows = data.get("quarterlyEarnings") or []
+    """EARNINGS (almacén de fundamentales) → labels, reportedEPS"""
+    rows = fundamentales.obtener(ticker, "EARNINGS") or []
     rows = rows[:n][::-1]
     labels, eps = [], []
     for r in rows:
-        labels.append(r.get("reportedDate"))
-        eps.append(_to_f(r.get("reportedEPS")))
+        labels.append(r.get("fecha"))
+        eps.append(_to_f(r.get("eps")))
     return labels, eps
 
 
 def _balance_quarterly(ticker: str, n: int = 8):
-    """BALANCE_SHEET (quarterlyReports) → labels, activos(B), pasivos(B)"""
-    data = _av_get("BALANCE_SHEET", ticker)
-    rows = data.get("quarterlyReports") or []
+    """BALANCE_SHEET (almacén de fundamentales) → labels, activos(B), pasivos(B)"""
+    rows = fundamentales.obtener(ticker, "BALANCE_SHEET") or []
     rows = rows[:n][::-1]
     labels, assets, liab = [], [], []
     for r in rows:
-        labels.append(r.get("fiscalDateEnding"))
-        assets.append(_to_f(r.get("totalAssets"), 1e9))
-        liab.append(_to_f(r.get("totalLiabilities"), 1e9))
+        labels.append(r.get("fecha"))
+        assets.append(_to_f(r.get("activos"), 1e9))
+        liab.append(_to_f(r.get("pasivos"), 1e9))
     return labels, assets, liab
 
 
@@ -1486,17 +1441,13 @@ def _margins_from_income(labels, revenue_m, gp_m, opi_m, ni_m):
 
 def _fundamentales_finnhub(ticker: str):
     """Fallback de perfil + métricas si AV no responde"""
-    if not FH_KEY:
+    if not finnhub.configurado:
         return {}, {}, None, None
 
     perfil, indicadores = {}, {}
     nombre, moneda = None, None
     try:
-        rp = requests.get(
-            "https://finnhub.io/api/v1/stock/profile2",
-            params={"symbol": ticker, "token": FH_KEY},
-            timeout=12,
-        )
+        rp = finnhub.get("stock/profile2", {"symbol": ticker})
         if rp.status_code == 200:
             p = rp.json() or {}
             perfil = {
@@ -1510,11 +1461,7 @@ def _fundamentales_finnhub(ticker: str):
             nombre = p.get("name")
             moneda = p.get("currency")
 
-        rm = requests.get(
-            "https://finnhub.io/api/v1/stock/metric",
-            params={"symbol": ticker, "metric": "all", "token": FH_KEY},
-            timeout=12,
-        )
+        rm = finnhub.get("stock/metric", {"symbol": ticker, "metric": "all"})
         if rm.status_code == 200:
             m = (rm.json() or {}).get("metric", {})
             indicadores = {
@@ -1530,20 +1477,51 @@ def _fundamentales_finnhub(ticker: str):
     return perfil, indicadores, nombre, moneda
 
 
+def _overview_con_fallback(ticker: str):
+    """OVERVIEW de AV y, solo si falla, perfil/métricas de Finnhub (misma tarea)."""
+    datos_av = obtener_datos_fundamentales_alpha_vantage(ticker)
+    if datos_av and not datos_av.get("error"):
+        return datos_av, None
+    return datos_av, _fundamentales_finnhub(ticker)
+
+
+# Paneles de la página que dependen de cada llamada (para avisar si faltan)
+_PANELES_FUNDAMENTAL = {
+    "precio": "Precio",
+    "serie": "Gráfico de precio",
+    "overview": "Indicadores y perfil",
+    "income": "Ingresos y márgenes",
+    "eps": "BPA trimestral",
+    "balance": "Balance",
+}
+
+
 # ------------------- view -------------------
 
 def analisis_fundamental(request):
     ticker = (request.GET.get("ticker") or "AAPL").upper().strip()
 
+    # Todas las llamadas a proveedores a la vez, con un plazo global:
+    # lo que no llegue a tiempo se marca como panel pendiente.
+    res, faltan = en_paralelo({
+        "precio": (obtener_precio_actual, ticker),
+        "serie": (_serie_precios_twelvedata, ticker, 60),
+        "overview": (_overview_con_fallback, ticker),
+        "income": (_income_quarterly, ticker, 8),
+        "eps": (_earnings_eps_quarterly, ticker, 8),
+        "balance": (_balance_quarterly, ticker, 8),
+    }, plazo=getattr(settings, "FUNDAMENTAL_PLAZO", 8.0))
+    paneles_pendientes = [_PANELES_FUNDAMENTAL[k] for k in _PANELES_FUNDAMENTAL if k in faltan]
+
     # Precio + serie para el gráfico
     try:
-        precio = float(obtener_precio_actual(ticker) or 0)
+        precio = float(res["precio"] or 0) if "precio" in res else None
     except Exception:
         precio = None
-    ohlcv = _serie_precios_twelvedata(ticker, days=60)
+    ohlcv = res.get("serie", [])
 
     # Perfil/indicadores (Overview AV con fallback Finnhub)
-    datos_av = obtener_datos_fundamentales_alpha_vantage(ticker)
+    datos_av, datos_fh = res.get("overview", (None, None))
     error_msg = None
 
     perfil = {"sector": None, "industria": None, "pais": None, "empleados": None, "deuda_equity": None, "peg": None}
@@ -1568,18 +1546,18 @@ def analisis_fundamental(request):
     else:
         if datos_av and datos_av.get("error"):
             error_msg = datos_av["error"]
-        else:
+        elif "overview" in res:
             error_msg = "No se pudo obtener OVERVIEW en Alpha Vantage. Intento datos alternativos."
-        pf, ind, nombre_fh, moneda_fh = _fundamentales_finnhub(ticker)
+        pf, ind, nombre_fh, moneda_fh = datos_fh or ({}, {}, None, None)
         perfil.update({k: v for k, v in pf.items() if v is not None})
         indicadores.update({k: v for k, v in ind.items() if v is not None})
         if nombre_fh: nombre = nombre_fh
         if moneda_fh: moneda = moneda_fh
 
     # -------- datos para las gráficas (AV) --------
-    rev_labels, rev_values, gp_m, opi_m, ni_m = _income_quarterly(ticker, n=8)
-    eps_labels, eps_values = _earnings_eps_quarterly(ticker, n=8)
-    bal_labels, activos_b, pasivos_b = _balance_quarterly(ticker, n=8)
+    rev_labels, rev_values, gp_m, opi_m, ni_m = res.get("income", ([], [], [], [], []))
+    eps_labels, eps_values = res.get("eps", ([], []))
+    bal_labels, activos_b, pasivos_b = res.get("balance", ([], [], []))
     marg_labels, margen_bruto, margen_oper, margen_neto = _margins_from_income(rev_labels, rev_values, gp_m, opi_m, ni_m)
 
     # -------- sidebar: cartera y watchlists --------
@@ -1631,6 +1609,7 @@ def analisis_fundamental(request):
         "wlists": wlists,
 
         "error_msg": error_msg,
+        "paneles_pendientes": paneles_pendientes,
     }
     return render(request, "alpha_quantum/fundamental.html", ctx)
 
@@ -1917,15 +1896,13 @@ def cashflow_series_api(request):
 @login_required
 def cashflow_export_csv(request):
     """Exporta ingresos/gastos a CSV (opcional)."""
-    import csv
-    registros = CashFlow.objects.filter(user=request.user).order_by('date')
-    resp = HttpResponse(content_type="text/csv")
-    resp['Content-Disposition'] = 'attachment; filename=flujo_de_caja.csv'
-    w = csv.writer(resp)
-    w.writerow(["Fecha","Tipo","Categoria","Descripcion","Monto"])
-    for r in registros:
-        w.writerow([r.date, r.category, r.subcategory or "", r.description or "", float(r.amount)])
-    return resp
+    registros = (CashFlow.objects.filter(user=request.user).order_by('date')
+                 .values_list('date', 'category', 'tipo_ingreso', 'description', 'amount'))
+    filas = (
+        [fecha, categoria, subcategoria or "", descripcion or "", float(importe)]
+        for fecha, categoria, subcategoria, descripcion, importe in registros.iterator(chunk_size=CSV_CHUNK)
+    )
+    return _csv_en_streaming("flujo_de_caja.csv", ["Fecha","Tipo","Categoria","Descripcion","Monto"], filas)
 
 @login_required
 def agregar_ingreso(request):
@@ -2090,11 +2067,12 @@ def eventos_api(request):
 @login_required
 def precios_watchlist_api(request):
     acciones = Watchlist.objects.filter(user=request.user)
+    cotizaciones = obtener_precios_actuales([acc.ticker for acc in acciones])
     data = []
 
     for acc in acciones:
         try:
-            precio = obtener_precio_actual(acc.ticker)
+            precio = cotizaciones.get(acc.ticker.upper().strip())
             if precio:
                 acc.precio_actual = precio
                 acc.save(update_fields=["precio_actual"])
@@ -2111,6 +2089,14 @@ def precios_watchlist_api(request):
 
     return JsonResponse({"acciones": data})
 
+@staff_member_required
+def estado_proveedores_api(request):
+    """Consumo de cupos por proveedor y estadísticas de la caché de cotizaciones."""
+    return JsonResponse({
+        "cupos": limitador.estado(),
+        "cache_cotizaciones": cache_cotizaciones.estadisticas(),
+    })
+
 # alpha_quantum/views.py
 
 # views.py
@@ -2122,7 +2108,6 @@ from django.shortcuts import render
 from django.db.models import Sum
 
 # Usa tu helper ya definido arriba
-# def _position_on(user, ticker: str, cutoff) -> Decimal: ...
 
 @login_required
 def resumen_cartera(request):
@@ -2134,11 +2119,11 @@ def resumen_cartera(request):
       - Distribuciones (ticker, sector, divisa)
       - Rentabilidad últimos 12m (línea)
       - Dividendos: próximo calendario, mensual últimos 12m, total anual y yield
-      - Métricas: volatilidad (simple), Sharpe (aprox), % en cash (si no hay, 0)
+      - Métricas (services.analitica): volatilidad, Sharpe, Sortino, Calmar,
+        max drawdown y % días positivos; % en cash (si no hay, 0)
     """
     from .models import Accion
     from .models.dividendo import Dividendo
-    from .models.historico import HistoricoCartera
 
     user = request.user
 
@@ -2206,57 +2191,22 @@ def resumen_cartera(request):
     beneficios_labels = [p["ticker"] for p in posiciones]
     beneficios_values = [p["pnl"] for p in posiciones]
 
-    # ---------- Rentabilidad últimos 12m (línea) ----------
+    # ---------- Rentabilidad, volatilidad y drawdown últimos 12m ----------
+    # rentabilidad encadenada (descontando aportaciones y retiradas)
     hoy = date.today()
-    hace_12m = hoy - timedelta(days=365)
-    # HistoricoCartera: tus campos pueden ser valor/invertido o valor_total/invertido_total según tus seeds
-    # Intentamos ambos nombres de forma robusta
-    hist = HistoricoCartera.objects.filter(user=user, fecha__gte=hace_12m).order_by('fecha')
-    fechas_series, serie_valor = [], []
-    for h in hist:
-        fechas_series.append(h.fecha.strftime("%Y-%m-%d"))
-        v = getattr(h, 'valor', None)
-        if v is None:
-            v = getattr(h, 'valor_total', 0)
-        serie_valor.append(float(v or 0))
-
-    rent_12m_labels, rent_12m_values = [], []
-    if len(serie_valor) >= 2:
-        base = serie_valor[0]
-        for idx, v in enumerate(serie_valor):
-            rr = 0.0 if base == 0 else (v - base) / base * 100.0
-            rent_12m_labels.append(fechas_series[idx])
-            rent_12m_values.append(rr)
-
-    # ---------- Volatilidad y Sharpe (aprox) ----------
-    # volatilidad = std de rendimientos diarios * sqrt(252)
-    # sharpe = (avg_ret * 252) / (std_daily * sqrt(252))  => simplifica a avg_ret/std_daily * sqrt(252)
-    daily_returns = []
-    if len(serie_valor) >= 2:
-        for i in range(1, len(serie_valor)):
-            prev, cur = serie_valor[i-1], serie_valor[i]
-            if prev != 0:
-                daily_returns.append((cur/prev) - 1.0)
-
-    def _std(xs):
-        if len(xs) < 2: return 0.0
-        m = sum(xs)/len(xs)
-        var = sum((x-m)**2 for x in xs)/(len(xs)-1)
-        return var**0.5
-
-    vol_pct = 0.0
-    sharpe  = 0.0
-    if daily_returns:
-        std_d = _std(daily_returns)
-        avg_d = sum(daily_returns)/len(daily_returns)
-        vol_pct = (std_d * (252**0.5)) * 100.0
-        sharpe  = (avg_d/std_d)*(252**0.5) if std_d > 0 else 0.0
+    anal = analitica.analizar(user, dias=365)
+    stats_12m = (anal or {}).get("estadisticas", {})
+    rent_12m_labels = anal["labels"] if anal else []
+    rent_12m_values = anal["rentabilidad_acumulada_pct"] if anal else []
+    vol_pct = stats_12m.get("volatilidad_pct", 0.0)
+    sharpe = stats_12m.get("sharpe", 0.0)
 
     # ---------- Dividendos ----------
     #  a) últimos 12 meses por mes (sumando monto * shares en fecha)
     meses = []
     div_mes_map = defaultdict(Decimal)
     hace_12m_div = hoy - timedelta(days=365)
+    libro = libro_posiciones(user)
     for d in dividendos:
         if not hasattr(d, 'fecha') or d.fecha is None:
             continue
@@ -2264,7 +2214,7 @@ def resumen_cartera(request):
             continue
         key = d.fecha.strftime("%Y-%m")
         tk = d.accion.ticker
-        qty_on_date = _position_on(user, tk, d.fecha)
+        qty_on_date = libro.cantidad(tk, d.fecha)
         div_mes_map[key] += Decimal(str(d.monto or 0)) * Decimal(qty_on_date)
 
     meses = sorted(div_mes_map.keys())
@@ -2278,7 +2228,7 @@ def resumen_cartera(request):
         if not hasattr(d, 'fecha') or d.fecha is None:
             continue
         anio = d.fecha.year
-        qty_on_date = _position_on(user, d.accion.ticker, d.fecha)
+        qty_on_date = libro.cantidad(d.accion.ticker, d.fecha)
         div_por_anio[anio][d.accion.ticker] += Decimal(str(d.monto or 0)) * Decimal(qty_on_date)
 
     dividendos_anuales = {int(y): {tk: float(v) for tk, v in m.items()} for y, m in div_por_anio.items()}
@@ -2307,6 +2257,10 @@ def resumen_cartera(request):
         # Métricas avanzadas
         "volatilidad_pct": float(vol_pct),
         "sharpe_ratio": float(sharpe),
+        "sortino_ratio": stats_12m.get("sortino"),
+        "calmar_ratio": stats_12m.get("calmar"),
+        "max_drawdown_pct": stats_12m.get("max_drawdown_pct"),
+        "acierto_pct": stats_12m.get("acierto_pct"),
         "cash_pct": float(cash_pct),
 
         # Beneficios
@@ -2365,13 +2319,108 @@ def editar_accion(request, accion_id):
 
 @login_required
 def alpha_bots(request):
-    """Renderiza la página de Alpha Bots."""
-    return render(request, "alpha_quantum/alpha_bots.html", {})
+    """Alpha Bots: backtest de las estrategias predefinidas sobre la cartera actual (3 años)."""
+    tickers = sorted({t.upper().strip() for t in
+                      Accion.objects.filter(user=request.user, cantidad__gt=0).values_list("ticker", flat=True)})
+    bots, curvas = [], {}
+    nombres = {"cruce": "Cruce de medias", "reversion": "Reversión a la media",
+               "momentum": "Momentum", "rebalanceo": "Rebalanceo mensual"}
+    for estrategia in backtest.ESTRATEGIAS:
+        params = backtest.parametros(estrategia, {})
+        res = backtest.ejecutar_cacheado(tickers, estrategia, params) if tickers else None
+        if not res:
+            continue
+        stats = res["estadisticas"]
+        bots.append({
+            "nombre": nombres[estrategia],
+            "estrategia": ", ".join(f"{k}={v}" for k, v in params.items()),
+            "rentabilidad": stats.get("rentabilidad_pct"),
+            "drawdown": stats.get("max_drawdown_pct"),
+            "sharpe": stats.get("sharpe"),
+            "estado": "Activo" if res["en_mercado"] else "Pausado",
+        })
+        curvas["labels"] = res["labels"]
+        curvas[nombres[estrategia]] = res["equity"]
+    return render(request, "alpha_quantum/alpha_bots.html", {"bots": bots, "curvas": curvas})
+
+
+@login_required
+def backtest_api(request):
+    """
+    Backtest en JSON: ?tickers=AAPL,MSFT&estrategia=cruce|reversion|momentum|rebalanceo
+    con sus parámetros, &desde=&hasta= (YYYY-MM-DD), &capital=, &comision= (fija
+    por operación) y &comision_pct= (fracción del importe). Sin tickers usa la
+    cartera actual.
+    """
+    estrategia = (request.GET.get("estrategia") or "cruce").strip().lower()
+    tickers = [t for t in (request.GET.get("tickers") or "").upper().replace(" ", "").split(",") if t]
+    if not tickers:
+        tickers = list(Accion.objects.filter(user=request.user, cantidad__gt=0).values_list("ticker", flat=True))
+    try:
+        params = backtest.parametros(estrategia, request.GET)
+        desde = date.fromisoformat(request.GET["desde"]) if request.GET.get("desde") else None
+        hasta = date.fromisoformat(request.GET["hasta"]) if request.GET.get("hasta") else None
+        capital = float(request.GET.get("capital") or 10000)
+        comision = float(request.GET.get("comision") or 0)
+        comision_pct = float(request.GET.get("comision_pct") or 0)
+        if capital <= 0 or comision < 0 or not 0 <= comision_pct < 1 or len(tickers) > 50:
+            raise ValueError("Capital, comisiones o número de tickers fuera de rango")
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    res = backtest.ejecutar_cacheado(tickers, estrategia, params, desde=desde, hasta=hasta,
+                                     capital=capital, comision=comision, comision_pct=comision_pct)
+    if res is None:
+        return JsonResponse({"error": "No hay cierres para esos tickers y fechas"}, status=404)
+    return JsonResponse(res)
 
 @login_required
 def alpha_indicators(request):
-    """Renderiza la página de Alpha Indicators."""
-    return render(request, "alpha_quantum/alpha_indicators.html", {})
+    """Alpha Indicators: RSI, MACD, volatilidad y momentum de cartera y watchlists."""
+    tickers = sorted(
+        {t.upper().strip() for t in Accion.objects.filter(user=request.user, cantidad__gt=0).values_list("ticker", flat=True)}
+        | {t.upper().strip() for t in Watchlist.objects.filter(user=request.user).values_list("ticker", flat=True)}
+    )
+    filas = []
+    for t in tickers:
+        fila = indicadores.resumen(t)
+        if fila["rsi"] is None and fila["momento"] is None and cache.add(f"historico:cargando:{t}", 1, timeout=600):
+            lanzar(actualizar_historico, t)
+        filas.append(fila)
+    return render(request, "alpha_quantum/alpha_indicators.html", {"indicadores": filas})
+
+
+@login_required
+def indicadores_api(request):
+    """
+    Serie de un indicador técnico para un ticker:
+    ?ticker=AAPL&indicador=rsi|sma|ema|macd|bollinger|atr más sus parámetros
+    (periodo, rapida, lenta, senal, desviaciones) y ?ultimas=N.
+    """
+    ticker = (request.GET.get("ticker") or "").strip().upper()
+    nombre = (request.GET.get("indicador") or "").strip().lower()
+    try:
+        params = indicadores.parametros(nombre, request.GET)
+        ultimas = int(request.GET.get("ultimas") or 250)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    if not ticker:
+        return JsonResponse({"error": "Falta el ticker"}, status=400)
+
+    serie = indicadores.serie(ticker, nombre, params)
+    if not serie.fechas and cache.add(f"historico:cargando:{ticker}", 1, timeout=600):
+        lanzar(actualizar_historico, ticker)
+    corte = slice(-ultimas, None) if ultimas > 0 else slice(None)
+    return JsonResponse({
+        "ticker": ticker,
+        "indicador": nombre,
+        "parametros": params,
+        "labels": [f.isoformat() for f in serie.fechas[corte]],
+        "series": {
+            k: [None if math.isnan(v) else round(v, 4) for v in vs[corte]]
+            for k, vs in serie.valores.items()
+        },
+    })
 
 @login_required
 def macroeconomia(request):
@@ -2385,5 +2434,119 @@ def foro(request):
 
 @login_required
 def alpha_risk_lab(request):
-    """Renderiza la página de Risk Lab."""
-    return render(request, "alpha_quantum/alpha_risk_lab.html", {})
+    """
+    Risk Lab: VaR / ES a un día de la cartera actual (ventana de 12 meses),
+    riesgo realizado del histórico y abanico Monte Carlo.
+    """
+    inf = riesgo.informe(request.user)
+    context = {
+        "var_95_pct": None, "var_99_pct": None,
+        "hist_labels": "[]", "hist_counts": "[]",
+        "riesgo": inf,
+        # riesgo realizado del último año (drawdown, Sortino, volatilidad móvil)
+        "analitica": analitica.analizar(request.user, dias=365),
+    }
+    if inf:
+        hist = inf["metodos"]["historico"]
+        context.update({
+            "var_95_pct": hist["95"]["var_pct"], "var_95_abs": hist["95"]["var_abs"],
+            "var_99_pct": hist["99"]["var_pct"], "var_99_abs": hist["99"]["var_abs"],
+            "hist_labels": json.dumps(inf["histograma"]["labels"]),
+            "hist_counts": json.dumps(inf["histograma"]["counts"]),
+        })
+        # abanico Monte Carlo: si aún no está calculado se lanza en segundo plano
+        context["montecarlo"] = montecarlo.solicitar(request.user, montecarlo.parametros())
+        # diversificación: correlaciones (Ledoit-Wolf) entre las posiciones
+        cov = covarianza.matriz(riesgo.exposiciones(request.user)[0])
+        if cov and len(cov["tickers"]) > 1:
+            context["correlaciones"] = {
+                "tickers": cov["tickers"],
+                "filas": [
+                    {"ticker": t, "valores": [round(float(c), 2) for c in fila]}
+                    for t, fila in zip(cov["tickers"], cov["corr"])
+                ],
+            }
+    return render(request, "alpha_quantum/alpha_risk_lab.html", context)
+
+
+@login_required
+def riesgo_api(request):
+    """Informe de riesgo (VaR / ES histórico, paramétrico y Cornish-Fisher) en JSON."""
+    return JsonResponse({"riesgo": riesgo.informe(request.user)})
+
+
+@login_required
+def analitica_api(request):
+    """
+    Analítica de la cartera (?dias=365; 0 = todo el histórico): rendimientos
+    ajustados por flujos, rentabilidad acumulada, underwater, volatilidad
+    móvil y estadísticas.
+    """
+    try:
+        dias = max(int(request.GET.get("dias", 365)), 0)
+    except ValueError:
+        return JsonResponse({"error": "dias debe ser un entero"}, status=400)
+    return JsonResponse({"analitica": analitica.analizar(request.user, dias=dias)})
+
+
+@login_required
+def covarianza_api(request):
+    """
+    Covarianza y correlación diarias de ?tickers=A,B,... (por defecto, las
+    posiciones abiertas, hasta 50). ?metodo=ledoit_wolf|ewma y ?ventana= en
+    sesiones (2 a 2520).
+    """
+    tickers = [t for t in request.GET.get("tickers", "").split(",") if t.strip()]
+    tickers = tickers or riesgo.exposiciones(request.user)[0]
+    try:
+        ventana = int(request.GET["ventana"]) if request.GET.get("ventana") else None
+        res = covarianza.obtener(tickers, request.GET.get("metodo", "ledoit_wolf"), ventana)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse({"covarianza": covarianza.serializar(res)})
+
+
+@login_required
+def asignacion_api(request):
+    """
+    Asignación óptima de la cartera actual: ?metodo=min_varianza|paridad_riesgo|
+    max_sharpe|vol_objetivo, ?vol_objetivo= (anual), ?maximo= (peso máximo),
+    ?estimador=ledoit_wolf|ewma y ?efectivo= disponible. Devuelve los pesos y
+    las órdenes en acciones enteras.
+    """
+    try:
+        params = asignacion.parametros(
+            metodo=request.GET.get("metodo"),
+            vol_objetivo=request.GET.get("vol_objetivo"),
+            maximo=request.GET.get("maximo"),
+            estimador=request.GET.get("estimador"),
+        )
+        efectivo = float(request.GET.get("efectivo") or 0)
+        if not math.isfinite(efectivo) or efectivo < 0:
+            raise ValueError("efectivo debe ser un importe finito y no negativo")
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse({"asignacion": asignacion.rebalanceo(request.user, params, efectivo)})
+
+
+@login_required
+def montecarlo_api(request):
+    """
+    Simulación Monte Carlo de la cartera actual. Parámetros GET: metodo
+    (gbm|bootstrap), horizonte (días) y trayectorias, con los topes web
+    (MONTECARLO_WEB_MAX_*) y la semilla por defecto. Si aún no está
+    calculada responde 202 y la lanza en segundo plano.
+    """
+    try:
+        params = montecarlo.parametros(
+            metodo=request.GET.get("metodo"),
+            horizonte=request.GET.get("horizonte"),
+            trayectorias_=request.GET.get("trayectorias"),
+            web=True,
+        )
+    except (TypeError, ValueError):
+        return JsonResponse({"error": "Parámetros no válidos"}, status=400)
+    res = montecarlo.solicitar(request.user, params)
+    if res is None:
+        return JsonResponse({"estado": "calculando", "parametros": params}, status=202)
+    return JsonResponse({"estado": "listo", "montecarlo": res or None})
@@ -0,0 +1,23 @@
+# cronjobs/management/commands/actualizar_fundamentales.py
+
+from django.core.management.base import BaseCommand
+from alpha_quantum.models import Accion
+from alpha_quantum.models.watchlist import Watchlist
+from alpha_quantum.services import fundamentales
+from alpha_quantum.services.limitador import prioridad_fondo
+
+
+class Command(BaseCommand):
+    help = 'Refresca los fundamentales (Alpha Vantage) que tocan por calendario de presentación'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tickers', nargs='*', help='Tickers concretos (por defecto, cartera + watchlists)')
+
+    def handle(self, *args, **options):
+        tickers = options['tickers'] or (
+            set(Accion.objects.values_list('ticker', flat=True))
+            | set(Watchlist.objects.values_list('ticker', flat=True))
+        )
+        with prioridad_fondo():
+            n = fundamentales.refrescar_vencidos(tickers)
+        self.stdout.write(self.style.SUCCESS(f"✅ {n} estados financieros refrescados."))
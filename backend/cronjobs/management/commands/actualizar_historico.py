@@ -0,0 +1,28 @@
+# cronjobs/management/commands/actualizar_historico.py
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from alpha_quantum.models import Accion
+from alpha_quantum.models.watchlist import Watchlist
+from alpha_quantum.services.limitador import prioridad_fondo
+from alpha_quantum.utils import actualizar_historico
+
+
+class Command(BaseCommand):
+    help = 'Añade las barras diarias que falten a la serie compartida de cada ticker'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tickers', nargs='*', help='Tickers concretos (por defecto, cartera + watchlists + benchmarks)')
+
+    def handle(self, *args, **options):
+        tickers = options['tickers'] or (
+            set(Accion.objects.values_list('ticker', flat=True))
+            | set(Watchlist.objects.values_list('ticker', flat=True))
+            | set(getattr(settings, 'BENCHMARKS', {}).values())
+        )
+        tickers = sorted({t.upper().strip() for t in tickers if t})
+        n = 0
+        with prioridad_fondo():
+            for t in tickers:
+                n += actualizar_historico(t)
+        self.stdout.write(self.style.SUCCESS(f"✅ {n} barras nuevas en {len(tickers)} tickers."))
@@ -0,0 +1,32 @@
+# cronjobs/management/commands/actualizar_precios.py
+
+import time
+
+from django.core.management.base import BaseCommand
+from alpha_quantum.services import precios
+from alpha_quantum.services.limitador import prioridad_fondo
+
+
+class Command(BaseCommand):
+    help = 'Actualiza en lote el precio actual de todas las posiciones abiertas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tickers', nargs='*', help='Tickers concretos (por defecto, todas las posiciones)')
+        parser.add_argument('--cada', type=int, default=0,
+                            help='Repetir cada N segundos (modo worker); 0 = una sola pasada')
+
+    def handle(self, *args, **options):
+        tickers = options['tickers'] or None
+        while True:
+            inicio = time.monotonic()
+            try:
+                with prioridad_fondo():
+                    n = precios.refrescar_precios(tickers)
+                self.stdout.write(self.style.SUCCESS(f"✅ {n} posiciones con precio actualizado."))
+            except Exception as e:
+                if not options['cada']:
+                    raise
+                self.stderr.write(f"[PRECIOS] Error en la pasada: {e}")
+            if not options['cada']:
+                break
+            time.sleep(max(0.0, options['cada'] - (time.monotonic() - inicio)))
@@ -0,0 +1,79 @@
+# cronjobs/management/commands/optimizar_estrategia.py
+
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from alpha_quantum.models import Accion
+from alpha_quantum.models.optimizacion import BarridoParametros
+from alpha_quantum.models.watchlist import Watchlist
+from alpha_quantum.services import backtest, optimizacion
+from alpha_quantum.services.limitador import prioridad_fondo
+
+
+def _valores(texto: str) -> list:
+    """'5:50:5' (inicio:fin:paso, fin incluido) o '5,10,20'."""
+    if ':' in texto:
+        ini, fin, paso = (float(x) for x in (texto.split(':') + ['1'])[:3])
+        n = int(round((fin - ini) / paso)) + 1
+        vals = [ini + i * paso for i in range(max(n, 0))]
+    else:
+        vals = [float(x) for x in texto.split(',') if x]
+    return [int(v) if float(v).is_integer() else v for v in vals]
+
+
+class Command(BaseCommand):
+    help = 'Barrido walk-forward de parámetros de una estrategia de Alpha Bots en un pool de procesos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('estrategia', choices=list(backtest.ESTRATEGIAS))
+        parser.add_argument('--tickers', default='', help='AAPL,MSFT,... (por defecto, cartera + watchlists)')
+        parser.add_argument('--rejilla', nargs='*', default=[],
+                            help="Valores por parámetro: rapida=5:50:1 lenta=20,50,100 (frecuencia=mensual,anual)")
+        parser.add_argument('--desde', type=date.fromisoformat, default=None)
+        parser.add_argument('--hasta', type=date.fromisoformat, default=None)
+        parser.add_argument('--entrenamiento', type=int, default=None, help='Días laborables de cada ventana de entrenamiento')
+        parser.add_argument('--prueba', type=int, default=None, help='Días laborables de cada ventana de prueba')
+        parser.add_argument('--capital', type=float, default=10000.0)
+        parser.add_argument('--comision', type=float, default=0.0, help='Comisión fija por operación')
+        parser.add_argument('--comision-pct', type=float, default=0.0, help='Comisión proporcional (fracción)')
+        parser.add_argument('--procesos', type=int, default=None)
+        parser.add_argument('--forzar', action='store_true', help='Recalcular aunque ya exista')
+
+    def handle(self, *args, **options):
+        estrategia = options['estrategia']
+        tickers = [t for t in options['tickers'].upper().split(',') if t.strip()] or (
+            list(Accion.objects.filter(cantidad__gt=0).values_list('ticker', flat=True))
+            + list(Watchlist.objects.values_list('ticker', flat=True))
+        )
+        valores = {}
+        for item in options['rejilla']:
+            nombre, _, texto = item.partition('=')
+            if not texto:
+                raise CommandError(f"Rejilla no válida: {item}")
+            es_texto = isinstance(backtest.ESTRATEGIAS[estrategia].get(nombre), str)
+            valores[nombre] = texto.split(',') if es_texto else _valores(texto)
+
+        config = optimizacion.configurar(
+            estrategia, tickers, valores,
+            desde=options['desde'], hasta=options['hasta'],
+            entrenamiento=options['entrenamiento'], prueba=options['prueba'],
+            capital=options['capital'], comision=options['comision'], comision_pct=options['comision_pct'],
+        )
+        try:
+            combos = optimizacion.rejilla(estrategia, config['rejilla'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(f"{len(combos)} combinaciones × {len(config['tickers'])} tickers ({config['desde']} → {config['hasta']})")
+
+        with prioridad_fondo():
+            barrido = optimizacion.optimizar(config, procesos=options['procesos'], forzar=options['forzar'])
+
+        if barrido.estado != BarridoParametros.LISTO:
+            raise CommandError(f"Barrido {barrido.clave[:12]} con error: {barrido.error}")
+        res = barrido.resultado
+        for fila in res['ranking'][:5]:
+            self.stdout.write(f"  {fila['parametros']}  Sharpe ent. {fila['sharpe_entrenamiento']}  prueba {fila['sharpe_prueba']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Barrido {barrido.clave[:12]}: {res['combinaciones']} combinaciones, "
+            f"{len(res['particiones'])} particiones, fuera de muestra {res['rentabilidad_fuera_muestra_pct']} %."
+        ))
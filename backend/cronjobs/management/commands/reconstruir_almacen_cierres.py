@@ -0,0 +1,19 @@
+# cronjobs/management/commands/reconstruir_almacen_cierres.py
+
+from django.core.management.base import BaseCommand
+from alpha_quantum.models import Instrumento
+from alpha_quantum.services import almacen_cierres
+
+
+class Command(BaseCommand):
+    help = 'Regenera los ficheros memmap de cierres desde las barras diarias guardadas en BD'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tickers', nargs='*', help='Tickers concretos (por defecto, todos los instrumentos)')
+
+    def handle(self, *args, **options):
+        tickers = options['tickers'] or Instrumento.objects.values_list('ticker', flat=True)
+        n = 0
+        for t in tickers:
+            n += almacen_cierres.reconstruir(t)
+        self.stdout.write(self.style.SUCCESS(f"✅ {n} cierres escritos en el almacén."))
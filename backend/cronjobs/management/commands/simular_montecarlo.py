@@ -0,0 +1,40 @@
+# cronjobs/management/commands/simular_montecarlo.py
+
+from django.core.management.base import BaseCommand
+from alpha_quantum.models import Accion
+from alpha_quantum.services import montecarlo
+from alpha_quantum.services.limitador import prioridad_fondo
+
+
+class Command(BaseCommand):
+    help = 'Precalcula la simulación Monte Carlo del Risk Lab de cada usuario con cartera'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help='ID de un usuario concreto')
+        parser.add_argument('--metodo', choices=montecarlo.METODOS, default=None)
+        parser.add_argument('--horizonte', type=int, default=None, help='Días laborables')
+        parser.add_argument('--trayectorias', type=int, default=None)
+        parser.add_argument('--semilla', type=int, default=None)
+
+    def handle(self, *args, **options):
+        params = montecarlo.parametros(
+            metodo=options['metodo'],
+            horizonte=options['horizonte'],
+            trayectorias_=options['trayectorias'],
+            semilla=options['semilla'],
+        )
+        if options['user']:
+            users = [options['user']]
+        else:
+            users = Accion.objects.filter(cantidad__gt=0).values_list('user_id', flat=True).distinct()
+        n = 0
+        with prioridad_fondo():
+            for user_id in users:
+                res = montecarlo.simular(user_id, params)
+                if res:
+                    n += 1
+                    self.stdout.write(
+                        f"Usuario {user_id}: mediana {res['percentiles']['p50'][-1]:.2f} € · "
+                        f"VaR 95% {res['var_95']:.2f} €"
+                    )
+        self.stdout.write(self.style.SUCCESS(f"✅ {n} simulaciones ({params['trayectorias']} trayectorias, {params['horizonte']} días)."))
@@ -1,3 +1,85 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
 from django.test import TestCase
 
-# Create your tests here.
+from alpha_quantum import utils
+from alpha_quantum.models import BarraDiaria, Instrumento
+
+
+def _barra(fecha, cierre):
+    return {"datetime": fecha.isoformat(), "open": cierre, "high": cierre, "low": cierre,
+            "close": cierre, "volume": "1000"}
+
+
+class ActualizarHistoricoTests(TestCase):
+    def setUp(self):
+        hoy = date.today()
+        # tres días hábiles consecutivos bien por detrás de hoy
+        self.d0 = hoy - timedelta(days=14 + hoy.weekday())  # lunes
+        self.d1, self.d2 = self.d0 + timedelta(days=1), self.d0 + timedelta(days=2)
+        self.hoy = hoy
+
+        self.get_json = mock.Mock()
+        for p in (
+            mock.patch.object(type(utils.twelvedata), "configurado", new=True),
+            mock.patch.object(utils.twelvedata, "get_json", self.get_json),
+            mock.patch.object(utils, "almacen_cierres"),
+        ):
+            p.start()
+            self.addCleanup(p.stop)
+        self.almacen = utils.almacen_cierres
+
+    def _ejecutar(self, *tickers):
+        salida = StringIO()
+        call_command("actualizar_historico", *tickers, stdout=salida)
+        return salida.getvalue()
+
+    def _cierres(self):
+        return dict(BarraDiaria.objects.filter(instrumento_id="AAPL").values_list("fecha", "cierre"))
+
+    def test_primera_carga_sin_la_barra_de_hoy(self):
+        self.get_json.return_value = {"values": [_barra(self.hoy, "103"), _barra(self.d1, "101"),
+                                                 _barra(self.d0, "100")]}
+        self.assertIn("2 barras nuevas en 1 tickers", self._ejecutar("aapl"))
+        params = self.get_json.call_args.args[1]
+        self.assertEqual(params["outputsize"], 365)
+        self.assertNotIn("start_date", params)
+        self.assertEqual(self._cierres(), {self.d0: Decimal("100"), self.d1: Decimal("101")})
+
+    def test_incremental_solo_pide_las_que_faltan(self):
+        instrumento = Instrumento.objects.create(ticker="AAPL")
+        BarraDiaria.objects.create(instrumento=instrumento, fecha=self.d0, cierre=Decimal("100"))
+        # el proveedor repite la última barra guardada con otro cierre: no se toca
+        self.get_json.return_value = {"values": [_barra(self.d2, "102"), _barra(self.d1, "101"),
+                                                 _barra(self.d0, "999")]}
+        self.assertIn("2 barras nuevas", self._ejecutar("AAPL"))
+        params = self.get_json.call_args.args[1]
+        self.assertEqual(params["start_date"], self.d1.isoformat())
+        self.assertNotIn("outputsize", params)
+        self.assertEqual(self._cierres(), {self.d0: Decimal("100"), self.d1: Decimal("101"),
+                                           self.d2: Decimal("102")})
+        self.almacen.actualizar.assert_called_once_with("AAPL", [self.d2, self.d1], [102.0, 101.0])
+
+    def test_upsert_actualiza_en_vez_de_duplicar(self):
+        instrumento = Instrumento.objects.create(ticker="AAPL")
+        BarraDiaria.objects.create(instrumento=instrumento, fecha=self.d0, cierre=Decimal("100"))
+
+        def descarga(ruta, params):
+            # otra pasada escribe d1 mientras esta espera al proveedor
+            BarraDiaria.objects.create(instrumento=instrumento, fecha=self.d1, cierre=Decimal("1"))
+            return {"values": [_barra(self.d1, "101")]}
+
+        self.get_json.side_effect = descarga
+        self._ejecutar("AAPL")
+        self.assertEqual(BarraDiaria.objects.filter(instrumento=instrumento, fecha=self.d1).count(), 1)
+        self.assertEqual(self._cierres()[self.d1], Decimal("101"))
+
+    def test_al_dia_no_llama_al_proveedor(self):
+        instrumento = Instrumento.objects.create(ticker="AAPL")
+        BarraDiaria.objects.create(instrumento=instrumento, fecha=self.hoy, cierre=Decimal("1"))
+        self.assertIn("0 barras nuevas", self._ejecutar("AAPL"))
+        self.get_json.assert_not_called()
@@ -131,4 +131,116 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # TIPO DE CLAVE PRIMARIA POR DEFECTO
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-CORS_ALLOW_ALL_ORIGINS = True  # Solo para desarrollo
\ No newline at end of file
+CORS_ALLOW_ALL_ORIGINS = True  # Solo para desarrollo
+
+# CACHÉ
+# LocMem es por proceso; con varios workers usa un backend compartido
+# (FileBasedCache, DatabaseCache o Redis) para que compartan cotizaciones.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'alpha-quantum',
+    }
+}
+
+# Cotizaciones: segundos que un precio se considera fresco y ventana extra
+# en la que se sirve "caducado" mientras se refresca en segundo plano.
+COTIZACIONES_CACHE_TTL = 60
+COTIZACIONES_CACHE_STALE = 300
+
+# Símbolos por petición en las cotizaciones por lotes de Twelve Data
+TWELVE_DATA_LOTE = 50
+# Las métricas de Finnhub (PER, 52 semanas) apenas cambian en el día
+FINNHUB_METRICAS_TTL = 6 * 3600
+
+# Clientes HTTP de proveedores: timeout (conexión, lectura), reintentos con
+# backoff exponencial + jitter y tamaño del pool keep-alive por proveedor.
+PROVEEDORES_TIMEOUT = (3.05, 15)
+PROVEEDORES_REINTENTOS = 2
+PROVEEDORES_BACKOFF = 0.5
+PROVEEDORES_BACKOFF_MAX = 4.0
+PROVEEDORES_POOL = 10
+
+# Limitador compartido (token bucket en BD) por proveedor. Se fusiona con
+# los límites por defecto de services/limitador.py (planes gratuitos).
+PROVEEDORES_LIMITES = {
+    'twelvedata': {'por_minuto': 8, 'por_dia': 800},
+    'finnhub': {'por_minuto': 60, 'por_dia': None},
+    'alphavantage': {'por_minuto': 5, 'por_dia': 25},
+}
+# Fracción del cupo reservada a peticiones interactivas (el cron no la toca)
+PROVEEDORES_RESERVA_INTERACTIVA = 0.25
+# Segundos que una petición puede esperar a que haya token
+PROVEEDORES_ESPERA_MAX = 2.0
+PROVEEDORES_ESPERA_FONDO = 60.0
+
+# Análisis fundamental: plazo global (s) para el abanico de llamadas
+FUNDAMENTAL_PLAZO = 8.0
+PARALELO_WORKERS = 16
+
+# Almacén de fundamentales: horas de validez del OVERVIEW, días que tarda
+# en publicarse un trimestre tras su cierre y horas entre reintentos.
+FUNDAMENTALES_OVERVIEW_TTL = 24
+FUNDAMENTALES_DESFASE_PRESENTACION = 45
+FUNDAMENTALES_REINTENTO_HORAS = 24
+
+# Precios de cartera: los refresca `manage.py actualizar_precios` (cron o
+# --cada N). Si una vista ve precios con más de PRECIOS_MAX_EDAD segundos
+# pide un refresco en segundo plano.
+PRECIOS_MAX_EDAD = 900
+
+# Almacén memmap de cierres diarios para la analítica (un .f8 por ticker
+# más el índice de fechas compartido), rejilla de días laborables desde
+# ALMACEN_CIERRES_ORIGEN.
+ALMACEN_CIERRES_DIR = BASE_DIR / 'datos' / 'cierres'
+ALMACEN_CIERRES_ORIGEN = '2000-01-03'
+
+# Motor de lotes: "MEDIO" (coste medio ponderado) o "FIFO"
+LOTES_METODO = 'MEDIO'
+
+# Risk Lab: días laborables de historia para VaR / ES (≈ 12 meses)
+RIESGO_VENTANA = 252
+
+# Monte Carlo del Risk Lab: horizonte en días laborables, trayectorias por
+# defecto (y máximo por petición), procesos del pool y número de bloques
+# en que se reparten (el resultado solo depende de la semilla, no de estos).
+MONTECARLO_HORIZONTE = 21
+MONTECARLO_TRAYECTORIAS = 100_000
+MONTECARLO_MAX_TRAYECTORIAS = 1_000_000
+MONTECARLO_PROCESOS = 4
+MONTECARLO_BLOQUES = 16
+MONTECARLO_SEMILLA = 12345
+# topes de las simulaciones pedidas desde la web (las grandes, con el comando)
+MONTECARLO_WEB_MAX_TRAYECTORIAS = 200_000
+MONTECARLO_WEB_MAX_HORIZONTE = 252
+
+# Benchmarks de /api/benchmark/<codigo>: símbolo de Twelve Data cuyas barras
+# se guardan como un instrumento más (SPY replica el S&P 500).
+BENCHMARKS = {'spx': 'SPY'}
+
+# Indicadores técnicos: barras que se guardan por serie cacheada
+INDICADORES_BARRAS = 1000
+
+# Optimización walk-forward (manage.py optimizar_estrategia): procesos del
+# pool, combinaciones por tarea, ventanas de entrenamiento / prueba en días
+# laborables y filas del ranking que se guardan.
+OPTIMIZACION_PROCESOS = 4
+OPTIMIZACION_CELDAS_POR_TAREA = 100
+OPTIMIZACION_ENTRENAMIENTO = 504
+OPTIMIZACION_PRUEBA = 126
+OPTIMIZACION_RANKING = 50
+
+# Analítica de cartera: sesiones de la volatilidad móvil
+ANALITICA_VENTANA_VOL = 21
+
+# Covarianzas (Ledoit-Wolf por ventana y EWMA incremental)
+COVARIANZA_VENTANA = 252
+COVARIANZA_LAMBDA = 0.94
+
+# Asignación óptima de cartera (rebalanceo de la vista de cartera)
+ASIGNACION_METODO = 'paridad_riesgo'
+ASIGNACION_VOL_OBJETIVO = 0.12
+ASIGNACION_PESO_MAXIMO = 1.0
+ASIGNACION_TASA_LIBRE = 0.0
+ASIGNACION_MAX_ITER = 5000
+ASIGNACION_TOLERANCIA = 1e-9